@@ -0,0 +1,136 @@
+import argparse
+import time
+import pandas as pd
+import numpy as np
+
+from genplot.multimap import MultiMap, MM_MAP
+from genplot.utils import int_value_handler, percentile_formatter_vec
+
+'''
+Per-subject hover text render benchmark.
+
+Compares the columnar HoverTemplate renderer used by MultiMap against the
+old iterrows + str.format loop, on synthetic frames, and checks that both
+produce the same hover text.
+
+python benchmarks/bench_hovertext.py --rows 4000 --repeat 3
+'''
+
+MOST_RECENT_YEAR = 2023
+
+def synthetic_frames(subject: str = None,
+                     n: int = 4000,
+                     seed: int = 0):
+    '''returns (df, df_tot, years_iter) shaped like build_frame's hover inputs'''
+    rng = np.random.default_rng(seed)
+    yr = MOST_RECENT_YEAR
+    if subject == 'enrollment':
+        years_iter = [yr-30, yr-20, yr-10, yr]
+    else:
+        years_iter = [yr-20, yr-10, yr]
+    ids = np.array([str(100000 + i) for i in range(n)], dtype=object)
+    def col(lo, hi, size, na=.05):
+        v = rng.uniform(lo, hi, size)
+        v[rng.random(size) < na] = np.nan
+        return v
+    frames = []
+    for y in years_iter:
+        keep = rng.random(n) > .1 if y != yr else np.ones(n, dtype=bool)
+        m = int(keep.sum())
+        frames.append(pd.DataFrame({
+            'year': y, 'id': ids[keep],
+            'name': [f'School {i}' for i in ids[keep]],
+            'city': [f'City {int(i) % 300}' for i in ids[keep]],
+            'state': rng.choice(['CA','NY','TX','OH','DC'], m),
+            'men_applied': col(10, 30000, m), 'men_admitted': col(10, 9000, m),
+            'accept_rate_men': col(0, 100, m), 'accept_rate_women': col(0, 100, m),
+            'men_admitted_share': col(0, 100, m), 'men_applied_share': col(0, 100, m),
+            'totmen': col(0, 30000, m), 'totwomen': col(0, 30000, m), 'totmen_share': col(0, 100, m),
+            'totmen_graduated': col(0, 2000, m),
+            'gradrate_totmen': col(0, 100, m), 'gradrate_totwomen': col(0, 100, m),
+            'male_earn': col(20000, 90000, m, 0), 'female_earn': col(20000, 90000, m),
+        }))
+    df_tot = pd.concat(frames, ignore_index=True)
+    var_alias = {'admissions': 'accept_rate_men', 'enrollment': 'totmen_share',
+                 'graduation': 'gradrate_totmen', 'earnings': 'male_earn'}[subject]
+    df_tot['outcome_var'] = df_tot[var_alias]
+    df_tot = df_tot.loc[df_tot['outcome_var'].notnull()]
+    df = df_tot.loc[df_tot['year'] == yr].copy()
+    return df, df_tot, years_iter
+
+def legacy_hover_text(subject: str = None,
+                      specification: str = None,
+                      df: pd.DataFrame = None,
+                      df_tot: pd.DataFrame = None,
+                      years_iter = None):
+    '''the old row-by-row renderer, kept here as the reference'''
+    hover_temp = MM_MAP[subject]['hover_text']
+    yr = MOST_RECENT_YEAR
+    hist = (df_tot.drop_duplicates(subset=['id','year'])
+                  .pivot(index='id', columns='year', values='outcome_var')
+                  .reindex(columns=years_iter))
+    text_dict = dict(zip(hist.index, hist.to_numpy(dtype=np.float64)))
+    perc_var = {'admissions': 'accept_rate_men', 'enrollment': 'totmen_share',
+                'graduation': 'gradrate_totmen', 'earnings': 'male_earn'}[subject]
+    perc_arr = percentile_formatter_vec(df[perc_var])
+    out = []
+    for (_, r), perc in zip(df.iterrows(), perc_arr):
+        base = {'name': r['name'], 'city': r['city'], 'state': r['state'], 'perc': perc}
+        if subject == 'earnings':
+            out.append(hover_temp.format(**base, spec='median',
+                                         male_earn=int_value_handler(r['male_earn']),
+                                         female_earn=int_value_handler(r['female_earn']),
+                                         diff_earn=int_value_handler(r['male_earn'], r['female_earn'], 'subtract')))
+            continue
+        v_map = text_dict[r['id']]
+        for i, y in enumerate(years_iter):
+            base[f'year{i}'] = y
+            base[f'year{i}_rate'] = int_value_handler(v_map[i])
+        if subject == 'admissions':
+            out.append(hover_temp.format(**base, rec_yr=yr,
+                men_app=int_value_handler(r['men_applied']), men_accepted=int_value_handler(r['men_admitted']),
+                men_accept_rate=int_value_handler(r['accept_rate_men']), women_accept_rate=int_value_handler(r['accept_rate_women']),
+                men_accept_share=int_value_handler(r['men_admitted_share']), men_apply_share=int_value_handler(r['men_applied_share'])))
+        elif subject == 'enrollment':
+            out.append(hover_temp.format(**base, rec_yr=yr,
+                totmen=int_value_handler(r['totmen']), totwomen=int_value_handler(r['totwomen']),
+                totmen_share=int_value_handler(r['totmen_share'])))
+        else:
+            out.append(hover_temp.format(**base, rec_yr=yr,
+                rec_yr_lag=yr - 6 if specification == 'bach' else yr - 3,
+                men_grad=int_value_handler(r['totmen_graduated']),
+                male_grad_rate=int_value_handler(r['gradrate_totmen']), female_grad_rate=int_value_handler(r['gradrate_totwomen']),
+                diff_grad=int_value_handler(r['gradrate_totmen'], r['gradrate_totwomen'], 'subtract')))
+    return out
+
+def best_of(func, repeat: int = 3) -> float:
+    '''returns best wall time of repeated calls, in seconds'''
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='hover text render benchmark')
+    parser.add_argument('--rows', type=int, default=4000, help='institutions per frame')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per renderer')
+    args = parser.parse_args()
+
+    mm = MultiMap(most_recent_year=MOST_RECENT_YEAR)
+    cases = [('admissions', None), ('enrollment', 'undergrad'), ('graduation', 'bach'), ('earnings', None)]
+    print(f'{"subject":<12}{"rows":>8}{"legacy (ms)":>14}{"columnar (ms)":>16}{"speedup":>10}')
+    for subject, spec in cases:
+        df, df_tot, years_iter = synthetic_frames(subject, args.rows)
+        if subject == 'earnings':
+            new = lambda: mm._earnings_hover_text(df=df, spec='median')
+        else:
+            new = lambda: mm._hover_text(subject=subject, specification=spec, df=df, df_tot=df_tot, years_iter=years_iter)
+        old = lambda: legacy_hover_text(subject, spec, df, df_tot, years_iter)
+        if old() != new():
+            raise AssertionError(f'{subject}: columnar hover text differs from legacy hover text')
+        t_old = best_of(old, args.repeat)
+        t_new = best_of(new, args.repeat)
+        print(f'{subject:<12}{len(df):>8}{t_old*1000:>14.1f}{t_new*1000:>16.1f}{t_old/t_new:>9.1f}x')
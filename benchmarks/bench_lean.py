@@ -0,0 +1,78 @@
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+os.environ.setdefault('GENPLOT_CACHE', '0')
+
+from genplot.utils import CleanForPlot, PLOTS_DICT, lean_frame
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import institutions, subject_data
+
+'''
+Lean mode memory benchmark, per subject (see CleanForPlot's lean param).
+
+For each PLOTS_DICT subject, synthetic data are held the way SharedData holds them
+(full precision, or downcast with lean_frame), then run through CleanForPlot._run_data.
+Reports, in MB:
+- held: memory of the loaded subject data
+- run: peak memory allocated by _run_data, above the held data
+- peak: held + run, i.e. peak memory of one subject's data and cleaning
+and how much lean mode cuts the peak. Completion data have --cips CIP rows per school and year.
+
+python benchmarks/bench_lean.py --schools 5000 --cips 20
+'''
+
+MB = 1024 * 1024
+YEARS = {'admissions': [2003, 2013, 2023], 'enrollment': [1993, 2003, 2013, 2023],
+         'completion': [1993, 2003, 2013, 2023], 'graduation': [2003, 2013, 2023]}
+KWARGS = {'admissions': {}, 'enrollment': {'student_level': 'undergrad'},
+          'completion': {'degree_level': 'bach'}, 'graduation': {'degree_level': 'bach'}}
+
+class HeldData:
+    '''CleanForPlot source holding one subject's data (like SharedData does)'''
+    def __init__(self,
+                 df = None):
+        self.df = df
+
+    def load(self,
+             subject: str = None,
+             years = None,
+             **kwargs):
+        return self.df.loc[self.df['year'].isin(years)]
+
+def measure(df = None,
+            subject: str = None,
+            lean: bool = False,
+            poplimit: int = 500) -> dict:
+    '''returns {held, run, peak} (MB) of holding df and running _run_data on it'''
+    held = df.memory_usage(deep=True).sum() / MB
+    cfp = CleanForPlot(subject=subject, years=YEARS[subject], poplimit=poplimit,
+                       use_cache=False, source=HeldData(df), lean=lean)
+    gc.collect()
+    tracemalloc.start()
+    out = cfp._run_data(**KWARGS[subject])
+    run = tracemalloc.get_traced_memory()[1] / MB
+    tracemalloc.stop()
+    del out
+    return {'held': held, 'run': run, 'peak': held + run}
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='lean mode memory benchmark')
+    parser.add_argument('--schools', type=int, default=5000, help='number of schools')
+    parser.add_argument('--cips', type=int, default=20, help='CIP rows per school and year (completion)')
+    args = parser.parse_args()
+
+    univ = institutions(args.schools)
+    print(f'{"subject":<12}{"rows":>9}{"held":>8}{"run":>8}{"peak":>8}'
+          f'{"lean held":>11}{"lean run":>10}{"lean peak":>11}{"saved":>8}')
+    for subject in PLOTS_DICT.keys():
+        df = subject_data(univ, subject, YEARS[subject], cips=args.cips, **KWARGS[subject])
+        full = measure(df, subject, lean=False)
+        lean = measure(lean_frame(df), subject, lean=True)
+        print(f'{subject:<12}{len(df):>9}{full["held"]:>8.1f}{full["run"]:>8.1f}{full["peak"]:>8.1f}'
+              f'{lean["held"]:>11.1f}{lean["run"]:>10.1f}{lean["peak"]:>11.1f}'
+              f'{1 - lean["peak"] / full["peak"]:>8.0%}')
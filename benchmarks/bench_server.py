@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+os.environ.setdefault('GENPLOT_CACHE', '0')
+
+from genplot.datatable import EdDataTable, SERVER_API
+from genplot.tableserver import TableServer, MAX_PAGE_ROWS
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import SyntheticData
+
+'''
+Table server benchmark and check, on localhost (see genplot.tableserver).
+
+Builds the table tabs on synthetic data, writes the server-side page, starts a
+TableServer on a free localhost port, and sends it DataTables requests: the first
+page, pages sorted on each column (and on two columns), deep pages, and searches.
+Every response is checked against the same query done row by row, and request
+latencies (ms, median and worst) are reported per tab.
+
+python benchmarks/bench_server.py --schools 10000
+'''
+
+MOST_RECENT_YEAR = 2023
+
+def dt_params(draw: int = 1,
+              start: int = 0,
+              length: int = 20,
+              search: str = '',
+              order: list = None) -> dict:
+    '''returns DataTables serverSide request parameters'''
+    params = {'draw': draw, 'start': start, 'length': length, 'search[value]': search}
+    for i, (col, direction) in enumerate(order or []):
+        params[f'order[{i}][column]'] = col
+        params[f'order[{i}][dir]'] = direction
+    return params
+
+def expected(server: TableServer = None,
+             sbjct: str = None,
+             params: dict = None) -> tuple:
+    '''returns (recordsFiltered, page rows) of a request, done the slow way'''
+    tab = server.tabs[sbjct]
+    rows = list(range(len(tab)))
+    # stable sorts, from the last key to the first
+    for i in reversed(range(sum(1 for k in params if k.endswith('[column]')))):
+        col, desc = params[f'order[{i}][column]'], params[f'order[{i}][dir]'] == 'desc'
+        ranks = tab.rank(col)
+        rows = sorted(rows, key=lambda r: -ranks[r] if desc else ranks[r])
+    words = params['search[value]'].lower().split()
+    rows = [r for r in rows if all(w in tab.haystack[r] for w in words)]
+    start, length = params['start'], params['length']
+    length = MAX_PAGE_ROWS if length < 0 else length
+    return len(rows), [list(tab.cells[r]) for r in rows[start:start + length]]
+
+def request(url: str = None,
+            params: dict = None) -> tuple:
+    '''returns (response json, latency in ms)'''
+    t0 = time.perf_counter()
+    with urlopen(f'{url}?{urlencode(params)}') as resp:
+        body = json.loads(resp.read())
+    return body, (time.perf_counter() - t0) * 1000
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='table server benchmark, on localhost')
+    parser.add_argument('--schools', type=int, default=10000, help='number of schools')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the synthetic data')
+    args = parser.parse_args()
+
+    shared = SyntheticData(n=args.schools, seed=args.seed)
+    tbl = EdDataTable(most_recent_year=MOST_RECENT_YEAR, shared=shared, use_cache=False)
+    tbl.plan_data(shared)
+    shared.generate()
+    shared.fetch()
+    tbl.generate_df(earnings_api_key='synthetic', inflation_adjust=125.58, max_workers=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        page = os.path.join(tmp, 'table.html')
+        tbl.generate_datatable(out_path=page, render='server')
+        t0 = time.perf_counter()
+        server = TableServer(tbl, port=0, directory=tmp)
+        load_secs = time.perf_counter() - t0
+        server.start()
+        try:
+            with urlopen(f'{server.url}/table.html') as resp:
+                assert b'serverSide: true' in resp.read()
+            print(f'loaded {len(server.tabs)} tabs in {load_secs:.2f}s, serving at {server.url}')
+            print(f'{"tab":<18}{"rows":>8}{"requests":>10}{"median ms":>11}{"worst ms":>10}')
+            for sbjct, tab in server.tabs.items():
+                school = tab.columns.index('School')
+                last = len(tab.columns) - 1
+                queries = [dt_params()]
+                queries += [dt_params(order=[(col, d)]) for col in range(len(tab.columns)) for d in ('asc', 'desc')]
+                queries += [dt_params(order=[(tab.columns.index('State'), 'asc'), (last, 'desc')]),
+                            dt_params(start=max(len(tab) - 20, 0), order=[(school, 'desc')]),
+                            dt_params(search=str(tab.cells[0][school]).split()[0]),
+                            dt_params(search='a', order=[(last, 'asc')], start=40),
+                            dt_params(search='no such school'),
+                            dt_params(length=-1, order=[(school, 'asc')])]
+                times = []
+                for draw, params in enumerate(queries, 1):
+                    params['draw'] = draw
+                    body, ms = request(f'{server.url}{SERVER_API}{sbjct}', params)
+                    times.append(ms)
+                    n_filtered, rows = expected(server, sbjct, params)
+                    assert body['draw'] == draw and body['recordsTotal'] == len(tab), (sbjct, params)
+                    assert body['recordsFiltered'] == n_filtered and body['data'] == rows, (sbjct, params)
+                print(f'{sbjct:<18}{len(tab):>8}{len(times):>10}{statistics.median(times):>11.1f}{max(times):>10.1f}')
+            print('all responses match')
+        finally:
+            server.shutdown()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from genplot.multimap import MultiMap
+
+'''
+viz_to_html benchmark: template writer vs the old BeautifulSoup round trip.
+
+Builds a six-frame map (same shape as build_map's: one Scattergeo trace per frame,
+long hover paragraphs, colorbars), then writes it with each writer in a fresh
+subprocess, so peak RSS (ru_maxrss) isn't shared between them.
+The BeautifulSoup writer needs bs4, which genplot no longer depends on; it's skipped if missing.
+
+python benchmarks/bench_viz_to_html.py --rows 4000 --repeat 3
+'''
+
+FRAME_NAMES = ['Admissions', 'Enrollment (Undergrad)', 'Enrollment (Grad)',
+               'Graduation (Bach.)', 'Graduation (Assc.)', 'Earnings (median)']
+
+def synthetic_map(n: int = 4000,
+                  seed: int = 0) -> MultiMap:
+    '''returns MultiMap with six synthetic frames of n schools, multimap already built'''
+    rng = np.random.default_rng(seed)
+    mm = MultiMap(most_recent_year=2023)
+    for name in FRAME_NAMES:
+        hover = [f'<b>School {i}</b><br>City {i % 300}, ST<br><br>'
+                 + '<br>'.join(f'{y}: <b>{rng.integers(0, 100)}%</b>' for y in (2003, 2013, 2023))
+                 + f'<br><br>{int(rng.integers(0, 30000))} men applied, {int(rng.integers(0, 9000))} admitted'
+                 + f'<br>Percentile: {int(rng.integers(1, 99))}th' for i in range(n)]
+        mm.frames.append(go.Frame(
+            name=f'<b>{name}</b><br>',
+            data=go.Scattergeo(locationmode='USA-states',
+                               lat=rng.uniform(25, 49, n), lon=rng.uniform(-124, -67, n),
+                               text=hover, hovertemplate='%{text}<extra></extra>',
+                               marker={'size': rng.uniform(3, 30, n).round(1),
+                                       'color': rng.uniform(0, 100, n).round(1),
+                                       'colorscale': 'Viridis',
+                                       'colorbar': {'title': name}}),
+            layout=go.Layout(title={'subtitle': {'text': f'Currently viewing: <b>{name}'}})))
+    mm.build_multimap(title='Benchmark map', notes='Synthetic data')
+    return mm
+
+def legacy_viz_to_html(mm: MultiMap = None,
+                       fpath: str = None) -> None:
+    '''the old writer: full html string, parsed and re-serialised with BeautifulSoup (search script trimmed)'''
+    from bs4 import BeautifulSoup
+    html_plot = pio.to_html(fig=mm.fig, auto_play=False, include_plotlyjs='cdn', full_html=True,
+                            config={'responsive': True, 'modeBarButtonsToRemove': ['select2d', 'lasso2d']})
+    soup = BeautifulSoup(html_plot, 'html.parser')
+    soup.body.insert(0, BeautifulSoup('<div><input type="text" id="searchBox"></div>', 'html.parser'))
+    soup.head.insert(1, BeautifulSoup('<style>.plotly .modebar-btn {width: 35px !important;}</style>', 'html.parser'))
+    plot_id = soup.find('div', class_='plotly-graph-div')['id']
+    soup.body.append(BeautifulSoup(f'<script>const plotId = "{plot_id}";</script>', 'html.parser'))
+    with open(fpath, 'w') as plotf:
+        plotf.write(str(soup))
+
+def run_writer(writer: str = None,
+               rows: int = 4000,
+               repeat: int = 3) -> dict:
+    '''times one writer in this process, returns {seconds, peak rss increase (MB), bytes}'''
+    mm = synthetic_map(rows)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        fpath = os.path.join(tmp, 'map.html')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            if writer == 'template':
+                mm.viz_to_html(fpath=fpath, add_search_bar=True)
+            else:
+                legacy_viz_to_html(mm, fpath)
+            times.append(time.perf_counter() - t0)
+        nbytes = os.path.getsize(fpath)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024 # ru_maxrss is bytes on macOS, KB on linux
+    return {'seconds': min(times), 'rss_mb': (rss_after - rss_before) / scale, 'bytes': nbytes}
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='viz_to_html benchmark')
+    parser.add_argument('--rows', type=int, default=4000, help='schools per frame')
+    parser.add_argument('--repeat', type=int, default=3, help='timed writes per writer')
+    parser.add_argument('--writer', choices=['template', 'bs4'], help='(internal) run one writer, print json')
+    args = parser.parse_args()
+
+    if args.writer:
+        print(json.dumps(run_writer(args.writer, args.rows, args.repeat)))
+        sys.exit(0)
+
+    print(f'{"writer":<10}{"rows":>8}{"time (s)":>11}{"peak RSS +MB":>15}{"html MB":>10}')
+    for writer in ['bs4', 'template']:
+        proc = subprocess.run([sys.executable, __file__, '--writer', writer,
+                               '--rows', str(args.rows), '--repeat', str(args.repeat)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f'{writer:<10} failed: {proc.stderr.strip().splitlines()[-1]}')
+            continue
+        res = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f'{writer:<10}{args.rows:>8}{res["seconds"]:>11.2f}{res["rss_mb"]:>15.1f}{res["bytes"]/1e6:>10.2f}')
@@ -0,0 +1,186 @@
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('GENPLOT_CACHE', '0') # time the builds, not the build cache
+
+import numpy as np
+import pandas as pd
+import plotly
+
+import genplot.multimap as multimap
+from genplot.utils import CleanForPlot
+from genplot.multimap import MultiMap
+from genplot.datatable import EdDataTable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import SyntheticData
+
+'''
+Stage benchmark of the map and table builds, on synthetic data (see benchmarks/synthetic.py).
+
+Runs offline, with every cache off, at one or more scales (number of schools), and times:
+- generate: making the synthetic data (not genplot; for reference)
+- load: SharedData.fetch, i.e. slicing subject data, and parsing Scorecard pages with Earnings.get_wages
+- filter: CleanForPlot._run_data (poplimit cutoff, schools in the most recent year, cols_to_keep)
+- hover_text: MultiMap hover labels (text, or customdata with --hover template), every frame
+- colour_bar: weighted medians for the colour bars, every frame
+- frames: MultiMap.build_frames, in all (includes filter, hover_text and colour_bar)
+- figure: MultiMap.build_multimap
+- map_html: MultiMap.viz_to_html
+- table_df: EdDataTable.generate_df
+- table_html: EdDataTable.generate_datatable
+Builders run with one worker, so stage times add up. Each stage reports its best of --repeat runs.
+
+Results are written to JSON (commit, versions, and seconds per stage, per scale), so runs can be
+compared across commits with --compare:
+
+python benchmarks/run.py --scales 1000 10000 --out bench_base.json
+python benchmarks/run.py --scales 1000 10000 --compare bench_base.json
+'''
+
+MOST_RECENT_YEAR = 2023
+STAGES = ['generate', 'load', 'filter', 'hover_text', 'colour_bar', 'frames',
+          'figure', 'map_html', 'table_df', 'table_html']
+
+class StageTimer:
+    '''accumulates wall time of wrapped functions, per stage'''
+    def __init__(self):
+        self.times = {}
+
+    def wrap(self,
+             owner: object = None,
+             attr: str = None,
+             stage: str = None) -> None:
+        '''times every call of owner.attr under stage'''
+        func = getattr(owner, attr)
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - t0)
+        setattr(owner, attr, timed)
+
+    def add(self,
+            stage: str = None,
+            secs: float = 0) -> None:
+        self.times[stage] = self.times.get(stage, 0) + secs
+
+    def run(self,
+            stage: str = None,
+            func: object = None,
+            *args,
+            **kwargs) -> object:
+        '''runs func, timed under stage'''
+        t0 = time.perf_counter()
+        out = func(*args, **kwargs)
+        self.add(stage, time.perf_counter() - t0)
+        return out
+
+def run_once(n: int = 1000,
+             seed: int = 0,
+             out_dir: str = None,
+             hover: str = 'text') -> dict:
+    '''builds the map and table once on n synthetic schools, returns {stage: seconds}, and html sizes'''
+    timer = StageTimer()
+    originals = [(CleanForPlot, '_run_data'), (MultiMap, '_hover_fields'), (MultiMap, '_earnings_hover_fields'),
+                 (MultiMap, '_hover_data'), (multimap, 'wtd_quantile')]
+    saved = [getattr(owner, attr) for owner, attr in originals]
+    timer.wrap(CleanForPlot, '_run_data', 'filter')
+    for attr in ['_hover_fields', '_earnings_hover_fields', '_hover_data']:
+        timer.wrap(MultiMap, attr, 'hover_text')
+    timer.wrap(multimap, 'wtd_quantile', 'colour_bar')
+    try:
+        shared = SyntheticData(n=n, seed=seed)
+        mm = MultiMap(most_recent_year=MOST_RECENT_YEAR, shared=shared, use_cache=False, hover=hover)
+        tbl = EdDataTable(most_recent_year=MOST_RECENT_YEAR, shared=shared, use_cache=False)
+        mm.plan_data(shared)
+        tbl.plan_data(shared)
+        timer.run('generate', shared.generate)
+        timer.run('load', shared.fetch)
+
+        timer.run('frames', mm.build_frames, api_key='synthetic', inflation_adjust=125.58, max_workers=1)
+        timer.run('figure', mm.build_multimap, title='Benchmark map', notes='Synthetic data')
+        map_path = os.path.join(out_dir, 'map.html')
+        timer.run('map_html', mm.viz_to_html, fpath=map_path, add_search_bar=True)
+
+        timer.run('table_df', tbl.generate_df, earnings_api_key='synthetic', inflation_adjust=125.58, max_workers=1)
+        table_path = os.path.join(out_dir, 'table.html')
+        timer.run('table_html', tbl.generate_datatable, out_path=table_path)
+    finally:
+        for (owner, attr), func in zip(originals, saved):
+            setattr(owner, attr, func)
+    return {'seconds': timer.times,
+            'map_bytes': os.path.getsize(map_path),
+            'table_bytes': os.path.getsize(table_path)}
+
+def run_scale(n: int = 1000,
+              repeat: int = 3,
+              seed: int = 0,
+              hover: str = 'text') -> dict:
+    '''returns best of repeat runs, per stage, at n schools'''
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(repeat):
+            runs.append(run_once(n, seed, tmp, hover))
+    return {'seconds': {stage: min(r['seconds'].get(stage, 0) for r in runs) for stage in STAGES},
+            'map_bytes': runs[-1]['map_bytes'],
+            'table_bytes': runs[-1]['table_bytes']}
+
+def environment() -> dict:
+    '''returns git commit and versions behind a run'''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'plotly': plotly.__version__}
+
+def print_results(results: dict = None,
+                  base: dict = None) -> None:
+    '''prints seconds per stage, per scale, and the change from base (same scale) when given'''
+    for n, res in results['scales'].items():
+        base_res = (base or {}).get('scales', {}).get(n)
+        print(f'\n{n} schools (map {res["map_bytes"]/1e6:.2f} MB, table {res["table_bytes"]/1e6:.2f} MB)')
+        print(f'{"stage":<12}{"time (s)":>10}' + (f'{"base (s)":>10}{"change":>9}' if base_res else ''))
+        for stage in STAGES:
+            secs = res['seconds'][stage]
+            line = f'{stage:<12}{secs:>10.3f}'
+            if base_res and stage in base_res['seconds']:
+                was = base_res['seconds'][stage]
+                line += f'{was:>10.3f}' + (f'{(secs - was) / was:>+9.0%}' if was > 0 else f'{"":>9}')
+            print(line)
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='map and table stage benchmark, on synthetic data')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000], help='numbers of schools (1k-100k)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scale; each stage reports its best')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the synthetic data')
+    parser.add_argument('--hover', choices=['text', 'template'], default='text', help='map hover mode')
+    parser.add_argument('--out', default='bench_results.json', help='results JSON path')
+    parser.add_argument('--compare', help='results JSON of an earlier run, to compare against')
+    args = parser.parse_args()
+
+    results = dict(environment(), repeat=args.repeat, seed=args.seed, hover=args.hover, scales={})
+    for n in args.scales:
+        results['scales'][str(n)] = run_scale(n, args.repeat, args.seed, args.hover)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    base = None
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        print(f'commit {results["commit"]} vs {base.get("commit")}')
+    print_results(results, base)
+    print(f'\nwrote {args.out}')
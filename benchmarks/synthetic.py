@@ -0,0 +1,270 @@
+import json
+from typing import List, Dict, Tuple, Any
+
+import numpy as np
+import pandas as pd
+
+from genplot.utils import PLOTS_DICT
+from genplot.shared import SharedData
+from genplot.earnings import Earnings, wage_var_dict, states_abbr, SIZE_VAR, RESULTS_PER_PAGE
+
+'''
+Synthetic IPEDS and College Scorecard data, for running the builders offline.
+
+- institutions() makes a universe of n schools (ids, names, places, sizes)
+- subject_data() makes genpeds-shaped data for any PLOTS_DICT subject, with its cols_to_keep
+- scorecard_pages() makes College Scorecard API result pages (JSON strings), as served by the API
+- SyntheticData is a SharedData that serves the above instead of genpeds and the Scorecard API,
+  so MultiMap(shared=...) and EdDataTable(shared=...) run unchanged. Scorecard pages are parsed by
+  the real Earnings.get_wages; only the page request is swapped out (see OfflineEarnings)
+
+Values are random, but shaped like the real data: skewed school sizes, missing values,
+schools that didn't report in earlier years, and several CIP rows per school for completion.
+'''
+
+RACES = ['wt', 'bk', 'asn', 'hsp']
+SAT_ACT = {'sat_rw': (400, 760), 'sat_math': (400, 780), 'act_eng': (14, 35),
+           'act_math': (15, 34), 'act_comp': (16, 35)}
+CIPS = {'11.0701': 'Computer Science.', '14.0901': 'Computer Engineering, General.',
+        '24.0101': 'Liberal Arts and Sciences/Liberal Studies.', '26.0101': 'Biology/Biological Sciences, General.',
+        '42.0101': 'Psychology, General.', '51.3801': 'Registered Nursing/Registered Nurse.',
+        '52.0201': 'Business Administration and Management, General.', '45.1001': 'Political Science and Government, General.'}
+
+def institutions(n: int = 1000,
+                 seed: int = 0) -> pd.DataFrame:
+    '''returns n synthetic schools: id, name, city, state, latitude, longitude, size, men_share
+
+    :param n: number of schools
+    :param seed: random seed
+    '''
+    rng = np.random.default_rng(seed)
+    ids = pd.Series(np.arange(100000, 100000 + n)).astype(str)
+    kind = rng.choice(np.array(['University', 'College', 'Community College', 'Institute of Technology']), n)
+    lat = rng.uniform(25, 49, n)
+    lat[rng.random(n) < .02] = np.nan # a few schools aren't geocoded
+    return pd.DataFrame({
+        'id': ids,
+        'name': 'Synthetic ' + pd.Series(kind) + ' ' + ids,
+        'city': 'City ' + pd.Series(rng.integers(0, max(n // 5, 1), n)).astype(str),
+        'state': rng.choice(np.array(states_abbr), n),
+        'latitude': lat,
+        'longitude': rng.uniform(-124, -67, n),
+        'size': rng.lognormal(7, 1.4, n).round(), # skewed, like enrollment
+        'men_share': rng.beta(8, 10, n), # around 44% men
+    })
+
+def _col(rng: np.random.Generator = None,
+         lo: float = 0,
+         hi: float = 100,
+         size: int = 0,
+         na: float = .05) -> np.ndarray:
+    '''uniform column, with a share na of missing values'''
+    v = rng.uniform(lo, hi, size)
+    v[rng.random(size) < na] = np.nan
+    return v
+
+def _counts(rng: np.random.Generator = None,
+            tot: np.ndarray = None,
+            na: float = .02) -> Tuple[np.ndarray, np.ndarray]:
+    '''splits tot into (men, women) race/ethnicity counts, each a random share of the total'''
+    share = rng.uniform(0, .6, len(tot))
+    men = (tot * share * rng.uniform(.3, .6, len(tot))).round()
+    women = (tot * share).round() - men
+    men[rng.random(len(tot)) < na] = np.nan
+    return men, women
+
+def _year_data(univ: pd.DataFrame = None,
+               subject: str = None,
+               year: int = None,
+               rng: np.random.Generator = None,
+               **kwargs) -> Dict[str, Any]:
+    '''returns {col: values} of one year of subject data, for the schools in univ'''
+    m = len(univ)
+    size = univ['size'].to_numpy() * rng.uniform(.85, 1.15, m)
+    men_share = np.clip(univ['men_share'].to_numpy() + rng.normal(0, .02, m), 0, 1)
+    d = {'year': np.full(m, year), 'id': univ['id'].to_numpy(), 'name': univ['name'].to_numpy(),
+         'city': univ['city'].to_numpy(), 'state': univ['state'].to_numpy(),
+         'latitude': univ['latitude'].to_numpy(), 'longitude': univ['longitude'].to_numpy()}
+    if subject == 'admissions':
+        open_adm = rng.random(m) < .35 # open admission schools report no applicants
+        applied = np.where(open_adm, np.nan, (size * rng.uniform(.5, 4, m)).round())
+        rate = rng.beta(5, 3, m)
+        d['tot_enrolled'] = (size * rng.uniform(.15, .3, m)).round()
+        d['men_enrolled'] = (d['tot_enrolled'] * men_share).round()
+        d['men_applied'] = (applied * men_share).round()
+        d['men_admitted'] = (d['men_applied'] * rate).round()
+        d['men_applied_share'] = men_share * 100
+        d['men_admitted_share'] = np.clip(men_share * 100 + rng.normal(0, 3, m), 0, 100)
+        d['accept_rate_men'] = rate * 100
+        d['accept_rate_women'] = np.clip(rate * 100 + rng.normal(3, 5, m), 0, 100)
+        d['yield_rate_men'] = np.where(open_adm, np.nan, rng.uniform(10, 90, m))
+        d['yield_rate_women'] = np.where(open_adm, np.nan, rng.uniform(10, 90, m))
+        for test, (lo, hi) in SAT_ACT.items():
+            p25 = _col(rng, lo, hi - (hi - lo) / 4, m, na=.4).round()
+            d[f'{test}_25'] = p25
+            d[f'{test}_75'] = np.minimum(p25 + rng.uniform(0, (hi - lo) / 4, m).round(), hi)
+    elif subject in ['enrollment', 'completion', 'graduation']:
+        if subject == 'enrollment':
+            d['studentlevel'] = kwargs.get('student_level')
+            tot = size * (.2 if kwargs.get('student_level') == 'grad' else 1)
+        else:
+            d['deglevel'] = kwargs.get('degree_level')
+            tot = size * rng.uniform(.1, .3, m)
+        d['totmen'] = (tot * men_share).round()
+        d['totwomen'] = (tot - d['totmen']).round()
+        d['totmen'][rng.random(m) < .01] = np.nan
+        if subject != 'graduation':
+            with np.errstate(invalid='ignore', divide='ignore'): # schools with no students
+                d['totmen_share'] = d['totmen'] / (d['totmen'] + d['totwomen']) * 100
+        for race in RACES:
+            d[f'{race}men'], d[f'{race}women'] = _counts(rng, tot)
+        if subject == 'graduation':
+            rate_men, rate_women = rng.beta(5, 4, m), rng.beta(6, 4, m)
+            d['totmen_graduated'] = (d['totmen'] * rate_men).round()
+            d['totwomen_graduated'] = (d['totwomen'] * rate_women).round()
+            d['gradrate_totmen'] = rate_men * 100
+            d['gradrate_totwomen'] = rate_women * 100
+            for race in RACES:
+                d[f'gradrate_{race}men'] = _col(rng, 0, 100, m, na=.15)
+                d[f'gradrate_{race}women'] = _col(rng, 0, 100, m, na=.15)
+    else:
+        raise ValueError(f'subject should be one of {list(PLOTS_DICT.keys())}')
+    return d
+
+def subject_data(univ: pd.DataFrame = None,
+                 subject: str = None,
+                 years: List[int] = None,
+                 seed: int = 0,
+                 cips: int = 4,
+                 **kwargs) -> pd.DataFrame:
+    '''returns genpeds-shaped data for a subject: the subject's cols_to_keep (see PLOTS_DICT), one row per school and year
+    (one row per school, year and CIP code, for completion). Fewer schools report in earlier years
+
+    :param univ: schools, from institutions()
+    :param subject: IPEDS data subject string; e.g., 'enrollment'
+    :param years: list of years
+    :param seed: random seed
+    :param cips: CIP codes per school (completion only)
+    :param kwargs: run kwargs, like student_level = 'grad' (or degree_level), which fill in studentlevel/deglevel
+    '''
+    years = sorted(years)
+    out = []
+    for year in years:
+        rng = np.random.default_rng([seed, year, len(subject), len(json.dumps(kwargs, sort_keys=True, default=str))])
+        present = rng.random(len(univ)) < 1 - .02 * (years[-1] - year) / 2 # 1 in 10 schools is missing 10 years back
+        yr_univ = univ.loc[present]
+        if subject == 'completion':
+            yr_univ = yr_univ.loc[yr_univ.index.repeat(cips)]
+        d = _year_data(yr_univ, subject, year, rng, **kwargs)
+        if subject == 'completion':
+            codes = rng.choice(np.array(list(CIPS.keys())), len(yr_univ))
+            d['cip'] = codes
+            d['cip_description'] = pd.Series(codes).map(CIPS).to_numpy()
+        out.append(pd.DataFrame(d))
+    df = pd.concat(out, ignore_index=True)
+    return df.loc[:, [col for col in PLOTS_DICT[subject]['cols_to_keep'] if col in df.columns]]
+
+def scorecard_pages(univ: pd.DataFrame = None,
+                    wage_var: str = 'median',
+                    poplimit: int = 300,
+                    seed: int = 0) -> List[str]:
+    '''returns College Scorecard API result pages (JSON strings) for schools of size >= poplimit,
+    with the fields Earnings.get_wages asks for: id, school.name, male and female earnings, and size
+
+    :param univ: schools, from institutions()
+    :param wage_var: wage variable, e.g. 'median'
+    :param poplimit: enrollment lower bound
+    :param seed: random seed
+    '''
+    rng = np.random.default_rng(seed)
+    v_1, v_2 = wage_var_dict[wage_var]
+    size = (univ['size'] * rng.uniform(.6, .9, len(univ))).round() # undergrad degree-seeking size
+    schools = univ.assign(size=size).loc[size >= poplimit]
+    n = len(schools)
+    men = rng.lognormal(10.8, .3, n).round()
+    women = (men * rng.uniform(.7, 1, n)).round()
+    men_known, women_known = rng.random(n) > .1, rng.random(n) > .12 # Scorecard suppresses small cohorts
+    results = [{'id': int(id_), 'school.name': name,
+                v_1: float(m) if mk else None, v_2: float(w) if wk else None,
+                SIZE_VAR: int(sz)}
+               for id_, name, m, w, mk, wk, sz in zip(schools['id'], schools['name'], men, women,
+                                                      men_known, women_known, schools['size'])]
+    return [json.dumps({'metadata': {'total': n, 'page': pg, 'per_page': RESULTS_PER_PAGE},
+                        'results': results[pg * RESULTS_PER_PAGE:(pg + 1) * RESULTS_PER_PAGE]})
+            for pg in range(max(-(-n // RESULTS_PER_PAGE), 1))]
+
+
+class OfflineEarnings(Earnings):
+    '''Earnings that reads Scorecard result pages from memory, instead of the API'''
+    def __init__(self,
+                 pages: List[str] = None):
+        '''offline Scorecard earnings
+
+        :param pages: result pages, from scorecard_pages()
+        '''
+        super().__init__(api_key='synthetic', use_cache=False, offline=False)
+        self.pages = pages
+
+    def _get_page(self,
+                  params: Dict[str, Any] = None,
+                  page: int = 0) -> Dict[str, Any]:
+        '''returns json of one results page'''
+        return json.loads(self.pages[page])
+
+
+class SyntheticData(SharedData):
+    '''SharedData that serves synthetic subject data and Scorecard earnings'''
+    def __init__(self,
+                 n: int = 1000,
+                 seed: int = 0):
+        '''synthetic shared data. Plan it (e.g., MultiMap.plan_data), call generate(), then fetch() and build as usual.
+        Unplanned requests are generated on demand.
+
+        :param n: number of schools
+        :param seed: random seed
+        '''
+        super().__init__(api_key='synthetic')
+        self.seed = seed
+        self.universe = institutions(n, seed)
+        self.raw = {} # plan key -> generated subject data
+        self.pages = {} # wage_var -> (poplimit, scorecard pages)
+
+    def generate(self) -> None:
+        '''generates every planned dataset, so fetch() only times loading them'''
+        for key, entry in self.subject_plan.items():
+            self.raw[key] = subject_data(self.universe, entry['subject'], sorted(entry['years']),
+                                         seed=self.seed, **entry['kwargs'])
+        for wage_var, poplimit in self.earnings_plan.items():
+            self.pages[wage_var] = (poplimit, scorecard_pages(self.universe, wage_var, poplimit, self.seed))
+
+    def _fetch_subject(self,
+                       key: Tuple[str, str] = None,
+                       subject: str = None,
+                       years: List[int] = None,
+                       **kwargs) -> pd.DataFrame:
+        '''returns generated subject data for years'''
+        with self._key_lock(key):
+            held = self.subject_data.get(key)
+            if held is None or not set(years) <= held[0]:
+                df = self.raw.get(key)
+                if df is None or not set(years) <= set(df['year'].unique()):
+                    df = subject_data(self.universe, subject, years, seed=self.seed, **kwargs)
+                held = (set(df['year'].unique()), df)
+                self.subject_data[key] = held
+            return held[1]
+
+    def _fetch_earnings(self,
+                        wage_var: str = 'median',
+                        poplimit: int = 300) -> Earnings:
+        '''parses generated Scorecard pages at poplimit, with Earnings.get_wages'''
+        with self._key_lock(('earnings', wage_var)):
+            held = self.earnings_data.get(wage_var)
+            if held is None or held[0] > poplimit:
+                pages = self.pages.get(wage_var)
+                if pages is None or pages[0] > poplimit:
+                    pages = (poplimit, scorecard_pages(self.universe, wage_var, poplimit, self.seed))
+                earn = OfflineEarnings(pages[1])
+                earn.get_wages(wage_var=wage_var, poplimit=pages[0], with_size=True)
+                held = (pages[0], earn)
+                self.earnings_data[wage_var] = held
+            return held[1]
@@ -0,0 +1,448 @@
+import os
+import json
+import time
+import inspect
+import hashlib
+import threading
+from contextlib import contextmanager
+from importlib import metadata
+from pathlib import Path
+from typing import List, Dict, Union, Optional, Tuple, Any, Callable
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError: # not on windows
+    fcntl = None
+
+'''
+In this module, we define the on-disk caches used by genplot.
+
+Pulling IPEDS data through genpeds is slow, and a single map + table build
+asks for the same subject/years several times. DiskCache stores content-addressed
+files under a cache directory, with a time-to-live (TTL) and size-based
+least-recently-used (LRU) eviction. SubjectCache builds on it to store subject
+dataframes as Parquet, and EarningsCache to store College Scorecard earnings as JSON.
+
+FrameCache and TableCache hold build artefacts (map frames as JSON, table tabs as
+Parquet), keyed on a fingerprint of everything that goes into them: the source data
+(data_hash), the builder config, build parameters and the genplot source code (code_hash).
+Rebuilds reuse every artefact whose fingerprint is unchanged.
+
+Builds running at the same time (e.g. build_all and a separate script) can share
+a cache directory: entries and the index are written to temp files and moved into
+place, and index updates hold a file lock (index.lock), so no process loses
+another's entries. The file lock uses fcntl, so on Windows, where there is none,
+only threads of one process are kept in step; run one build at a time there.
+
+The cache is configured with environmental variables (all optional):
+- GENPLOT_CACHE_DIR (cache directory, defaults to .genplot_cache)
+- GENPLOT_CACHE_TTL (seconds before an entry goes stale, defaults to one week)
+- GENPLOT_CACHE_MAX_MB (size limit of each cache, defaults to 2048)
+- GENPLOT_SCORECARD_TTL (seconds before Scorecard earnings go stale, defaults to 30 days)
+- GENPLOT_CACHE (set to 0 to turn every cache off)
+'''
+
+DEFAULT_CACHE_DIR = '.genplot_cache'
+DEFAULT_TTL = 7 * 24 * 60 * 60 # one week, in seconds
+DEFAULT_SCORECARD_TTL = 30 * 24 * 60 * 60 # Scorecard data change a few times a year
+DEFAULT_MAX_MB = 2048
+
+# run() kwargs that don't change the data returned
+IGNORED_KWARGS = ('see_progress', 'rm_disk')
+
+
+def cache_key(*parts: Any) -> str:
+    '''returns a content-addressed key (sha256 hex digest) for a set of JSON-able parts'''
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def normalize_years(years: Union[List[int], Tuple[int], int] = None) -> List[int]:
+    '''returns sorted list of years, following genpeds conventions:<br>
+    tuples are inclusive ranges, lists are groups of single years, ints are single years'''
+    if isinstance(years, tuple):
+        start, end = years
+        return list(range(start, end + 1))
+    elif isinstance(years, list):
+        return sorted(set(years))
+    elif isinstance(years, int):
+        return [years]
+    else:
+        raise TypeError('years param should be int, list or tuple.')
+
+def _stable(obj: Any = None) -> Any:
+    '''json fallback for fingerprint parts: functions by source code, dataframes by data_hash, arrays as lists'''
+    if isinstance(obj, pd.DataFrame):
+        return data_hash(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if callable(obj):
+        try:
+            return inspect.getsource(obj).strip()
+        except (OSError, TypeError):
+            return getattr(obj, '__qualname__', repr(obj))
+    return str(obj)
+
+def fingerprint(*parts: Any) -> str:
+    '''returns a fingerprint (sha256 hex digest) of build inputs. Unlike cache_key, parts can hold
+    functions (e.g. MM_MAP sizing functions) and dataframes, which are fingerprinted by content'''
+    raw = json.dumps(parts, sort_keys=True, default=_stable)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def data_hash(df: pd.DataFrame = None) -> str:
+    '''returns content hash of a dataframe (columns, dtypes, index and values)'''
+    h = hashlib.sha256()
+    h.update(json.dumps([[str(c) for c in df.columns], [str(d) for d in df.dtypes]]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+_CODE_HASH = None
+
+def code_hash() -> str:
+    '''returns hash of the genplot source code, so build artefacts go stale when the code changes'''
+    global _CODE_HASH
+    if _CODE_HASH is None:
+        h = hashlib.sha256()
+        for fpath in sorted(Path(__file__).parent.glob('*.py')):
+            h.update(fpath.name.encode('utf-8'))
+            h.update(fpath.read_bytes())
+        _CODE_HASH = h.hexdigest()
+    return _CODE_HASH
+
+def _pkg_version(pkg: str) -> str:
+    '''returns installed version of a package, or empty string if unknown'''
+    try:
+        return metadata.version(pkg)
+    except metadata.PackageNotFoundError:
+        return ''
+
+
+class DiskCache:
+    '''content-addressed file cache, with TTL and size-based LRU eviction'''
+    suffix = ''
+    keep_stale = False # when True, stale entries are only evicted for size, so they can still be read with stale_ok
+
+    def __init__(self,
+                 namespace: str = None,
+                 cache_dir: str = None,
+                 ttl: float = None,
+                 max_mb: float = None):
+        '''content-addressed file cache
+
+        :param namespace: sub-directory of the cache directory, e.g. 'subjects'
+        :param cache_dir: cache directory. Defaults to GENPLOT_CACHE_DIR, or .genplot_cache
+        :param ttl: seconds before an entry goes stale. Defaults to GENPLOT_CACHE_TTL, or one week. Values of 0 or less never expire
+        :param max_mb: size limit of the cache, in megabytes. Defaults to GENPLOT_CACHE_MAX_MB, or 2048
+        '''
+        cache_dir = cache_dir or os.getenv('GENPLOT_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.dir = Path(cache_dir) / namespace
+        self.ttl = ttl if ttl is not None else float(os.getenv('GENPLOT_CACHE_TTL', DEFAULT_TTL))
+        max_mb = max_mb if max_mb is not None else float(os.getenv('GENPLOT_CACHE_MAX_MB', DEFAULT_MAX_MB))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.index_path = self.dir / 'index.json'
+        self._lock = threading.RLock()
+        self._lock_depth = 0 # nested _locked() calls of the thread holding _lock
+
+    def path(self,
+             key: str) -> Path:
+        '''returns file path of a key'''
+        return self.dir / f'{key}{self.suffix}'
+
+    @contextmanager
+    def _locked(self):
+        '''holds the cache lock, across threads (_lock) and processes (an exclusive flock on index.lock)'''
+        with self._lock:
+            lockf = None
+            if self._lock_depth == 0 and fcntl is not None:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                lockf = open(self.dir / 'index.lock', 'a')
+                fcntl.flock(lockf, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if lockf is not None:
+                    fcntl.flock(lockf, fcntl.LOCK_UN)
+                    lockf.close()
+
+    def _read_index(self) -> Dict[str,float]:
+        '''returns {key: last access time} index'''
+        try:
+            with open(self.index_path, 'r') as idxf:
+                return json.load(idxf)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self,
+                     index: Dict[str,float]) -> None:
+        '''writes index atomically'''
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'w') as idxf:
+            json.dump(index, idxf)
+        os.replace(tmp, self.index_path)
+
+    def is_fresh(self,
+                 key: str,
+                 stale_ok: bool = False) -> bool:
+        '''returns True if key exists on disk, and is younger than the TTL (or stale_ok is True)'''
+        fpath = self.path(key)
+        if not fpath.exists():
+            return False
+        if not stale_ok and self.ttl > 0 and time.time() - fpath.stat().st_mtime > self.ttl:
+            return False
+        return True
+
+    def get_path(self,
+                 key: str,
+                 stale_ok: bool = False) -> Optional[Path]:
+        '''returns file path of a fresh entry (and marks it as recently used), else None'''
+        if not self.is_fresh(key, stale_ok=stale_ok):
+            return None
+        with self._locked():
+            if not self.is_fresh(key, stale_ok=stale_ok): # evicted meanwhile
+                return None
+            index = self._read_index()
+            index[key] = time.time()
+            self._write_index(index)
+            return self.path(key)
+
+    def put_path(self,
+                 key: str,
+                 writer: Callable[[Path], None]) -> Path:
+        '''writes an entry with writer(tmp_path), then moves it into place and evicts old entries'''
+        self.dir.mkdir(parents=True, exist_ok=True)
+        fpath = self.path(key)
+        tmp = fpath.with_name(f'{fpath.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            writer(tmp) # temp files are per process and thread, so only moving them in is locked
+            with self._locked():
+                os.replace(tmp, fpath)
+                index = self._read_index()
+                index[key] = time.time()
+                self._write_index(index)
+                self.evict()
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        return fpath
+
+    def evict(self) -> None:
+        '''removes stale entries, then least-recently-used entries until the cache fits in max_mb'''
+        with self._locked():
+            index = self._read_index()
+            entries = []
+            for key in list(index.keys()):
+                fpath = self.path(key)
+                if not self.is_fresh(key, stale_ok=self.keep_stale):
+                    fpath.unlink(missing_ok=True)
+                    del index[key]
+                else:
+                    entries.append((index[key], key, fpath.stat().st_size))
+            tot_bytes = sum(e[2] for e in entries)
+            for _, key, nbytes in sorted(entries): # oldest access first
+                if tot_bytes <= self.max_bytes:
+                    break
+                self.path(key).unlink(missing_ok=True)
+                del index[key]
+                tot_bytes -= nbytes
+            self._write_index(index)
+
+    def clear(self) -> None:
+        '''removes every entry in the cache'''
+        with self._locked():
+            for key in self._read_index().keys():
+                self.path(key).unlink(missing_ok=True)
+            self._write_index({})
+
+
+class SubjectCache(DiskCache):
+    '''Parquet cache of genpeds subject data'''
+    suffix = '.parquet'
+
+    def __init__(self,
+                 cache_dir: str = None,
+                 ttl: float = None,
+                 max_mb: float = None):
+        '''Parquet cache of genpeds subject data, keyed on (subject, years, run kwargs)
+
+        :param cache_dir: cache directory. Defaults to GENPLOT_CACHE_DIR, or .genplot_cache
+        :param ttl: seconds before an entry goes stale
+        :param max_mb: size limit of the cache, in megabytes
+        '''
+        super().__init__(namespace='subjects', cache_dir=cache_dir, ttl=ttl, max_mb=max_mb)
+
+    def key(self,
+            subject: str = None,
+            years: Union[List[int], Tuple[int], int] = None,
+            **kwargs) -> str:
+        '''returns cache key for a subject request'''
+        run_kwargs = {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS}
+        return cache_key('subject', subject, normalize_years(years), run_kwargs, _pkg_version('genpeds'))
+
+    def get(self,
+            subject: str = None,
+            years: Union[List[int], Tuple[int], int] = None,
+            **kwargs) -> Optional[pd.DataFrame]:
+        '''returns cached dataframe, or None if missing or stale'''
+        fpath = self.get_path(self.key(subject, years, **kwargs))
+        if fpath is None:
+            return None
+        return pd.read_parquet(fpath)
+
+    def put(self,
+            df: pd.DataFrame = None,
+            subject: str = None,
+            years: Union[List[int], Tuple[int], int] = None,
+            **kwargs) -> None:
+        '''stores dataframe in the cache. Frames that can't be written as Parquet are skipped.'''
+        try:
+            self.put_path(self.key(subject, years, **kwargs),
+                          lambda fpath: df.to_parquet(fpath, index=True))
+        except (ValueError, TypeError, NotImplementedError, OSError):
+            return None
+
+
+class EarningsCache(DiskCache):
+    '''JSON cache of College Scorecard earnings'''
+    suffix = '.json'
+    keep_stale = True # offline mode falls back on stale earnings
+
+    def __init__(self,
+                 cache_dir: str = None,
+                 ttl: float = None,
+                 max_mb: float = None):
+        '''JSON cache of Earnings.get_wages results, keyed on (wage_var, poplimit, fields)
+
+        :param cache_dir: cache directory. Defaults to GENPLOT_CACHE_DIR, or .genplot_cache
+        :param ttl: seconds before an entry goes stale. Defaults to GENPLOT_SCORECARD_TTL, or 30 days
+        :param max_mb: size limit of the cache, in megabytes
+        '''
+        ttl = ttl if ttl is not None else float(os.getenv('GENPLOT_SCORECARD_TTL', DEFAULT_SCORECARD_TTL))
+        super().__init__(namespace='scorecard', cache_dir=cache_dir, ttl=ttl, max_mb=max_mb)
+
+    def key(self,
+            wage_var: str = None,
+            poplimit: int = None,
+            fields: str = None,
+            base_url: str = None) -> str:
+        '''returns cache key for a get_wages request'''
+        return cache_key('scorecard', wage_var, poplimit, fields, base_url)
+
+    def get(self,
+            stale_ok: bool = False,
+            **key_parts) -> Optional[Dict[str,List[Any]]]:
+        '''returns cached earnings dict (as written by Earnings.earnings_to_json), or None if missing or stale.
+        Values are tuples, as Earnings.get_wages holds them (json stores them as lists)'''
+        fpath = self.get_path(self.key(**key_parts), stale_ok=stale_ok)
+        if fpath is None:
+            return None
+        with open(fpath, 'r') as jf:
+            return {id_: tuple(v) for id_, v in json.load(jf).items()}
+
+    def put(self,
+            earnings_dat: Dict[str,Any] = None,
+            **key_parts) -> None:
+        '''stores earnings dict in the cache, in the same format as Earnings.earnings_to_json'''
+        def _write(fpath):
+            with open(fpath, 'w') as jf:
+                json.dump(earnings_dat, jf)
+        self.put_path(self.key(**key_parts), _write)
+
+
+class FrameCache(DiskCache):
+    '''JSON cache of built map frames'''
+    suffix = '.json'
+
+    def __init__(self,
+                 cache_dir: str = None,
+                 ttl: float = None,
+                 max_mb: float = None):
+        '''JSON cache of map frames, keyed on frame fingerprints (see MultiMap)
+
+        :param cache_dir: cache directory. Defaults to GENPLOT_CACHE_DIR, or .genplot_cache
+        :param ttl: seconds before an entry goes stale
+        :param max_mb: size limit of the cache, in megabytes
+        '''
+        super().__init__(namespace='frames', cache_dir=cache_dir, ttl=ttl, max_mb=max_mb)
+
+    def get(self,
+            key: str = None) -> Optional[str]:
+        '''returns cached frame json, or None if missing or stale'''
+        fpath = self.get_path(key)
+        if fpath is None:
+            return None
+        with open(fpath, 'r') as jf:
+            return jf.read()
+
+    def put(self,
+            key: str = None,
+            frame_json: str = None) -> None:
+        '''stores frame json in the cache'''
+        def _write(fpath):
+            with open(fpath, 'w') as jf:
+                jf.write(frame_json)
+        self.put_path(key, _write)
+
+
+class TableCache(DiskCache):
+    '''Parquet cache of built table tabs'''
+    suffix = '.parquet'
+
+    def __init__(self,
+                 cache_dir: str = None,
+                 ttl: float = None,
+                 max_mb: float = None):
+        '''Parquet cache of table tabs, keyed on tab fingerprints (see EdDataTable)
+
+        :param cache_dir: cache directory. Defaults to GENPLOT_CACHE_DIR, or .genplot_cache
+        :param ttl: seconds before an entry goes stale
+        :param max_mb: size limit of the cache, in megabytes
+        '''
+        super().__init__(namespace='tables', cache_dir=cache_dir, ttl=ttl, max_mb=max_mb)
+
+    def get(self,
+            key: str = None) -> Optional[pd.DataFrame]:
+        '''returns cached tab, or None if missing or stale'''
+        fpath = self.get_path(key)
+        if fpath is None:
+            return None
+        return pd.read_parquet(fpath)
+
+    def put(self,
+            key: str = None,
+            df: pd.DataFrame = None) -> None:
+        '''stores tab in the cache. Tabs that can't be written as Parquet are skipped.'''
+        try:
+            self.put_path(key, lambda fpath: df.to_parquet(fpath, index=True))
+        except (ValueError, TypeError, NotImplementedError, OSError):
+            return None
+
+
+_CACHES = {} # cache class -> shared instance
+
+def _get_cache(cls: type = None) -> Optional[DiskCache]:
+    '''returns the shared instance of a cache class, or None if GENPLOT_CACHE=0'''
+    if os.getenv('GENPLOT_CACHE', '1') == '0':
+        return None
+    if cls not in _CACHES:
+        _CACHES[cls] = cls()
+    return _CACHES[cls]
+
+def get_subject_cache() -> Optional[SubjectCache]:
+    '''returns the shared SubjectCache, or None if GENPLOT_CACHE=0'''
+    return _get_cache(SubjectCache)
+
+def get_earnings_cache() -> Optional[EarningsCache]:
+    '''returns the shared EarningsCache, or None if GENPLOT_CACHE=0'''
+    return _get_cache(EarningsCache)
+
+def get_frame_cache() -> Optional[FrameCache]:
+    '''returns the shared FrameCache, or None if GENPLOT_CACHE=0'''
+    return _get_cache(FrameCache)
+
+def get_table_cache() -> Optional[TableCache]:
+    '''returns the shared TableCache, or None if GENPLOT_CACHE=0'''
+    return _get_cache(TableCache)
@@ -1,11 +1,51 @@
-from .utils import CleanForPlot, int_value_handler
+import os
+import gzip
+import json
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Any
+
+from .utils import CleanForPlot, int_value_handler_vec
 from .earnings import Earnings
+from .shared import SharedData
+from .cache import TableCache, get_table_cache, fingerprint, data_hash, code_hash
+from .instrument import instrumented
 
 '''
 In this module, we'll build our data table,
 using the (aptly named) DataTable Javascript library
 '''
 
+logger = logging.getLogger(__name__)
+
+RENDER_MODES = ('html', 'json', 'shards', 'server')
+# path of the table server's DataTables endpoint, + tab name (see genplot.tableserver)
+SERVER_API = '/api/tables/'
+
+# bulk download files written next to the table page (see EdDataTable.write_exports): format -> file suffix
+EXPORT_FORMATS = {'parquet': 'parquet', 'csv': 'csv.gz'}
+# rows written at once, i.e. parquet row group size
+EXPORT_CHUNK_ROWS = 50_000
+
+# builds DataTables rows from a column-oriented payload ({'columns': [...], 'values': [[col0], [col1], ...]})
+DT_ROWS_JS = '''
+                    function dtRows(payload) {
+                        var cols = payload.values;
+                        var n = cols.length ? cols[0].length : 0;
+                        var rows = new Array(n);
+                        for (var r = 0; r < n; r++) {
+                            var row = new Array(cols.length);
+                            for (var c = 0; c < cols.length; c++) row[c] = cols[c][r];
+                            rows[r] = row;
+                        }
+                        return rows;
+                    }
+                        '''
+
 COLS2KEEP = {
     'admissions': {
         'name': 'School','year': 'Year','id': 'ID','city': 'City','state': 'State',
@@ -38,6 +78,11 @@ COLS2KEEP = {
     }
 }
 
+# run kwargs shared by every table
+GENERAL_KWRGS = {'rm_disk': False,'merge_with_char': True}
+# Scorecard enrollment lower bound for the earnings table
+EARNINGS_POPLIMIT = 500
+
 
 '''
 EdDataTable uses DataTables JS to make 
@@ -46,26 +91,28 @@ a queryable table of NCES IPEDS data
 class EdDataTable:
     '''Higher Ed Data Table'''
     def __init__(self,
-                 most_recent_year: int):
+                 most_recent_year: int,
+                 shared: SharedData = None,
+                 cache: TableCache = None,
+                 use_cache: bool = True):
         '''JS DataTable
         
         :param most_recent_year: most recent year of data available
+        :param shared: data shared with other builders (see genplot.shared). When None, each table loads its own data
+        :param cache: cache of built tabs. Defaults to the shared TableCache (see genplot.cache)
+        :param use_cache: when False, every tab is rebuilt from scratch
         '''
         self.most_recent_year = most_recent_year
+        self.shared = shared
+        self.cache = (cache or get_table_cache()) if use_cache else None
         self.dataframes = {}
+        self.clean_dataframes = {} # tab name -> cleaned data, before values are formatted for the page (see write_exports)
+        self.table_fingerprints = {} # tab name -> fingerprint of its inputs (see _table_from_cache)
 
-    def generate_df(self,
-                    earnings_api_key: str = 'COLLEGE_SCORECARD_KEY',
-                    inflation_adjust: float = 125.58) -> None:
-        '''generates higher ed dataframe 
-        
-        :param earnings_api_key: College Scorecard API key string.
-        :param inflation_adjust: the PCE index for the most recent year (WITH 2017 BEING THE INDEX == 100 LEVEL). This will be divided
-                                 by the 2022 index to bring 2022 estimates to modern dollars
-        '''
+    def _table_cfg(self) -> Dict[str,Dict[str,Any]]:
+        '''returns subject, run kwargs and years of each IPEDS table'''
         rcyr = self.most_recent_year
-        #init objs
-        cfg = {
+        return {
             'admissions': {'sbj': 'admissions','kwrgs': {'see_progress': False},
                            'yrs': [rcyr-20,rcyr-10,rcyr]},
             'enrollment_U': {'sbj': 'enrollment','kwrgs': {'student_level': 'undergrad'},
@@ -77,32 +124,139 @@ class EdDataTable:
             'graduation_bach': {'sbj': 'graduation','kwrgs': {'degree_level': 'bach'},
                                 'yrs': [rcyr-20,rcyr-10,rcyr]}
         }
-        general_kwrgs = {'rm_disk': False,'merge_with_char': True}
-        # get dat
-        for i in cfg.keys():
-            i_cfg = cfg[i]
-            df = CleanForPlot(subject=i_cfg['sbj'],
-                             years=i_cfg['yrs'],
-                             poplimit=500)._run_data(**i_cfg['kwrgs'],
-                                                   **general_kwrgs)
-            df = df.reindex(columns=COLS2KEEP[i].keys())
-            df = df.rename(columns=COLS2KEEP[i])
-            for col in df.columns:
-                if col not in ['Year','ID','School','City','State']:
-                    df[col] = df[col].apply(int_value_handler)
-                    if 'Share' in col or 'Rate' in col:
-                        df[col] = df[col].astype(str) + '%'
-            df = df.sort_values(by='Year',ignore_index=True)
-            self.dataframes[i] = df.drop_duplicates()
+
+    def plan_data(self,
+                  shared: SharedData = None) -> None:
+        '''registers the data generate_df needs with a SharedData plan
+
+        :param shared: SharedData to plan with
+        '''
+        for i_cfg in self._table_cfg().values():
+            shared.add_subject(i_cfg['sbj'], i_cfg['yrs'], **i_cfg['kwrgs'], **GENERAL_KWRGS)
+        # earnings table
+        shared.add_subject('admissions', self.most_recent_year, **GENERAL_KWRGS)
+        shared.add_earnings('median', EARNINGS_POPLIMIT)
+
+    @instrumented('EdDataTable.generate_df', rows=lambda _, self: sum(len(df) for df in self.dataframes.values()))
+    def generate_df(self,
+                    earnings_api_key: str = 'COLLEGE_SCORECARD_KEY',
+                    inflation_adjust: float = 125.58,
+                    max_workers: int = None) -> None:
+        '''generates higher ed dataframe. Tables are made in a thread pool, but their genpeds loads
+        run one at a time (see utils._GENPEDS_LOCK), so the threads overlap cached loads, Scorecard paging and cleaning only
+        
+        :param earnings_api_key: College Scorecard API key string.
+        :param inflation_adjust: the PCE index for the most recent year (WITH 2017 BEING THE INDEX == 100 LEVEL). This will be divided
+                                 by the 2022 index to bring 2022 estimates to modern dollars
+        :param max_workers: number of table threads. Defaults to one worker per table
+        '''
+        #init objs
+        cfg = self._table_cfg()
+        jobs = {i: partial(self._make_table, i, cfg[i]) for i in cfg.keys()}
         # add earnings now
-        earn = Earnings(api_key=earnings_api_key)
-        earn.get_wages(wage_var='median',poplimit=500)
-        dat = earn.earnings_dat
+        jobs['earnings'] = partial(self._make_earnings_table, earnings_api_key, inflation_adjust)
+        # get dat in threads (IPEDS loads one at a time); tables are stored in cfg order (then earnings), which sets the html tab order
+        with ThreadPoolExecutor(max_workers=max_workers or len(jobs)) as pool:
+            futures = {i: pool.submit(job) for i, job in jobs.items()}
+            for i, fut in futures.items():
+                self.clean_dataframes[i], self.dataframes[i] = fut.result()
+
+    def _table_from_cache(self,
+                          i: str = None,
+                          fp: str = None,
+                          build: Any = None) -> pd.DataFrame:
+        '''returns cached tab for fingerprint fp, or builds it with build() and caches it'''
+        self.table_fingerprints[i] = fp
+        if self.cache is None:
+            return build()
+        cached = self.cache.get(fp)
+        if cached is not None:
+            logger.info('reused %s tab (unchanged inputs)', i)
+            return cached
+        df = build()
+        self.cache.put(fp, df)
+        return df
+
+    def _make_table(self,
+                    i: str = None,
+                    i_cfg: Dict[str,Any] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        '''returns (cleaned, formatted) dataframes of an IPEDS table. The formatted one is reused from the table cache
+        when its inputs (source data, table config, COLS2KEEP, code) are unchanged
+
+        :param i: table name, e.g. 'enrollment_U'
+        :param i_cfg: table config, from _table_cfg
+        '''
+        df = CleanForPlot(subject=i_cfg['sbj'],
+                         years=i_cfg['yrs'],
+                         poplimit=500,
+                         source=self.shared)._run_data(**i_cfg['kwrgs'],
+                                                       **GENERAL_KWRGS)
+        fp = fingerprint('table', i, i_cfg, COLS2KEEP[i], data_hash(df), code_hash())
+        clean = self._clean_table(i, df)
+        return clean, self._table_from_cache(i, fp, partial(self._format_table, clean))
+
+    def _clean_table(self,
+                     i: str = None,
+                     df: pd.DataFrame = None) -> pd.DataFrame:
+        '''returns IPEDS table data, with COLS2KEEP columns, sorted by year
+
+        :param i: table name, e.g. 'enrollment_U'
+        :param df: table data, from CleanForPlot
+        '''
+        df = df.reindex(columns=COLS2KEEP[i].keys())
+        df = df.rename(columns=COLS2KEEP[i])
+        df = df.sort_values(by='Year',ignore_index=True)
+        return df.drop_duplicates()
+
+    def _format_table(self,
+                      df: pd.DataFrame = None) -> pd.DataFrame:
+        '''returns IPEDS table with formatted values: whole numbers, with a % for shares and rates, and 'NA' when missing
+
+        :param df: table data, from _clean_table
+        '''
+        df = df.copy()
+        for col in df.columns:
+            if col not in ['Year','ID','School','City','State']:
+                df[col] = int_value_handler_vec(df[col])
+                if 'Share' in col or 'Rate' in col:
+                    df[col] = df[col].astype(str) + '%'
+        return df.drop_duplicates()
+
+    def _make_earnings_table(self,
+                             earnings_api_key: str = None,
+                             inflation_adjust: float = 125.58) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        '''returns (cleaned, formatted) dataframes of Scorecard earnings. The formatted one is reused from the table cache
+        when its inputs (earnings, admissions data, inflation adjustment, code) are unchanged
+
+        :param earnings_api_key: College Scorecard API key string.
+        :param inflation_adjust: the PCE index for the most recent year (WITH 2017 BEING THE INDEX == 100 LEVEL)
+        '''
+        if self.shared is not None:
+            dat = self.shared.earnings(wage_var='median',poplimit=EARNINGS_POPLIMIT)
+        else:
+            earn = Earnings(api_key=earnings_api_key)
+            earn.get_wages(wage_var='median',poplimit=EARNINGS_POPLIMIT)
+            dat = earn.earnings_dat
+        earn_df = CleanForPlot(subject='admissions',
+                               years=self.most_recent_year,poplimit=0,
+                               source=self.shared)._run_data(**GENERAL_KWRGS).loc[:,['name','id','city','state']]
+        fp = fingerprint('earnings_table', inflation_adjust, EARNINGS_POPLIMIT, dat, data_hash(earn_df), code_hash())
+        clean = self._clean_earnings_table(dat, earn_df, inflation_adjust)
+        return clean, self._table_from_cache('earnings', fp, partial(self._format_earnings_table, clean))
+
+    def _clean_earnings_table(self,
+                              dat: Dict[str,List[Any]] = None,
+                              earn_df: pd.DataFrame = None,
+                              inflation_adjust: float = 125.58) -> pd.DataFrame:
+        '''returns earnings table, with inflation adjusted values
+
+        :param dat: earnings dict, {school_id: [male_earnings,female_earnings]}
+        :param earn_df: most recent admissions data (name, id, city and state)
+        :param inflation_adjust: the PCE index for the most recent year (WITH 2017 BEING THE INDEX == 100 LEVEL)
+        '''
         male_earn_map = {id_:dat[id_][0] for id_ in dat.keys()} # male earnings
         female_earn_map = {id_:dat[id_][1] for id_ in dat.keys()} # female earnings
-        earn_df = CleanForPlot(subject='admissions',
-                               years=self.most_recent_year,poplimit=0)._run_data(merge_with_char=True,
-                                                                      rm_disk=False).loc[:,['name','id','city','state']]
+        earn_df = earn_df.copy()
         earn_df['MaleEarnings'] = earn_df['id'].map(male_earn_map)
         earn_df['FemaleEarnings'] = earn_df['id'].map(female_earn_map)
         earn_df = earn_df.rename(columns={'name': 'School','id': 'ID','city': 'City','state': 'State'}) # rename cols
@@ -114,18 +268,133 @@ class EdDataTable:
         idx_22 = 116.11
         earn_df['MaleEarnings'] = earn_df['MaleEarnings'] * (inflation_adjust / idx_22)
         earn_df['FemaleEarnings'] = earn_df['FemaleEarnings'] * (inflation_adjust / idx_22)
+        return earn_df.drop_duplicates()
+
+    def _format_earnings_table(self,
+                               earn_df: pd.DataFrame = None) -> pd.DataFrame:
+        '''returns earnings table with formatted values: whole dollars, and 'NA' when missing
+
+        :param earn_df: earnings table, from _clean_earnings_table
+        '''
+        earn_df = earn_df.copy()
         # round now
         for col in ['MaleEarnings','FemaleEarnings']:
-            earn_df[col] = '$' + earn_df[col].apply(int_value_handler).astype(str)
-        self.dataframes['earnings'] = earn_df.drop_duplicates()
+            earn_df[col] = '$' + int_value_handler_vec(earn_df[col])
+        return earn_df.drop_duplicates()
         
     
+    def _table_payload(self,
+                       df: pd.DataFrame = None) -> Dict[str,List[Any]]:
+        '''returns column-oriented payload of a table: {'columns': [names], 'values': [[col0 cells], [col1 cells], ...]}.
+        Cells are the same strings to_html would print, so DataTables sorts/searches them the same way.'''
+        cells = df.astype(object).where(df.notna(), 'NA').astype(str)
+        return {'columns': [str(c) for c in cells.columns],
+                'values': [cells[c].tolist() for c in cells.columns]}
+
+    def _json_script(self,
+                     script_id: str = None,
+                     payload: Dict[str,List[Any]] = None) -> str:
+        '''returns payload as an inline (non-executed) json script tag'''
+        raw = json.dumps(payload, separators=(',',':')).replace('</', '<\\/') # don't close the script tag early
+        return f'<script type="application/json" id="{script_id}">{raw}</script>'
+
+    def _write_shards(self,
+                      out_path: str = 'table.html') -> Dict[str,str]:
+        '''writes each table's payload to out_path + '.{tab}.json', in parallel. returns {tab: shard url, relative to the page}'''
+        def _write(sbjct, df):
+            with open(f'{out_path}.{sbjct}.json', 'w') as shf:
+                json.dump(self._table_payload(df), shf, separators=(',',':'))
+        with ThreadPoolExecutor(max_workers=max(len(self.dataframes), 1)) as pool:
+            for fut in [pool.submit(_write, sbjct, df) for sbjct, df in self.dataframes.items()]:
+                fut.result()
+        page = os.path.basename(out_path)
+        return {sbjct: f'{page}.{sbjct}.json' for sbjct in self.dataframes.keys()}
+
+    def _write_parquet(self,
+                       df: pd.DataFrame = None,
+                       fpath: str = None,
+                       chunk_rows: int = EXPORT_CHUNK_ROWS) -> None:
+        '''writes df to fpath as parquet, one row group of chunk_rows rows at a time'''
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(fpath, schema) as writer:
+            for start in range(0, len(df), chunk_rows):
+                writer.write_table(pa.Table.from_pandas(df.iloc[start:start + chunk_rows],
+                                                        schema=schema, preserve_index=False))
+
+    def _write_csv(self,
+                   df: pd.DataFrame = None,
+                   fpath: str = None,
+                   chunk_rows: int = EXPORT_CHUNK_ROWS) -> None:
+        '''writes df to fpath as gzipped csv, chunk_rows rows at a time'''
+        with gzip.open(fpath, 'wt', newline='') as csvf:
+            df.head(0).to_csv(csvf, index=False)
+            for start in range(0, len(df), chunk_rows):
+                df.iloc[start:start + chunk_rows].to_csv(csvf, index=False, header=False)
+
+    @instrumented('EdDataTable.write_exports', rows=lambda _, self: sum(len(df) for df in self.clean_dataframes.values()))
+    def write_exports(self,
+                      out_path: str = 'table.html',
+                      formats: List[str] = None,
+                      chunk_rows: int = EXPORT_CHUNK_ROWS) -> Dict[str,Dict[str,str]]:
+        '''writes every table, in full, to out_path + '.{tab}.parquet' and out_path + '.{tab}.csv.gz', in parallel.
+        Tables are the cleaned data (clean_dataframes), with values as they were before being rounded and formatted
+        for the page (e.g. 45.7, not '45%'). returns {tab: {format: file url, relative to the page}}
+
+        :param out_path: output path of the table html
+        :param formats: formats to write (see EXPORT_FORMATS). Defaults to all of them
+        :param chunk_rows: rows written at once
+        '''
+        formats = list(EXPORT_FORMATS.keys()) if formats is None else formats
+        unknown = set(formats) - set(EXPORT_FORMATS.keys())
+        if unknown:
+            raise ValueError(f'export formats should be in {tuple(EXPORT_FORMATS.keys())}, not {sorted(unknown)}')
+        writers = {'parquet': self._write_parquet, 'csv': self._write_csv}
+        def _write(sbjct, df):
+            for fmt in formats:
+                writers[fmt](df, f'{out_path}.{sbjct}.{EXPORT_FORMATS[fmt]}', chunk_rows)
+        with ThreadPoolExecutor(max_workers=max(len(self.clean_dataframes), 1)) as pool:
+            for fut in [pool.submit(_write, sbjct, df) for sbjct, df in self.clean_dataframes.items()]:
+                fut.result()
+        page = os.path.basename(out_path)
+        return {sbjct: {fmt: f'{page}.{sbjct}.{EXPORT_FORMATS[fmt]}' for fmt in formats}
+                for sbjct in self.clean_dataframes.keys()}
+
+    def _export_links(self,
+                      urls: Dict[str,str] = None) -> str:
+        '''returns download links of a tab's export files'''
+        labels = {'parquet': 'Parquet', 'csv': 'CSV (gzip)'}
+        links = ' | '.join(f'<a href="{url}" download>{labels[fmt]}</a>' for fmt, url in urls.items())
+        return f'<p class="small mb-2">Download all rows: {links}</p>'
+
+    @instrumented('EdDataTable.generate_datatable', rows=lambda _, self: sum(len(df) for df in self.dataframes.values()))
     def generate_datatable(self,
-                           out_path: str = 'table.html') -> None:
+                           out_path: str = 'table.html',
+                           render: str = 'html',
+                           exports: bool = False,
+                           server_url: str = None) -> None:
         '''generates datatable, outputs html
         
         :out_path: output path for table html
+        :param render: how table rows are shipped to the page:<br>
+                       'html' -> every row is written as a <tr> (original output)<br>
+                       'json' -> rows are embedded as compact column-oriented json, and DataTables builds
+                       the rows of the visible page only (deferRender)<br>
+                       'shards' -> like 'json', but each tab's rows are written to a sidecar file (out_path + '.{tab}.json'),
+                       fetched and drawn the first time the tab is shown. The page has to be served over http(s) for the fetch<br>
+                       'server' -> no rows are written; DataTables asks a TableServer for each page of rows it shows
+                       (serverSide processing: paging, ordering and search are done by the server, see genplot.tableserver)
+        :param exports: when True, every table is also written in full as parquet and gzipped csv files next to the page
+                        (see write_exports), and each tab links to its files. Large downloads are then plain static files,
+                        instead of being built in the browser by the copy/csv/excel buttons
+        :param server_url: TableServer url, e.g. 'http://127.0.0.1:8765', for render='server'.
+                           Defaults to the page's own server (see genplot.tableserver.serve_table)
         '''
+        if render not in RENDER_MODES:
+            raise ValueError(f'render should be one of {RENDER_MODES}.')
+        if render == 'shards':
+            shard_urls = self._write_shards(out_path)
+        export_urls = self.write_exports(out_path) if exports else {}
+        api_url = (server_url or '').rstrip('/') + SERVER_API
         cfg = {
             'admissions': ('Admissions','Source: NCES IPEDS.'),
             'enrollment_U': ('Enrollment (Undergrad)','Source: NCES IPEDS. Note: Enrollment includes total part-time and full-time enrollment.'),
@@ -139,7 +408,8 @@ class EdDataTable:
         dts = ''
         ctr = 1
         for sbjct,df in self.dataframes.items():
-            df_html = df.to_html(table_id=sbjct,
+            # json/shards/server modes write an empty table (header only), DataTables fills it from the payload (or server)
+            df_html = (df if render == 'html' else df.head(0)).to_html(table_id=sbjct,
                                  classes='cell-border display compact hover table table-striped',
                                  index=False,
                                  na_rep='NA')
@@ -159,6 +429,10 @@ class EdDataTable:
                             </tfoot>
                             '''
                             )
+            # json payload, next to its table
+            data_script = ''
+            if render == 'json':
+                data_script = '\n' + self._json_script(f'{sbjct}-data', self._table_payload(df))
             #nav tabs
             nav_tab = f'''
                         <li class="nav-item" role="presentation">
@@ -183,13 +457,28 @@ class EdDataTable:
                         role="tabpanel"
                         aria-labelledby="table{ctr}-tab"
                         >
-                        {df_html}
+                        {self._export_links(export_urls[sbjct]) if exports else ''}{df_html}{data_script}
                         </div>
                         '''
             tab_panes += tab_pane
             # dt_init
-            dt = f'''
-                    var table{ctr} = $('#{sbjct}').DataTable({{
+            if render in ('json', 'shards'):
+                rows_js = ('dtRows(payload)' if render == 'shards' else
+                           f"dtRows(JSON.parse(document.getElementById('{sbjct}-data').textContent))")
+                dt_data = f'''
+                        data: {rows_js},
+                        columns: $('#{sbjct} thead th').map(function() {{ return {{render: $.fn.dataTable.render.text()}}; }}).get(),
+                        deferRender: true,'''
+            elif render == 'server':
+                dt_data = f'''
+                        serverSide: true,
+                        processing: true,
+                        searchDelay: 250,
+                        ajax: '{api_url}{sbjct}',
+                        columns: $('#{sbjct} thead th').map(function() {{ return {{render: $.fn.dataTable.render.text()}}; }}).get(),'''
+            else:
+                dt_data = ''
+            dt_opts = f'''{{{dt_data}
                         dom: 'Bfrtip',
                         language: {{
                                 search: "",                       
@@ -204,7 +493,22 @@ class EdDataTable:
                         responsive: true,
                         scrollX: true,
                         scrollY: '500px'
-                    }});
+                    }}'''
+            if render == 'shards':
+                # fetch the shard and build the table the first time its tab is shown
+                dt = f'''
+                    var table{ctr} = null;
+                    function initTable{ctr}() {{
+                        if (table{ctr} !== null) {{ return; }}
+                        table{ctr} = $.getJSON('{shard_urls[sbjct]}').done(function(payload) {{
+                            table{ctr} = $('#{sbjct}').DataTable({dt_opts});
+                        }}).fail(function() {{ table{ctr} = null; }}); // retry next time the tab is shown
+                    }}
+                    $('#table{ctr}-tab').on('shown.bs.tab', initTable{ctr});{f"{chr(10)}                    initTable{ctr}();" if ctr == 1 else ''}
+                 '''
+            else:
+                dt = f'''
+                    var table{ctr} = $('#{sbjct}').DataTable({dt_opts});
                  '''
             dts = dts + dt
 
@@ -345,7 +649,7 @@ class EdDataTable:
                         <script src="https://cdnjs.cloudflare.com/ajax/libs/jszip/3.10.1/jszip.min.js"></script>
 
                         <script>
-                        $(document).ready(function() {{
+                        {DT_ROWS_JS if render in ('json', 'shards') else ''}$(document).ready(function() {{
                                 {dts}
                             }});
                         </script>
@@ -360,17 +664,28 @@ class EdDataTable:
 def build_table(most_recent_year: int = 2023,
                 collescorecard_key: str = None,
                 inflation_adjust: float = None,
-                fpath: str = 'table.html') -> None:
+                fpath: str = 'table.html',
+                shared: SharedData = None,
+                max_workers: int = None,
+                render: str = 'html',
+                exports: bool = False) -> None:
     '''build IPEDS DataTable
     
     :param most_recent_year: most recent year of data available
     :param collegescorecard_key: College Scorecard API key string
     :param inflation_adjust: PCE inflation index, pegged at 2017, for the most recent year of data
     :param fpath: output path for datatable
+    :param shared: data shared with the map build (see genplot.pipeline.build_all)
+    :param max_workers: number of table threads (genpeds loads still run one at a time). Defaults to one worker per table
+    :param render: 'html' (rows written as html), 'json' (rows embedded as json, rendered on demand),
+                   'shards' (rows written to one json file per tab, fetched when the tab is first shown)
+                   or 'server' (rows fetched a page at a time from a TableServer, see genplot.tableserver.serve_table)
+    :param exports: when True, also writes every table as parquet and gzipped csv files next to fpath, linked from the page
     '''
-    dt = EdDataTable(most_recent_year=most_recent_year)
+    dt = EdDataTable(most_recent_year=most_recent_year, shared=shared)
     dt.generate_df(
         earnings_api_key=collescorecard_key,
-        inflation_adjust=inflation_adjust
+        inflation_adjust=inflation_adjust,
+        max_workers=max_workers
     )
-    dt.generate_datatable(out_path=fpath)
\ No newline at end of file
+    dt.generate_datatable(out_path=fpath, render=render, exports=exports)
\ No newline at end of file
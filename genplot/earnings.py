@@ -1,7 +1,14 @@
 import requests
 import us
 import json
-from typing import Dict, List, Any
+import time
+import threading
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from .cache import EarningsCache, get_earnings_cache
+from .instrument import instrumented, count
 
 '''
 In this script, I define the Earnings class, which collects school-level earnings 
@@ -12,6 +19,9 @@ It's easy to get.
 
 As of now, only median and mean earnings 6 years after enrollment, 
 by gender, are provided. Over time, I may build out the variables offered
+
+Results are cached on disk (see genplot.cache). Set GENPLOT_OFFLINE=1 to only
+read from the cache, or GENPLOT_REFRESH=1 to re-download and overwrite it.
 '''
 
 # STATES ABBR to KEY MAP
@@ -28,20 +38,134 @@ wage_var_dict = {
              'latest.earnings.6_yrs_after_entry.mean_earnings.female_students']
 }
 
+# SCORECARD API
+SCORECARD_URL = 'https://api.data.gov/ed/collegescorecard/v1/schools.json'
+SIZE_VAR = 'latest.student.size' # measure behind the poplimit (size__range) filter
+RESULTS_PER_PAGE = 100 # max results per page
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# api.data.gov allows 1,000 requests per hour, per API key
+RATE_LIMIT = 1000
+RATE_PERIOD = 60 * 60
+
+
+class RateLimiter:
+    '''token bucket rate limiter, shared across threads'''
+    def __init__(self,
+                 max_requests: int = RATE_LIMIT,
+                 period: float = RATE_PERIOD):
+        '''token bucket rate limiter
+
+        :param max_requests: requests allowed per period
+        :param period: period length, in seconds
+        '''
+        self.capacity = max_requests
+        self.refill_rate = max_requests / period # tokens per second
+        self.tokens = float(max_requests)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        '''blocks until a request is allowed'''
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
+    def observe_remaining(self,
+                          remaining: int) -> None:
+        '''caps the budget at the server's X-RateLimit-Remaining count'''
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+
+
 class Earnings:
     '''Earnings data from colleges'''
     def __init__(self,
-                 api_key: str = None):
+                 api_key: str = None,
+                 base_url: str = SCORECARD_URL,
+                 max_workers: int = 4,
+                 max_retries: int = 5,
+                 backoff: float = .5,
+                 timeout: float = 30,
+                 rate_limiter: RateLimiter = None,
+                 cache: Optional[EarningsCache] = None,
+                 use_cache: bool = True,
+                 offline: bool = None):
         '''College Scorecard Earnings data.
         
         :param api_key: College Scorecard API key
+        :param base_url: Scorecard schools endpoint. Point this at a local server to test offline
+        :param max_workers: max number of pages requested at once
+        :param max_retries: retries for a page on connection errors, 429s and 5xx responses
+        :param backoff: base backoff in seconds; doubles with each retry, unless the server sends Retry-After
+        :param timeout: request timeout, in seconds
+        :param rate_limiter: request budget. Defaults to the api.data.gov quota of 1,000 requests per hour
+        :param cache: on-disk earnings cache. Defaults to the shared cache (see genplot.cache)
+        :param use_cache: when False, always downloads earnings, and doesn't store them
+        :param offline: when True, only reads earnings from the cache (stale or not), and never touches the network.
+                        Defaults to the GENPLOT_OFFLINE env var
         '''
         self.api_key = api_key
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = (cache or get_earnings_cache()) if use_cache else None
+        self.offline = offline if offline is not None else os.getenv('GENPLOT_OFFLINE', '0') == '1'
+        self.session = None
         self.earnings_dat = None
 
+    def _get_session(self) -> requests.Session:
+        '''returns pooled session, sized to max_workers'''
+        if self.session is None:
+            self.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+        return self.session
+
+    def _get_page(self,
+                  params: Dict[str,Any] = None,
+                  page: int = 0) -> Dict[str,Any]:
+        '''returns json of one results page, retrying with backoff'''
+        pg_params = dict(params, page=page)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            count('http_requests')
+            try:
+                r = self._get_session().get(self.base_url, params=pg_params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            if 'X-RateLimit-Remaining' in r.headers:
+                self.rate_limiter.observe_remaining(int(r.headers['X-RateLimit-Remaining']))
+            if r.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = r.headers.get('Retry-After', '')
+                time.sleep(float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt)
+                continue
+            r.raise_for_status()
+            return r.json()
+
+    @instrumented('Earnings.get_wages', rows=lambda _, self: len(self.earnings_dat or {}))
     def get_wages(self,
                   wage_var: str = 'median',
-                  poplimit: int = 300) -> Dict[str,List[str]]:
+                  poplimit: int = 300,
+                  refresh: bool = None,
+                  with_size: bool = False) -> Dict[str,List[str]]:
         '''returns male and female wages for schools, all states, in dict format.
 
         Format follows...
@@ -53,12 +177,14 @@ class Earnings:
         
         :param poplimit: enrollment lower bound. Exact measure is:<br>
          'Enrollment of undergraduate certificate/degree-seeking students'
-        '''
-        #URL
-        base_request = 'https://api.data.gov/ed/collegescorecard/v1/schools.json' # base 
-        params = {}
 
+        :param refresh: when True, skips the cache and re-downloads earnings. Defaults to the GENPLOT_REFRESH env var
+
+        :param with_size: when True, each school also gets its enrollment size (the poplimit measure),
+         as a third entry: [male_earnings,female_earnings,size]. See Earnings.limit
+        '''
         #PARAMETERS
+        params = {}
         # api key
         params['api_key'] = self.api_key
         # variable
@@ -66,43 +192,58 @@ class Earnings:
         v_1 = wage_var_nm[0] # male
         v_2 = wage_var_nm[1] # female
         params['fields'] = f'id,school.name,{v_1},{v_2}' # id, name, male_earn,female_earn
+        if with_size:
+            params['fields'] += f',{SIZE_VAR}'
         # poplimit
-        params['latest.student.size__range'] = f'{poplimit}..' # range lower bound
+        params[f'{SIZE_VAR}__range'] = f'{poplimit}..' # range lower bound
         # load max results per page (100)
-        RESULTS_PER_PAGE = 100
         params['per_page'] = RESULTS_PER_PAGE 
 
+        # CACHE
+        refresh = refresh if refresh is not None else os.getenv('GENPLOT_REFRESH', '0') == '1'
+        key_parts = {'wage_var': wage_var, 'poplimit': poplimit,
+                     'fields': params['fields'], 'base_url': self.base_url}
+        if self.cache is not None and (self.offline or not refresh):
+            cached = self.cache.get(stale_ok=self.offline, **key_parts)
+            if cached is not None:
+                self.earnings_dat = cached
+                return
+        if self.offline:
+            raise ValueError(f'No cached Scorecard earnings for {wage_var} wages, poplimit {poplimit}, and offline mode is on.')
+
         # REQUESTS
+        # first page tells us how many pages there'll be
+        first = self._get_page(params, page=0)
+        if 'metadata' not in first:
+            raise ValueError('Wrong link? Wrong API key?')
+        num_schools = first['metadata']['total']
+        num_pages = -(-num_schools // RESULTS_PER_PAGE) # ceiling division
+        pages = [first['results']]
+        if num_pages > 1: # request the remaining pages concurrently, keep page order
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                pages += pool.map(lambda pg: self._get_page(params, page=pg)['results'],
+                                  range(1, num_pages))
+
         wage_data = {} # empty dict, we'll fill
-        # request first page twice to check how many pages there'll be
-        r = requests.get(base_request,params=params).json()
-        num_schools = r['metadata']['total']
-
-        if num_schools <= 100: # no need to iter over pages
-            res = r['results']
-            pg_dat = {str(schl['id']): (schl[v_1],schl[v_2]) for schl in res} # add entries
-            for schl,v in pg_dat.items():
-                    if v[0] is not None:
-                            wage_data[schl]= v # add entries to main dict
-
-        elif num_schools > 100:
-            pgs_to_iter = num_schools // RESULTS_PER_PAGE + 1 # add one to get the final remainder
-            for pg_num in range(pgs_to_iter):
-                pg_param = params.copy()
-                pg_param['page'] = pg_num
-
-                res = requests.get(base_request,params=pg_param).json()['results'] # request dat
-                pg_dat = {
-                        str(schl['id']): (schl[v_1],schl[v_2]) for schl in res
-                    } # add entries
-                
-                for schl,v in pg_dat.items():
-                        if v[0] is not None:
-                            wage_data[schl]= v # add entries to main dict
-        else:
-             raise ValueError('Wrong link? Wrong API key?')
+        for res in pages:
+            for schl in res:
+                if schl[v_1] is not None:
+                    wage_data[str(schl['id'])] = (schl[v_1],schl[v_2],schl[SIZE_VAR]) if with_size else (schl[v_1],schl[v_2]) # add entries to main dict
 
         self.earnings_dat = wage_data
+        if self.cache is not None:
+            self.cache.put(wage_data, **key_parts)
+
+    def limit(self,
+              poplimit: int = 300) -> Dict[str,List[str]]:
+        '''returns {school_id: [male_earnings,female_earnings]} for schools with size >= poplimit.
+
+        Matches get_wages(poplimit=poplimit), for earnings fetched with with_size=True and a lower poplimit.
+        
+        :param poplimit: enrollment lower bound
+        '''
+        return {id_: (v[0],v[1]) for id_,v in self.earnings_dat.items()
+                if v[2] is not None and v[2] >= poplimit}
 
     def earnings_to_json(self, 
                          fpath: str = 'earnings.json') -> None:
@@ -0,0 +1,114 @@
+import string
+from itertools import repeat
+from typing import List, Tuple, Any
+
+import pandas as pd
+import numpy as np
+
+'''
+In this module, we define the HoverTemplate class, which renders
+hover text for a whole frame at once.
+
+The MM_MAP hover templates are str.format() templates. Rather than formatting
+them row by row, HoverTemplate parses a template once, converts each field
+to a column of strings, and joins the columns together in bulk.
+
+HoverTemplate can also leave the joining to Plotly: to_customdata() returns the template
+as a Plotly hovertemplate, with a %{customdata[i]} placeholder per varying field, and the
+field columns as a customdata matrix. Each row's values are stored once, and the template once per frame.
+'''
+
+
+def _str_column(values: Any = None) -> np.ndarray:
+    '''returns object array of str(value) for every element, i.e. what str.format() prints'''
+    return np.asarray(values, dtype=object).astype(str).astype(object)
+
+
+class HoverTemplate:
+    '''hover text template, compiled once and rendered from columns'''
+    def __init__(self,
+                 template: str = None):
+        '''hover text template
+
+        :param template: str.format() template with named fields, e.g. MM_MAP['admissions']['hover_text']
+        '''
+        self.template = template
+        self.parts = [] # (literal, field) pairs, in order
+        for literal, field, spec, conv in string.Formatter().parse(template):
+            if spec or conv:
+                raise ValueError('hover templates only support plain {field} replacements')
+            self.parts.append((literal, field))
+        self.fields = [field for _, field in self.parts if field is not None]
+
+    def render(self,
+               n: int,
+               /,
+               **fields) -> List[str]:
+        '''returns list of n hover text strings.
+
+        Field values can be scalars (same value for every row), or array-likes of length n.
+        Array-likes should already hold the final values, e.g. from int_value_handler_vec.
+        '''
+        missing = set(self.fields) - set(fields.keys())
+        if missing:
+            raise KeyError(f'missing hover fields: {sorted(missing)}')
+        cols = {}
+        for field in set(self.fields):
+            v = fields[field]
+            if isinstance(v, (pd.Series, pd.Index, np.ndarray, list)):
+                if len(v) != n:
+                    raise ValueError(f'hover field {field} has {len(v)} values, expected {n}')
+                cols[field] = _str_column(v)
+            else:
+                cols[field] = format(v)
+        # fields can appear more than once, so each occurrence gets its own iterator
+        pieces = []
+        for literal, field in self.parts:
+            if literal:
+                pieces.append(repeat(literal, n))
+            if field is not None:
+                col = cols[field]
+                pieces.append(repeat(col, n) if isinstance(col, str) else iter(col))
+        return list(map(''.join, zip(*pieces)))
+
+    def to_customdata(self,
+                      n: int,
+                      /,
+                      lead: np.ndarray = None,
+                      **fields) -> Tuple[str, np.ndarray]:
+        '''returns (Plotly hovertemplate, customdata) that show the same n hover text strings as render().
+
+        Array-like fields become customdata columns, referenced as %{customdata[i]}; a field used twice
+        is stored once. Scalar fields are written into the hovertemplate.
+
+        :param n: number of rows
+        :param lead: (n, k) array of columns to put first in customdata, e.g. search keys. Fields follow them
+        :param fields: same as render()
+        '''
+        missing = set(self.fields) - set(fields.keys())
+        if missing:
+            raise KeyError(f'missing hover fields: {sorted(missing)}')
+        cols = [] if lead is None else [np.asarray(lead, dtype=object).reshape(n, -1)]
+        offset = 0 if lead is None else cols[0].shape[1]
+        idx = {} # field -> customdata column
+        out = []
+        for literal, field in self.parts:
+            # plotly has no escape for a literal '%{' (it starts a placeholder); MM_MAP templates have none
+            if literal:
+                if '%{' in literal:
+                    raise ValueError('hover template text cannot contain "%{"')
+                out.append(literal)
+            if field is None:
+                continue
+            v = fields[field]
+            if isinstance(v, (pd.Series, pd.Index, np.ndarray, list)):
+                if len(v) != n:
+                    raise ValueError(f'hover field {field} has {len(v)} values, expected {n}')
+                if field not in idx:
+                    idx[field] = offset + len(idx)
+                    cols.append(_str_column(v).reshape(n, 1))
+                out.append(f'%{{customdata[{idx[field]}]}}')
+            else:
+                out.append(format(v))
+        customdata = np.hstack(cols) if cols else np.empty((n, 0), dtype=object)
+        return ''.join(out), customdata
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import logging
+import sys
+import threading
+import tracemalloc
+import functools
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Callable
+try:
+    import resource
+except ImportError: # windows
+    resource = None
+
+'''
+In this module, we define stage-level instrumentation for the build pipeline.
+
+stage() (a context manager) and instrumented() (a decorator) record, for each run of a stage:
+- wall time
+- peak RSS of the process when the stage ends, and how much the stage raised it
+- peak traced memory above the stage's starting point (tracemalloc; only in memory mode, as tracing slows builds down)
+- row count, when the stage knows it
+- HTTP requests made while the stage ran (see count())
+Records go to a registry (REGISTRY), which summary() rolls up per stage, and report() logs and writes to JSON.
+
+Instrumentation is off unless the GENPLOT_INSTRUMENT env var is set:
+- GENPLOT_INSTRUMENT=1 records time, RSS, rows and HTTP requests
+- GENPLOT_INSTRUMENT=memory also records traced memory
+When off, instrumented functions run as-is.
+
+Stages run concurrently when builders do (see BUILD_WORKERS); HTTP counts and memory peaks are process-wide,
+so they include work from concurrent stages. Build with BUILD_WORKERS=1 for per-stage figures.
+'''
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024 # ru_maxrss is bytes on macOS, KB on linux
+
+def mode() -> str:
+    '''returns instrumentation mode: '' (off), '1' or 'memory' (from GENPLOT_INSTRUMENT)'''
+    val = os.getenv('GENPLOT_INSTRUMENT', '0').strip().lower()
+    return '' if val in ('', '0') else val
+
+def enabled() -> bool:
+    '''returns True when instrumentation is on'''
+    return mode() != ''
+
+def _rss_mb() -> float:
+    '''returns peak RSS of the process so far, in MB (0 where unavailable)'''
+    if resource is None:
+        return 0.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / MB
+
+
+class Registry:
+    '''stage records and counters, shared across threads'''
+    def __init__(self):
+        self.records = [] # one dict per stage run, in start order
+        self.counters = {} # e.g. 'http_requests' -> count
+        self._lock = threading.Lock()
+        self._local = threading.local() # per-thread stack of open stages, for nested memory peaks
+
+    def count(self,
+              counter: str = None,
+              n: int = 1) -> None:
+        '''adds n to counter'''
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def _stack(self) -> List[Dict[str,Any]]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self,
+              name: str = None,
+              rows: int = None,
+              **info):
+        '''records a run of stage name. yields the record, so rows (or other info) can be set inside the block
+
+        :param name: stage name, e.g. 'MultiMap.viz_to_html'
+        :param rows: row count, when known upfront
+        :param info: other fields to record, e.g. subject = 'enrollment'
+        '''
+        if not enabled():
+            yield {}
+            return
+        trace = mode() == 'memory'
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        rec = {'stage': name, 'thread': threading.current_thread().name, 'rows': rows, **info}
+        stack = self._stack()
+        if trace:
+            # keep the enclosing stage's peak before resetting it for this one
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1]['_peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            rec['_start'] = rec['_peak'] = tracemalloc.get_traced_memory()[0]
+        with self._lock:
+            http_before = self.counters.get('http_requests', 0)
+        rss_before = _rss_mb()
+        stack.append(rec)
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec['seconds'] = time.perf_counter() - t0
+            stack.pop()
+            rec['rss_peak_mb'] = _rss_mb()
+            rec['rss_growth_mb'] = rec['rss_peak_mb'] - rss_before
+            with self._lock:
+                rec['http_requests'] = self.counters.get('http_requests', 0) - http_before
+            if trace:
+                peak = max(rec.pop('_peak'), tracemalloc.get_traced_memory()[1])
+                rec['traced_peak_mb'] = (peak - rec.pop('_start')) / MB
+                if stack:
+                    stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+            with self._lock:
+                self.records.append(rec)
+
+    def summary(self) -> Dict[str,Any]:
+        '''returns {'stages': {name: totals}, 'counters': {...}, 'records': [...]}. Totals sum seconds, rows and
+        HTTP requests over a stage's runs, and keep its largest memory figures'''
+        with self._lock:
+            records = list(self.records)
+            counters = dict(self.counters)
+        stages = {}
+        for rec in records:
+            tot = stages.setdefault(rec['stage'], {'calls': 0, 'seconds': 0., 'rows': 0, 'http_requests': 0,
+                                                   'rss_peak_mb': 0., 'rss_growth_mb': 0.})
+            tot['calls'] += 1
+            tot['seconds'] += rec['seconds']
+            tot['rows'] += rec['rows'] or 0
+            tot['http_requests'] += rec['http_requests']
+            for k in ['rss_peak_mb', 'rss_growth_mb', 'traced_peak_mb']:
+                if k in rec:
+                    tot[k] = max(tot.get(k, 0.), rec[k])
+        return {'stages': stages, 'counters': counters, 'records': records}
+
+    def report(self,
+               fpath: str = None) -> Dict[str,Any]:
+        '''logs one structured (JSON) line per stage, writes the summary to fpath when given, and returns it
+
+        :param fpath: JSON report path
+        '''
+        summ = self.summary()
+        for name, tot in sorted(summ['stages'].items(), key=lambda kv: -kv[1]['seconds']):
+            logger.info('stage %s', json.dumps(dict(tot, stage=name), default=str))
+        if fpath:
+            with open(fpath, 'w') as f:
+                json.dump(summ, f, indent=2, default=str)
+        return summ
+
+    def clear(self) -> None:
+        '''drops every record and counter'''
+        with self._lock:
+            self.records = []
+            self.counters = {}
+
+
+REGISTRY = Registry()
+
+def stage(name: str = None,
+          rows: int = None,
+          **info):
+    '''records a run of stage name in REGISTRY (see Registry.stage)'''
+    return REGISTRY.stage(name, rows, **info)
+
+def count(counter: str = None,
+          n: int = 1) -> None:
+    '''adds n to a REGISTRY counter, e.g. count('http_requests')'''
+    if enabled():
+        REGISTRY.count(counter, n)
+
+def report(fpath: str = None) -> Optional[Dict[str,Any]]:
+    '''logs REGISTRY's summary, and writes it to fpath (when given). Does nothing when instrumentation is off'''
+    if enabled():
+        return REGISTRY.report(fpath)
+
+def instrumented(name: str = None,
+                 rows: Callable[[Any,Any],int] = None,
+                 info: Callable[...,Dict[str,Any]] = None) -> Callable:
+    '''decorator: records every call of a method as a run of stage name
+
+    :param name: stage name, e.g. 'CleanForPlot._run_data'
+    :param rows: rows(result, self) returns the row count of a call
+    :param info: info(self, *args, **kwargs) returns other fields to record, e.g. {'subject': self.subject}
+    '''
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with REGISTRY.stage(name, **(info(*args, **kwargs) if info else {})) as rec:
+                out = func(*args, **kwargs)
+                if rows is not None:
+                    rec['rows'] = rows(out, args[0] if args else None)
+                return out
+        return wrapper
+    return deco
@@ -2,13 +2,23 @@ import plotly.graph_objects as go
 import plotly.io as pio
 import pandas as pd
 import numpy as np
+import os
 import re
-from bs4 import BeautifulSoup
-from typing import List, Tuple, Union
+import json
+import base64
+import time
+import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Union, Any
 
 from .plot_structures import THEME, GENDER_SPLIT_SCALE, GRADUATION_RATE_SCALE, ACCEPTANCE_RATE_SCALE, EARNINGS_SCALE
-from .utils import CleanForPlot, int_value_handler, wtd_quantile, percentile_formatter
+from .utils import CleanForPlot, int_value_handler_vec, wtd_quantile, percentile_formatter_vec
+from .hovertext import HoverTemplate
 from .earnings import Earnings
+from .shared import SharedData
+from .cache import FrameCache, get_frame_cache, fingerprint, data_hash, code_hash
+from .instrument import instrumented
 
 '''
 MultiMap: a Plotly Scattergeo object with multiple frames for different higher ed variables
@@ -18,6 +28,8 @@ MultiMap: a Plotly Scattergeo object with multiple frames for different higher e
 - Male Earnings
 '''
 
+logger = logging.getLogger(__name__)
+
 '''
 SET PLOT THEME
 '''
@@ -111,18 +123,157 @@ MM_MAP = {
     }
 }
 
+'''
+Frames built by build_map, in dropdown order: (subject, specification, outcome_var).
+The earnings frame is built last.
+'''
+MAP_FRAMES = [
+    ('admissions', None, 'admit_rate'), # Admissions
+    ('enrollment', 'undergrad', 'male_enrollment_share'), # Enrollment (Undergrad)
+    ('enrollment', 'grad', 'male_enrollment_share'), # Enrollment (Grad)
+    ('graduation', 'bach', 'male_graduation_rate'), # Graduation (Bachelor's)
+    ('graduation', 'assc', 'male_graduation_rate') # Graduation (Associate's)
+]
+
+'''
+Hover text templates, compiled once
+'''
+HOVER_TEMPLATES = {sbjct: HoverTemplate(cfg['hover_text']) for sbjct, cfg in MM_MAP.items()}
+# 'text': every marker gets its hover paragraph, rendered in python
+# 'template': markers get their values as customdata, and plotly fills in one hovertemplate per frame
+HOVER_MODES = ('text', 'template')
+
+'''
+Map page (see MultiMap.viz_to_html)
+'''
+MAP_DIV_ID = 'higher-ed-map' # plot div id, so page scripts can find the plot
+DIV_MARKER = '<!-- plot -->'
+MAP_PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<style>html, body {{height: 100%;}}</style>{head}
+</head>
+<body>
+{body}
+{plot}
+{scripts}
+</body>
+</html>'''
+
+'''
+Compact serialisation (see MultiMap.build_multimap)
+'''
+COORD_DECIMALS = 4 # ~11 meters, plenty for a national map
+# trace arrays written as float32 typed arrays (plotly emits numpy arrays as base64 bdata)
+COMPACT_ARRAYS = [('lat',), ('lon',), ('marker', 'size'), ('marker', 'color')]
+
+'''
+Level of detail (see MultiMap's lod param)
+'''
+LOD_CELL_DEG = 2 # grid cell size, in degrees of latitude and longitude
+LOD_ZOOM = 3 # geo projection scale (1 = national view) from which single schools are drawn
+
+
+def _decode_arrays(obj: Any = None) -> Any:
+    '''returns obj with plotly typed array specs ({'dtype', 'bdata'[, 'shape']}) decoded back to numpy arrays'''
+    if isinstance(obj, dict):
+        if 'bdata' in obj and 'dtype' in obj:
+            arr = np.frombuffer(base64.b64decode(obj['bdata']), dtype=np.dtype(obj['dtype']))
+            if 'shape' in obj:
+                shape = obj['shape']
+                arr = arr.reshape([int(d) for d in shape.split(',')] if isinstance(shape, str) else shape)
+            return arr.copy()
+        return {k: _decode_arrays(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_decode_arrays(v) for v in obj]
+    return obj
+
+def _frame_rows(frm: go.Frame = None) -> int:
+    '''returns number of schools (points) in a frame; the school markers are its last trace'''
+    lat = frm.data[-1].lat if frm.data else None
+    return 0 if lat is None else len(lat)
+
+def _lod_grid(df: pd.DataFrame = None,
+              value_vars: List[str] = None,
+              weight_var: str = None,
+              cell_deg: float = LOD_CELL_DEG) -> pd.DataFrame:
+    '''returns one row per grid cell (cell_deg by cell_deg degrees) with schools in df: count (of schools),
+    latitude/longitude (weighted centroid), and weight_var-weighted means of value_vars.
+    Cells whose schools have no weight get plain means
+
+    :param df: schools, with latitude, longitude, weight_var and value_vars
+    :param value_vars: columns to average
+    :param weight_var: weight column, e.g. the marker sizing variable
+    :param cell_deg: grid cell size, in degrees
+    '''
+    d = df.loc[df['latitude'].notnull() & df['longitude'].notnull()]
+    cells = [np.floor(d['latitude'].to_numpy(np.float64) / cell_deg),
+             np.floor(d['longitude'].to_numpy(np.float64) / cell_deg)]
+    w = d[weight_var].astype(np.float64).fillna(0).clip(lower=0)
+    avg_vars = ['latitude', 'longitude'] + list(value_vars)
+    # per cell sums of weighted values, weights, values, and counts, skipping unknown values
+    parts = {'count': pd.Series(1, index=d.index)}
+    for var in avg_vars:
+        v = d[var].astype(np.float64)
+        known = v.notnull()
+        parts[f'{var}__wv'] = (v * w).where(known, 0)
+        parts[f'{var}__w'] = w.where(known, 0)
+        parts[f'{var}__v'] = v.where(known, 0)
+        parts[f'{var}__n'] = known.astype(np.float64)
+    sums = pd.DataFrame(parts).groupby(cells, sort=False).sum()
+    out = pd.DataFrame({'count': sums['count']})
+    for var in avg_vars:
+        plain = sums[f'{var}__v'] / sums[f'{var}__n'].where(sums[f'{var}__n'] > 0)
+        out[var] = (sums[f'{var}__wv'] / sums[f'{var}__w'].where(sums[f'{var}__w'] > 0)).fillna(plain)
+    return out.reset_index(drop=True)
+
 
 class MultiMap:
     '''multiple higher ed outcomes, all on one map'''
     def __init__(self,
-                 most_recent_year: int = None):
+                 most_recent_year: int = None,
+                 shared: SharedData = None,
+                 cache: FrameCache = None,
+                 use_cache: bool = True,
+                 hover: str = 'text',
+                 lod: bool = False):
         '''MultiMap
         
         :param most_recent_year:
          (*int*) most recent year available of data
+
+        :param shared:
+         (*SharedData*) data shared with other builders (see genplot.shared). When None, each frame loads its own data
+
+        :param cache:
+         (*FrameCache*) cache of built frames. Defaults to the shared FrameCache (see genplot.cache)
+
+        :param use_cache:
+         (*bool*) when False, every frame is rebuilt from scratch
+
+        :param hover:
+         (*str*) how hover labels are shipped (see HOVER_MODES). 'text' writes each marker's rendered hover paragraph;
+         'template' writes only each marker's values (customdata) and one hovertemplate per frame, for the same labels
+         in a fraction of the html
+
+        :param lod:
+         (*bool*) when True, each frame also gets a lighter level-of-detail trace: schools binned into a
+         LOD_CELL_DEG grid, one marker per cell, with the school count and size-weighted mean outcome.
+         The grid is drawn at the national view, and single schools once zoomed in past LOD_ZOOM (or while searching)
         '''
+        if hover not in HOVER_MODES:
+            raise ValueError(f'hover should be one of {HOVER_MODES}')
         self.most_recent_year = most_recent_year
+        self.shared = shared
+        self.hover = hover
+        self.lod = lod
+        self.cache = (cache or get_frame_cache()) if use_cache else None
+        self.frame_fingerprints = {} # frame label -> fingerprint of its inputs (see _cached_frame)
         self.frames = []
+        self.frame_times = {} # frame label -> build wall time, in seconds (see build_frames)
+        self.frame_bytes = {} # frame name -> (bytes before, bytes after) compact serialisation (see build_multimap)
+        self.post_scripts = [] # js run once the plot is drawn (see build_multimap)
         self.fig = go.Figure()
     
     def data_viz(self,
@@ -138,32 +289,43 @@ class MultiMap:
         '''
         self.fig.show(renderer=render) # shows the plot
     
+    @instrumented('MultiMap.viz_to_html')
     def viz_to_html(self,
                     fpath: str = None,
-                    add_search_bar: bool = True) -> None:
+                    add_search_bar: bool = True,
+                    lazy_frames: bool = False) -> None:
         '''converts current data viz to html
         
         :param fpath: output path for html file
         :param add_search_bar: bool that, when True, adds search bar to plot
+        :param lazy_frames: bool that, when True, only writes the first frame into the html.
+                            Every other frame goes to a sidecar file (fpath + '.frame{i}.json'), fetched the first time
+                            its button is clicked, then kept in the page. The page has to be served over http(s) for the fetch
         '''
         raw_plot = self.fig
+        post_scripts = self.post_scripts
+        if lazy_frames:
+            raw_plot, lazy_script = self._lazy_figure(fpath)
+            post_scripts = post_scripts + [lazy_script]
 
 
         if add_search_bar:
-            html_plot = pio.to_html(fig = raw_plot,
-                                    auto_play=False,
+            # the plot div only; the page is assembled around it below
+            plot_div = pio.to_html(fig = raw_plot,
+                                   auto_play=False,
                                    include_plotlyjs='cdn',
-                                   full_html=True,
+                                   full_html=False,
+                                   div_id=MAP_DIV_ID,
+                                   default_height='100%',
+                                   post_script=post_scripts or None,
                                    config={'responsive': True,
                                            'modeBarButtonsToRemove': ['select2d', 'lasso2d']})
-            soup = BeautifulSoup(html_plot,'html.parser')
             # adding search box
             search_box = '''
                          <div style="position:absolute; top:100px; right:23.5px; z-index:1000;">
                         <input type="text" id="searchBox" placeholder="Search a school, then zoom in" style="padding:5px; width:200px;">
                         </div>
                          '''
-            soup.body.insert(0, BeautifulSoup(search_box,'html.parser')) # add box
             # resize the buttons
             btn_resize = '''
                         <style>
@@ -178,41 +340,106 @@ class MultiMap:
                             }
                             </style>
                          '''
-            soup.head.insert(1, BeautifulSoup(btn_resize,'html.parser'))
-            # get unique plot id
-            plot_id = soup.find('div',class_='plotly-graph-div')['id']
             # Add search query opacity update
+            # matches against the search keys in customdata (column 0), for the visible frame only, once typing pauses
             search_script = f'''
                             <script>
-                            const plotId = "{plot_id}";
+                            const plotEl = document.getElementById("{MAP_DIV_ID}");
                             const input  = document.getElementById("searchBox");
-                            const plotEl = document.getElementById(plotId);
-
-                            const frames = plotEl.frames || plotEl._fullFrames || [];
+                            let query = "";
+                            let searchTimer = null;
 
-                            input.addEventListener("input", function() {{
-                                const q = this.value.toLowerCase();
-                            
+                            function applySearch() {{
+                                const opacities = [];
+                                const traces = [];
                                 plotEl.data.forEach((trace, i) => {{
-                                    
-                                if (!trace.text) return;
-                                const newOpacity = trace.text.map(txt =>
-                                    txt.toLowerCase().includes(q) ? 0.7 : 0.05
-                                );
-                                Plotly.restyle(plotEl, {{
-                                    "marker.opacity": [ newOpacity ]
-                                }}, [ i ]);
+                                    const keys = trace.customdata;
+                                    if (!keys) return;
+                                    if (query === "") {{
+                                        opacities.push(0.7);
+                                    }} else {{
+                                        const n = keys.length;
+                                        const newOpacity = new Array(n);
+                                        for (let j = 0; j < n; j++) {{
+                                            newOpacity[j] = keys[j][0].includes(query) ? 0.7 : 0.05;
+                                        }}
+                                        opacities.push(newOpacity);
+                                    }}
+                                    traces.push(i);
                                 }});
+                                if (traces.length) {{
+                                    Plotly.restyle(plotEl, {{"marker.opacity": opacities}}, traces);
+                                }}
+                            }}
+
+                            input.addEventListener("input", function() {{
+                                const q = this.value.trim().toLowerCase();
+                                clearTimeout(searchTimer);
+                                searchTimer = setTimeout(function() {{
+                                    if (q === query) return;
+                                    query = q;
+                                    applySearch();
+                                }}, 150);
+                            }});
+                            // switching frames resets marker opacity, so re-apply the current search
+                            plotEl.on("plotly_animated", function() {{
+                                if (query !== "") applySearch();
                             }});
                             </script>
                             '''
-
-            soup.body.append(BeautifulSoup(search_script,'html.parser'))
-
+            # write the page piece by piece, rather than building (and re-parsing) one big string
+            page_top, _, page_bottom = MAP_PAGE.format(head=btn_resize,
+                                                       body=search_box,
+                                                       plot=DIV_MARKER,
+                                                       scripts=search_script).partition(DIV_MARKER)
             with open(fpath,'w') as plotf:
-                plotf.write(str(soup))
+                plotf.write(page_top)
+                plotf.write(plot_div)
+                plotf.write(page_bottom)
         else:
-            raw_plot.write_html(file=fpath,auto_play=False,include_plotlyjs='cdn')
+            raw_plot.write_html(file=fpath,auto_play=False,include_plotlyjs='cdn',post_script=post_scripts or None)
+
+    def _lazy_figure(self,
+                     fpath: str = None) -> Tuple[go.Figure, str]:
+        '''writes every frame but the first to fpath + '.frame{i}.json'.
+        returns (figure without those frames, js that loads a frame when its button is clicked)'''
+        fig = go.Figure(self.fig)
+        first = self.frames[0].name
+        page = os.path.basename(fpath)
+        frame_urls = {}
+        keep = []
+        for frm in fig.frames:
+            if frm.name == first:
+                keep.append(frm) # first frame stays inline
+                continue
+            i = [f.name for f in self.frames].index(frm.name)
+            frm_json = pio.json.to_json_plotly(go.Figure(frames=[frm]).to_dict()['frames'][0]) # typed arrays, like to_html
+            with open(f'{fpath}.frame{i}.json', 'w') as frmf:
+                frmf.write(frm_json)
+            frame_urls[frm.name] = f'{page}.frame{i}.json'
+        fig.frames = keep
+        # lazy buttons do nothing themselves (skip); the script fetches, adds, then animates to the frame
+        for menu in fig.layout.updatemenus:
+            for btn in menu.buttons:
+                if btn.args[0][0] in frame_urls:
+                    btn.method = 'skip'
+        lazy_script = f'''var gd = document.getElementById('{{plot_id}}');
+                            var frameUrls = {json.dumps(frame_urls)};
+                            var frameLoads = {{}}; // frame name -> promise, so each frame is fetched once
+                            gd.on('plotly_buttonclicked', function(e) {{
+                                var name = e.button.args[0][0];
+                                if (!(name in frameUrls)) {{ return; }}
+                                if (!(name in frameLoads)) {{
+                                    frameLoads[name] = fetch(frameUrls[name])
+                                        .then(function(resp) {{ return resp.json(); }})
+                                        .then(function(frm) {{ return Plotly.addFrames(gd, [frm]); }})
+                                        .catch(function(err) {{ delete frameLoads[name]; throw err; }});
+                                }}
+                                frameLoads[name].then(function() {{
+                                    Plotly.animate(gd, e.button.args[0], e.button.args[1]);
+                                }});
+                            }});'''.replace('</', '<\\/')
+        return fig, lazy_script
 
     def _get_obj(self,
                  subject: str = 'enrollment',
@@ -226,21 +453,298 @@ class MultiMap:
         :param poplimit: population limiter for visualization.
         :param kwargs: kwargs to pass on to CleanForPlot, like merge_with_char = True
         '''
-        obj = CleanForPlot(subject=subject,years=years,poplimit=poplimit)._run_data(**kwargs)
+        obj = CleanForPlot(subject=subject,years=years,poplimit=poplimit,source=self.shared)._run_data(**kwargs)
         return obj
 
+    def _get_earnings(self,
+                      api_key: str = None,
+                      wage_var: str = 'median',
+                      poplimit: int = 100) -> Dict[str,List[Any]]:
+        '''returns {school_id: [male_earnings,female_earnings]} from the College Scorecard
+
+        :param api_key: College Scorecard API key string
+        :param wage_var: wage variable, e.g. 'median'
+        :param poplimit: enrollment lower bound
+        '''
+        if self.shared is not None:
+            return self.shared.earnings(wage_var=wage_var, poplimit=poplimit)
+        earn = Earnings(api_key=api_key)
+        earn.get_wages(wage_var=wage_var,poplimit=poplimit)
+        return earn.earnings_dat
+
+    def _frame_years(self,
+                     subject: str = None) -> List[int]:
+        '''returns years of data needed for a frame (the hover label history)'''
+        if subject in ['admissions','graduation']:
+            return [self.most_recent_year - 20,self.most_recent_year - 10,self.most_recent_year]
+        elif subject in ['enrollment','completion']:
+            return [self.most_recent_year - 30,self.most_recent_year - 20,self.most_recent_year-10,self.most_recent_year]
+
+    def _frame_kwargs(self,
+                      subject: str = None,
+                      specification: str = None,
+                      rm_disk: bool = False) -> Dict[str,Any]:
+        '''returns run kwargs of the data needed for a frame'''
+        kwrgs = {
+            'merge_with_char': True,
+            'rm_disk': rm_disk
+        }
+        if subject == 'enrollment':
+            kwrgs['student_level'] = specification
+        elif subject == 'graduation':
+            kwrgs['degree_level'] = specification
+        return kwrgs
+
+    def plan_data(self,
+                  shared: SharedData = None,
+                  earnings_var: str = 'median') -> None:
+        '''registers the data build_map needs with a SharedData plan
+
+        :param shared: SharedData to plan with
+        :param earnings_var: earnings frame outcome variable
+        '''
+        for subject, specification, _ in MAP_FRAMES:
+            shared.add_subject(subject, self._frame_years(subject), **self._frame_kwargs(subject, specification))
+        # earnings frame
+        shared.add_subject('admissions', self.most_recent_year, merge_with_char=True, rm_disk=False)
+        shared.add_earnings(earnings_var, MM_MAP['earnings']['sizing_cutoff'])
+
+    def _hover_text(self,
+                    subject: str = None,
+                    specification: str = None,
+                    df: pd.DataFrame = None,
+                    df_tot: pd.DataFrame = None,
+                    years_iter: List[int] = None) -> List[str]:
+        '''returns hover text for every row of df, rendered from columns. Same params as _hover_fields'''
+        fields = self._hover_fields(subject, specification, df, df_tot, years_iter)
+        if fields is None:
+            return ['TO DO'] * len(df)
+        return HOVER_TEMPLATES[subject].render(len(df), **fields)
+
+    def _hover_fields(self,
+                      subject: str = None,
+                      specification: str = None,
+                      df: pd.DataFrame = None,
+                      df_tot: pd.DataFrame = None,
+                      years_iter: List[int] = None) -> Dict[str,Any]:
+        '''returns hover template fields (see HoverTemplate) for every row of df, or None for subjects without a template
+        
+        :param subject: frame subject.
+        :param specification: within-subject specification.
+        :param df: most recent year of data, one row per marker
+        :param df_tot: all years of data, with a known outcome_var
+        :param years_iter: years shown in the hover label history
+        '''
+        if subject not in ['admissions','enrollment','graduation']:
+            return None
+        yr = self.most_recent_year
+        # outcome_var history, as one (id x year) table; missing years are NaN, which render as 'NA'
+        hist = (df_tot.drop_duplicates(subset=['id','year'])
+                      .pivot(index='id', columns='year', values='outcome_var')
+                      .reindex(index=df['id'], columns=years_iter))
+        fields = {'rec_yr': yr, 'name': df['name'], 'city': df['city'], 'state': df['state']}
+        for i, y in enumerate(years_iter):
+            fields[f'year{i}'] = y
+            fields[f'year{i}_rate'] = int_value_handler_vec(hist[y])
+        if subject == 'admissions':
+            fields.update(men_app=int_value_handler_vec(df['men_applied']), men_accepted=int_value_handler_vec(df['men_admitted']),
+                          men_accept_rate=int_value_handler_vec(df['accept_rate_men']), women_accept_rate=int_value_handler_vec(df['accept_rate_women']),
+                          men_accept_share=int_value_handler_vec(df['men_admitted_share']), men_apply_share=int_value_handler_vec(df['men_applied_share']),
+                          perc=percentile_formatter_vec(df['accept_rate_men']))
+        elif subject == 'enrollment':
+            fields.update(totmen=int_value_handler_vec(df['totmen']), totwomen=int_value_handler_vec(df['totwomen']),
+                          totmen_share=int_value_handler_vec(df['totmen_share']),
+                          perc=percentile_formatter_vec(df['totmen_share']))
+        elif subject == 'graduation':
+            fields.update(rec_yr_lag=yr - 6 if specification == 'bach' else yr - 3,
+                          men_grad=int_value_handler_vec(df['totmen_graduated']),
+                          male_grad_rate=int_value_handler_vec(df['gradrate_totmen']), female_grad_rate=int_value_handler_vec(df['gradrate_totwomen']),
+                          diff_grad=int_value_handler_vec(df['gradrate_totmen'],df['gradrate_totwomen'],'subtract'),
+                          perc=percentile_formatter_vec(df['gradrate_totmen']))
+        return fields
+
+    def _hover_data(self,
+                    subject: str = None,
+                    df: pd.DataFrame = None,
+                    fields: Dict[str,Any] = None) -> Dict[str,Any]:
+        '''returns Scattergeo hover properties of a frame, in the map's hover mode: rendered text ('text'),
+        or customdata and a hovertemplate ('template'). customdata column 0 is the search key in both modes
+
+        :param subject: frame subject, or 'earnings'
+        :param df: frame data, one row per marker
+        :param fields: hover template fields, from _hover_fields/_earnings_hover_fields. None renders 'TO DO'
+        '''
+        search = self._search_index(df)
+        if fields is None:
+            return {'text': ['TO DO'] * len(df), 'customdata': search, 'hovertemplate': '%{text}<extra></extra>'}
+        if self.hover == 'template':
+            hovertemplate, customdata = HOVER_TEMPLATES[subject].to_customdata(len(df), lead=search, **fields)
+            return {'customdata': customdata, 'hovertemplate': hovertemplate + '<extra></extra>'}
+        return {'text': HOVER_TEMPLATES[subject].render(len(df), **fields),
+                'customdata': search, 'hovertemplate': '%{text}<extra></extra>'}
+
+    def _search_index(self,
+                      df: pd.DataFrame = None) -> np.ndarray:
+        '''returns (n, 1) array of lowercased 'name city, state' search keys, one per row of df (used as customdata)'''
+        name, city, state = (df[col].astype(object).fillna('') for col in ['name', 'city', 'state']) # may be categoricals (lean mode)
+        keys = (name + ' ' + city + ', ' + state).str.lower()
+        return keys.to_numpy(dtype=object).reshape(-1, 1)
+
+    def _earnings_hover_text(self,
+                             df: pd.DataFrame = None,
+                             spec: str = None) -> List[str]:
+        '''returns earnings hover text for every row of df, rendered from columns. Same params as _earnings_hover_fields'''
+        return HOVER_TEMPLATES['earnings'].render(len(df), **self._earnings_hover_fields(df, spec))
+
+    def _earnings_hover_fields(self,
+                               df: pd.DataFrame = None,
+                               spec: str = None) -> Dict[str,Any]:
+        '''returns earnings hover template fields for every row of df
+        
+        :param df: earnings data, one row per marker
+        :param spec: earnings statistic, e.g. 'median'
+        '''
+        return dict(
+            name=df['name'], city=df['city'], state=df['state'], spec=spec,
+            male_earn=int_value_handler_vec(df['male_earn']),
+            female_earn=int_value_handler_vec(df['female_earn']),
+            diff_earn=int_value_handler_vec(df['male_earn'],df['female_earn'],'subtract'),
+            perc=percentile_formatter_vec(df['male_earn'])
+        )
+
     def build_frame(self,
                     subject: str = None,
                     specification: str = None,
                     outcome_var: str = None,
                     rm_disk: bool = False) -> go.Frame:
-        '''build frame of male higher ed variable
+        '''build frame of male higher ed variable, and add it to the map's frames
         
         :param subject: frame subject.
         :param specification: within-subject specification.
         :param outcome_var: variable used for marker colors. 
         :rm_disk: boolean to determine if raw data should be removed from disk when frame is finished building
         '''
+        frm = self._cached_frame(subject=subject, specification=specification,
+                                 outcome_var=outcome_var, rm_disk=rm_disk)
+        self.frames.append(frm)
+        return frm
+
+    def build_earnings_frame(self,
+                            api_key: str =  None,
+                            outcome_var: str = None,
+                            inflation_adjust: float = 125.58) -> go.Frame:
+        '''build frame of earnings, and add it to the map's frames
+
+        :api_key: College Scorecard API key string
+        :param outcome_var: variable used for marker colors. Options include mean, median
+        :param inflation_adjust: the PCE index for the most recent year. This will be divided
+                                 by the 2022 index to bring 2022 estimates to modern dollars
+        '''
+        frm = self._cached_earnings_frame(api_key=api_key, outcome_var=outcome_var,
+                                          inflation_adjust=inflation_adjust)
+        self.frames.append(frm)
+        return frm
+
+    def build_frames(self,
+                     api_key: str = None,
+                     earnings_var: str = 'median',
+                     inflation_adjust: float = 125.58,
+                     max_workers: int = None) -> Dict[str,float]:
+        '''build every MAP_FRAMES frame and the earnings frame in a thread pool, and add them to
+        the map's frames in a fixed order (MAP_FRAMES order, then earnings). returns {frame label: wall time in seconds},
+        with labels like 'enrollment (grad)'. genpeds loads are serialised (see utils._GENPEDS_LOCK), so the threads
+        overlap cached loads, Scorecard paging and frame building, but not IPEDS downloads; a frame's wall time
+        includes time spent waiting for another frame's load
+
+        :param api_key: College Scorecard API key string
+        :param earnings_var: earnings frame outcome variable. Options include mean, median
+        :param inflation_adjust: the PCE index for the most recent year
+        :param max_workers: number of frame threads. Defaults to one worker per frame
+        '''
+        jobs = [partial(self._cached_frame, subject=subject, specification=specification, outcome_var=outcome_var)
+                for subject, specification, outcome_var in MAP_FRAMES]
+        jobs.append(partial(self._cached_earnings_frame, api_key=api_key, outcome_var=earnings_var,
+                            inflation_adjust=inflation_adjust))
+        labels = [f'{subject} ({specification})' if specification else subject
+                  for subject, specification, _ in MAP_FRAMES]
+        labels.append(f'earnings ({earnings_var})')
+
+        def _timed(job):
+            t0 = time.perf_counter()
+            frm = job()
+            return frm, time.perf_counter() - t0
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(jobs)) as pool:
+            results = list(pool.map(_timed, jobs)) # map keeps job order
+        for label, (frm, secs) in zip(labels, results):
+            self.frames.append(frm)
+            self.frame_times[label] = secs
+            logger.info('built %s frame in %.2fs', label, secs)
+        return {label: secs for label, (_, secs) in zip(labels, results)}
+
+    def _frame_from_cache(self,
+                          label: str = None,
+                          fp: str = None,
+                          build: Any = None) -> go.Frame:
+        '''returns cached frame for fingerprint fp, or builds it with build() and caches it'''
+        self.frame_fingerprints[label] = fp
+        if self.cache is None:
+            return build()
+        cached = self.cache.get(fp)
+        if cached is not None:
+            logger.info('reused %s frame (unchanged inputs)', label)
+            return go.Frame(_decode_arrays(json.loads(cached)))
+        frm = build()
+        self.cache.put(fp, pio.json.to_json_plotly(go.Figure(frames=[frm]).to_dict()['frames'][0]))
+        return frm
+
+    @instrumented('MultiMap.build_frame', rows=lambda frm, self: _frame_rows(frm),
+                  info=lambda self, subject=None, specification=None, **kwargs: {'subject': subject, 'specification': specification})
+    def _cached_frame(self,
+                      subject: str = None,
+                      specification: str = None,
+                      outcome_var: str = None,
+                      rm_disk: bool = False) -> go.Frame:
+        '''returns frame of male higher ed variable, reused from the frame cache when
+        its inputs (source data, MM_MAP config, most recent year, code) are unchanged. Same params as _make_frame'''
+        df_tot = self._get_obj(subject=subject,
+                               years=self._frame_years(subject),
+                               poplimit=0,
+                               **self._frame_kwargs(subject, specification, rm_disk))
+        label = f'{subject} ({specification})' if specification else subject
+        fp = fingerprint('frame', subject, specification, outcome_var, self.most_recent_year, self.hover, self.lod,
+                         MM_MAP[subject], data_hash(df_tot), code_hash())
+        return self._frame_from_cache(label, fp, partial(self._make_frame, subject=subject, specification=specification,
+                                                         outcome_var=outcome_var, rm_disk=rm_disk, df_tot=df_tot))
+
+    @instrumented('MultiMap.build_earnings_frame', rows=lambda frm, self: _frame_rows(frm))
+    def _cached_earnings_frame(self,
+                               api_key: str = None,
+                               outcome_var: str = None,
+                               inflation_adjust: float = 125.58) -> go.Frame:
+        '''returns frame of earnings, reused from the frame cache when its inputs (earnings, admissions data,
+        MM_MAP config, inflation adjustment, most recent year, code) are unchanged. Same params as _make_earnings_frame'''
+        dat, df = self._earnings_inputs(api_key=api_key, outcome_var=outcome_var)
+        label = f'earnings ({outcome_var})'
+        fp = fingerprint('earnings_frame', outcome_var, inflation_adjust, self.most_recent_year, self.hover, self.lod,
+                         MM_MAP['earnings'], dat, data_hash(df), code_hash())
+        return self._frame_from_cache(label, fp, partial(self._make_earnings_frame, api_key=api_key, outcome_var=outcome_var,
+                                                         inflation_adjust=inflation_adjust, dat=dat, df=df))
+
+    def _make_frame(self,
+                    subject: str = None,
+                    specification: str = None,
+                    outcome_var: str = None,
+                    rm_disk: bool = False,
+                    df_tot: pd.DataFrame = None) -> go.Frame:
+        '''returns frame of male higher ed variable
+        
+        :param subject: frame subject.
+        :param specification: within-subject specification.
+        :param outcome_var: variable used for marker colors. 
+        :rm_disk: boolean to determine if raw data should be removed from disk when frame is finished building
+        :param df_tot: frame data, already loaded (all years). Loaded here when None
+        '''
         # SET CONST
         sbjct_cfg = MM_MAP[subject]
 
@@ -253,8 +757,6 @@ class MultiMap:
         sizing_func = sizing_cfg[1]
         sizing_cutoff = sbjct_cfg['sizing_cutoff']
 
-        hover_temp = sbjct_cfg['hover_text']
-
         spec_cfg = sbjct_cfg['specification']
         if len(spec_cfg.keys()) > 0:
             spec_label = spec_cfg[specification]
@@ -262,28 +764,17 @@ class MultiMap:
 
         # LOAD IN DATA
         # kwargs set
-        kwrgs = {
-            'merge_with_char': True,
-            'rm_disk': rm_disk
-        }
-        if subject == 'enrollment':
-            kwrgs['student_level'] = specification
-        elif subject == 'graduation':
-            kwrgs['degree_level'] = specification
-        else:
-            None
+        kwrgs = self._frame_kwargs(subject, specification, rm_disk)
         # years to iterate, needed for hover label
-        if subject in ['admissions','graduation']:
-            years_iter = [self.most_recent_year - 20,self.most_recent_year - 10,self.most_recent_year]
-        elif subject in ['enrollment','completion']:
-            years_iter = [self.most_recent_year - 30,self.most_recent_year - 20,self.most_recent_year-10,self.most_recent_year]
+        years_iter = self._frame_years(subject)
         
         # GET DATA
         # all years
-        df_tot = self._get_obj(subject=subject,
-                           years=years_iter,
-                           poplimit=0,
-                           **kwrgs)
+        if df_tot is None:
+            df_tot = self._get_obj(subject=subject,
+                               years=years_iter,
+                               poplimit=0,
+                               **kwrgs)
         # most recent year
         df = df_tot.loc[df_tot['year']==self.most_recent_year].query('latitude.notnull() and longitude.notnull()').copy()
         # set tots for grad and enrollment
@@ -298,68 +789,11 @@ class MultiMap:
         df_tot = df_tot.loc[df_tot['outcome_var'].notnull()] # ensure outcome_var is known
 
         # HOVER LABEL
-        # get all ids
-        all_ids = df['id'].unique()
-        text_dict = {id_: ['NA']*len(years_iter) for id_ in all_ids}
-        for id_ in text_dict.keys():
-            temp_df = df_tot.loc[df_tot['id']==id_]
-            ctr = 0
-            for yr in years_iter:
-                v = temp_df.loc[temp_df['year']==yr, 'outcome_var']
-                if len(v) == 0:
-                    obs = 'NA'
-                else:
-                    obs = np.float64(v)
-                text_dict[id_][ctr] = obs # add to dict
-                ctr+=1
-        # build hover text
-        hovertext_arr = []
-        for i_,r in df.iterrows():
-            yr = self.most_recent_year
-            nm = r['name']
-            cty = r['city']
-            st = r['state']
-            v_map = text_dict[r['id']]
-            if subject == 'admissions':
-                hvtxt = hover_temp.format(
-                    rec_yr=yr, name=nm, city=cty, state=st,
-                    men_app=int_value_handler(r['men_applied']), men_accepted=int_value_handler(r['men_admitted']), men_accept_rate=int_value_handler(r['accept_rate_men']),
-                    women_accept_rate=int_value_handler(r['accept_rate_women']), 
-                    men_accept_share=int_value_handler(r['men_admitted_share']), men_apply_share=int_value_handler(r['men_applied_share']),
-                    year0 = years_iter[0], year1 = years_iter[1], year2 = years_iter[2],
-                    year0_rate = int_value_handler(v_map[0]),
-                    year1_rate = int_value_handler(v_map[1]), 
-                    year2_rate = int_value_handler(v_map[2]),
-                    perc = percentile_formatter(df['accept_rate_men'],r['accept_rate_men'])
-                )
-            elif subject == 'enrollment':
-                hvtxt = hover_temp.format(
-                    rec_yr=yr, name=nm, city=cty, state=st,
-                    totmen = int_value_handler(r['totmen']), totwomen = int_value_handler(r['totwomen']),
-                    totmen_share = int_value_handler(r['totmen_share']),
-                    year0 = years_iter[0], year1 = years_iter[1], year2 = years_iter[2], year3 = years_iter[3],
-                    year0_rate = int_value_handler(v_map[0]),
-                    year1_rate = int_value_handler(v_map[1]), 
-                    year2_rate = int_value_handler(v_map[2]),
-                    year3_rate = int_value_handler(v_map[3]),
-                    perc = percentile_formatter(df['totmen_share'],r['totmen_share'])
-                )
-            elif subject == 'graduation':
-                yr_lag = yr - 6 if specification == 'bach' else yr - 3
-                hvtxt = hover_temp.format(
-                    rec_yr=yr, name=nm, city=cty, state=st, rec_yr_lag = yr_lag,
-                    men_grad = int_value_handler(r['totmen_graduated']),
-                    male_grad_rate = int_value_handler(r['gradrate_totmen']), female_grad_rate = int_value_handler(r['gradrate_totwomen']),
-                    diff_grad = int_value_handler(r['gradrate_totmen'],r['gradrate_totwomen'],'subtract'),
-                    year0 = years_iter[0], year1 = years_iter[1], year2 = years_iter[2],
-                    year0_rate = int_value_handler(v_map[0]),
-                    year1_rate = int_value_handler(v_map[1]), 
-                    year2_rate = int_value_handler(v_map[2]),
-                    perc = percentile_formatter(df['gradrate_totmen'],r['gradrate_totmen'])
-                )
-            else:
-                hvtxt = 'TO DO'
-            hovertext_arr.append(hvtxt)
+        hover_fields = self._hover_fields(subject=subject,
+                                          specification=specification,
+                                          df=df,
+                                          df_tot=df_tot,
+                                          years_iter=years_iter)
         # color bar
         # find weighted median of the marker var
         wtmed = wtd_quantile(df,'outcome_var',sizing_var,1/2)
@@ -379,8 +813,7 @@ class MultiMap:
             locationmode='USA-states',
             lat=df['latitude'],
             lon=df['longitude'],
-            text=hovertext_arr,
-            hovertemplate='%{text}<extra></extra>',
+            **self._hover_data(subject, df, hover_fields),
             marker={
                 'size': df[sizing_var].apply(sizing_func).round(1),
                 'color': df['outcome_var'].round(1),
@@ -407,6 +840,9 @@ class MultiMap:
                 sbttl += ' (Six Years After Enrollment)'
             else:
                 sbttl += ' (Three Years After Enrollment)'
+        if self.lod:
+            frm_dat = [self._lod_trace(df, 'outcome_var', sizing_var, var_label, frm_dat), frm_dat]
+            frm_dat[1].marker.showscale = False # the grid shows the colour bar at the national view
         frm = go.Frame(data=frm_dat,
                        name=var_label,
                        layout=go.Layout(title={'subtitle': {'text': f'Currently viewing: <b>{sbttl}'}}, 
@@ -417,18 +853,33 @@ class MultiMap:
                                         showlegend=False,
                                         margin={sd:90 if sd=='t' else 0 for sd in ['pad','l','r','t','b']})
                                         )
-        self.frames.append(frm)
+        return frm
     
-    def build_earnings_frame(self,
-                            api_key: str =  None,
-                            outcome_var: str = None,
-                            inflation_adjust: float = 125.58) -> go.Frame:
-        '''build frame of earnings
+    def _earnings_inputs(self,
+                         api_key: str = None,
+                         outcome_var: str = None) -> Tuple[Dict[str,List[Any]], pd.DataFrame]:
+        '''returns (earnings dict, most recent admissions data with known lon/lat) for the earnings frame'''
+        dat = self._get_earnings(api_key=api_key, wage_var=outcome_var, poplimit=MM_MAP['earnings']['sizing_cutoff'])
+        df = self._get_obj(subject='admissions',
+                           years=self.most_recent_year,
+                           poplimit=0,
+                           merge_with_char=True,
+                           rm_disk=False).query('latitude.notnull() and longitude.notnull()')
+        return dat, df
+
+    def _make_earnings_frame(self,
+                             api_key: str =  None,
+                             outcome_var: str = None,
+                             inflation_adjust: float = 125.58,
+                             dat: Dict[str,List[Any]] = None,
+                             df: pd.DataFrame = None) -> go.Frame:
+        '''returns frame of earnings
 
         :api_key: College Scorecard API key string
         :param outcome_var: variable used for marker colors. Options include mean, median
         :param inflation_adjust: the PCE index for the most recent year. This will be divided
                                  by the 2022 index to bring 2022 estimates to modern dollars
+        :param dat: earnings dict, and df: admissions data, already loaded (see _earnings_inputs). Loaded here when None
         '''
         # SET CONST
         sbjct_cfg = MM_MAP['earnings']
@@ -442,22 +893,13 @@ class MultiMap:
         sizing_var = sizing_cfg[0]
         sizing_func = sizing_cfg[1]
         sizing_cutoff = sbjct_cfg['sizing_cutoff']
-
-        hover_temp = sbjct_cfg['hover_text']
         
         # LOAD IN DATA
-        # earnings dat
-        earn = Earnings(api_key=api_key)
-        earn.get_wages(wage_var=outcome_var,poplimit=sizing_cutoff)
-        dat = earn.earnings_dat
+        # earnings dat, admissions dat to map (known lon/lat)
+        if dat is None or df is None:
+            dat, df = self._earnings_inputs(api_key=api_key, outcome_var=outcome_var)
         male_earn_map = {id_:dat[id_][0] for id_ in dat.keys()} # male earnings
         female_earn_map = {id_:dat[id_][1] for id_ in dat.keys()} # female earnings
-        # load admissions dat to map, known lon/lat
-        df = self._get_obj(subject='admissions',
-                           years=self.most_recent_year,
-                           poplimit=0,
-                           merge_with_char=True,
-                           rm_disk=False).query('latitude.notnull() and longitude.notnull()')
         # filter out those below a size
         df = df.loc[df[sizing_var] >= sizing_cutoff]
         # MAP earnings
@@ -474,19 +916,7 @@ class MultiMap:
         df = df.drop_duplicates(subset=['id'])
 
         # HOVER LABELS
-        hovertext_arr = []
-        for i_,r in df.iterrows():
-            nm = r['name']
-            cty = r['city']
-            st = r['state']
-            hvtxt = hover_temp.format(
-                name=nm, city=cty, state=st,spec=var_alias,
-                male_earn=int_value_handler(r['male_earn']),
-                female_earn=int_value_handler(r['female_earn']),
-                diff_earn=(int_value_handler(r['male_earn'],r['female_earn'],'subtract')),
-                    perc = percentile_formatter(df['male_earn'],r['male_earn'])
-            )
-            hovertext_arr.append(hvtxt)
+        hover_fields = self._earnings_hover_fields(df=df, spec=var_alias)
         #color bar and marker color
         # in order for this multiframe plot to work, we need to have all frames set between 0,100
         # due to some outliers, we'll first take the natural log, then normalize to 0,100
@@ -518,8 +948,7 @@ class MultiMap:
             locationmode='USA-states',
             lat=df['latitude'],
             lon=df['longitude'],
-            text=hovertext_arr,
-            hovertemplate='%{text}<extra></extra>',
+            **self._hover_data('earnings', df, hover_fields),
             marker={
                 'size': df[sizing_var].apply(sizing_func).round(1),
                 'color': df['male_earn_norm'],
@@ -541,6 +970,10 @@ class MultiMap:
         )
         # frame
         sbttl = re.sub(r'\<br\>',' <b>', var_label)
+        if self.lod:
+            frm_dat = [self._lod_trace(df, 'male_earn', sizing_var, var_label, frm_dat,
+                                       color_var='male_earn_norm', dollars=True), frm_dat]
+            frm_dat[1].marker.showscale = False # the grid shows the colour bar at the national view
         frm = go.Frame(data=frm_dat,
                        name=var_label,
                        layout=go.Layout(title={'subtitle': {'text': f'Currently viewing: <b>{sbttl}'}}, 
@@ -550,12 +983,140 @@ class MultiMap:
                                                     'font': {'color': '#1e4a4a'}},
                                         showlegend=False,
                                         margin={sd:90 if sd=='t' else 0 for sd in ['pad','l','r','t','b']}))
-        self.frames.append(frm)
+        return frm
     
+    def _lod_trace(self,
+                   df: pd.DataFrame = None,
+                   value_var: str = None,
+                   weight_var: str = None,
+                   label: str = None,
+                   markers: go.Scattergeo = None,
+                   color_var: str = None,
+                   dollars: bool = False) -> go.Scattergeo:
+        '''returns the level-of-detail trace of a frame: one marker per grid cell (see _lod_grid), sized by
+        school count, and coloured by the size-weighted mean of color_var on the school markers' colour scale
+        and colour bar (shown with whichever trace is visible, see _lod_script)
+
+        :param df: frame data, one row per school marker
+        :param value_var: outcome shown in the hover label, e.g. 'outcome_var'
+        :param weight_var: weights, i.e. the marker sizing variable
+        :param label: outcome label, e.g. var_label
+        :param markers: the frame's school markers, for their colour scale, range and colour bar
+        :param color_var: marker colour variable. Defaults to value_var
+        :param dollars: when True, values are shown as dollars, otherwise as percents
+        '''
+        color_var = color_var or value_var
+        grid = _lod_grid(df, list(dict.fromkeys([value_var, color_var])), weight_var)
+        colors = np.asarray(markers.marker.color, dtype=np.float64)
+        vals = int_value_handler_vec(grid[value_var])
+        vals = ('$' + vals) if dollars else (vals + '%')
+        plain_label = re.sub(r'\s+', ' ', re.sub(r'<[^>]+>', ' ', label)).strip()
+        return go.Scattergeo(
+            locationmode='USA-states',
+            lat=grid['latitude'],
+            lon=grid['longitude'],
+            text=('<b>' + grid['count'].astype(str) + np.where(grid['count'] == 1, ' school', ' schools')
+                  + '</b><br>' + plain_label + ': <b>' + vals
+                  + '</b><br>(size-weighted mean)').tolist(),
+            hovertemplate='%{text}<extra></extra>',
+            marker={
+                'size': np.clip(6 + 3 * np.sqrt(grid['count']), 6, 40).round(1),
+                'color': grid[color_var].round(1),
+                'colorscale': markers.marker.colorscale,
+                # same colours as the school markers, whose range plotly takes from their data
+                'cmin': float(np.nanmin(colors)) if len(colors) else None,
+                'cmax': float(np.nanmax(colors)) if len(colors) else None,
+                'colorbar': markers.marker.colorbar,
+                'showscale': True,
+                'opacity': .8,
+                'line_color': 'black',
+                'sizemode': 'diameter'
+            }
+        )
+
+    def _lod_script(self) -> str:
+        '''returns js that shows the grid trace (0) at the national view, and the school markers (1) once zoomed in
+        past LOD_ZOOM or while the search box has a query, along with its colour bar (plotly doesn't draw a hidden
+        trace's colour bar). Checked again on zoom, frame change and search input'''
+        return f'''var gd = document.getElementById('{{plot_id}}');
+                   function applyLod() {{
+                       var geo = gd.layout.geo || {{}};
+                       var scale = (geo.projection && geo.projection.scale) || 1;
+                       var search = document.getElementById('searchBox');
+                       var detail = scale >= {LOD_ZOOM} || (search !== null && search.value.trim() !== '');
+                       var shown = [!detail, detail];
+                       if (gd.data.slice(0, 2).every(function(trace, i) {{
+                           return trace.visible === shown[i] && trace.marker.showscale === shown[i];
+                       }})) return;
+                       Plotly.restyle(gd, {{'visible': shown, 'marker.showscale': shown}}, [0, 1]);
+                   }}
+                   gd.on('plotly_relayout', applyLod);
+                   gd.on('plotly_animated', applyLod);
+                   document.addEventListener('input', function(e) {{
+                       if (e.target.id === 'searchBox') applyLod();
+                   }});
+                   applyLod();'''
+
+    def _compact_frame(self,
+                       frm: go.Frame = None) -> go.Frame:
+        '''returns copy of frame with rounded coordinates, and numeric arrays as float32'''
+        frm = go.Frame(frm)
+        for trace in frm.data:
+            for path in COMPACT_ARRAYS:
+                parent = trace
+                for attr in path[:-1]:
+                    parent = parent[attr]
+                v = parent[path[-1]]
+                if not isinstance(v, np.ndarray) or v.dtype.kind not in 'fiu':
+                    continue # e.g. a single marker color
+                if path[0] in ('lat', 'lon'):
+                    v = np.round(v.astype(np.float64), COORD_DECIMALS)
+                parent[path[-1]] = v.astype(np.float32)
+        return frm
+
+    def _frame_nbytes(self,
+                      frm: go.Frame = None) -> int:
+        '''returns bytes a frame adds to the figure json (arrays are only written as typed arrays within a figure)'''
+        return len(pio.to_json(go.Figure(frames=[frm]))) - len(pio.to_json(go.Figure()))
+
+    @instrumented('MultiMap.build_multimap', info=lambda self, **kwargs: {'frames': len(self.frames)})
     def build_multimap(self,
                        title: str = None,
-                       notes: str = None) -> None:
-        '''build multimap plot based on stored frames'''
+                       notes: str = None,
+                       compact: bool = False) -> None:
+        '''build multimap plot based on stored frames
+        
+        :param title: map title
+        :param notes: map figure notes
+        :param compact: when True, shrinks the html payload:<br>
+                        - coordinates are rounded to COORD_DECIMALS, and numeric arrays are written as float32 typed arrays<br>
+                        - the first frame's data aren't written twice (as the figure data and as a frame);
+                          the frame is rebuilt from the drawn figure once the plot loads<br>
+                        Plotly has no way to reference data across frames, so coordinates shared by frames are still repeated.
+                        Each frame's json size, before and after compacting, is logged and stored in frame_bytes
+                        (the first frame is measured the same way, though its data are then written once, as the figure data)
+        '''
+        frames = self.frames
+        self.post_scripts = []
+        if compact:
+            frames = [self._compact_frame(frm) for frm in self.frames]
+            first = frames[0]
+            # first frame = figure data, re-added as a (deep copied, so animations don't overwrite it) frame on load
+            self.post_scripts.append(
+                f'''var gd = document.getElementById('{{plot_id}}');
+                            Plotly.addFrames(gd, [{{name: {json.dumps(first.name)},
+                                                   data: gd.data.map(function(trace) {{ return structuredClone(trace); }}),
+                                                   layout: {pio.to_json(first.layout)}}}], [0]);'''.replace('</', '<\\/')
+            )
+            self.frame_bytes = {}
+            for i, (frm, cfrm) in enumerate(zip(self.frames, frames)):
+                before = self._frame_nbytes(frm)
+                after = self._frame_nbytes(cfrm)
+                self.frame_bytes[frm.name] = (before, after)
+                logger.info('frame %s: %d -> %d bytes (%d saved)',
+                            re.sub(r'<[^>]+>', ' ', frm.name), before, after, before - after)
+        if self.lod:
+            self.post_scripts.append(self._lod_script())
         # CREATE BUTTON DROPDOWN
         tabs = [
             {'method': 'animate',
@@ -564,12 +1125,12 @@ class MultiMap:
                  [frm.name], {'mode': 'immediate',
                               'frame': {'duration': 0, 'redraw': True},
                               'transition': {'duration': 0}}
-             ]} for frm in self.frames
+             ]} for frm in frames
         ]
         # create figure
-        fig = go.Figure(data=self.frames[0].data,
-                        frames=self.frames,
-                        layout=self.frames[0].layout)
+        fig = go.Figure(data=frames[0].data,
+                        frames=frames[1:] if compact else frames,
+                        layout=frames[0].layout)
         # add tabs
         fig.update_layout(updatemenus=[
             {'buttons': tabs,
@@ -600,7 +1161,13 @@ def build_map(most_recent_year: int = 2023,
               inflation_adjust: float = None,
               map_title: str = None,
               map_notes: str = None,
-              fpath: str = None) -> None:
+              fpath: str = None,
+              shared: SharedData = None,
+              max_workers: int = None,
+              compact: bool = False,
+              lazy_frames: bool = False,
+              hover: str = 'text',
+              lod: bool = False) -> None:
     '''builds map, downloads html to disk
     
     :param most_recent_year: most recent year of data available
@@ -609,17 +1176,23 @@ def build_map(most_recent_year: int = 2023,
     :param map_title: title of map
     :param map_notes: map figure notes
     :param fpath: output path for plotly map html
+    :param shared: data shared with the table build (see genplot.pipeline.build_all)
+    :param max_workers: number of frame threads (genpeds loads still run one at a time). Defaults to one worker per frame
+    :param compact: when True, writes a smaller html payload (see MultiMap.build_multimap)
+    :param lazy_frames: when True, only the first frame is written into the html; the others are fetched on demand (see MultiMap.viz_to_html)
+    :param hover: 'text' (rendered hover paragraphs) or 'template' (customdata and a plotly hovertemplate; same labels, smaller html)
+    :param lod: when True, the national view shows schools binned into a grid, and single schools once zoomed in (see MultiMap)
     '''
-    mm = MultiMap(most_recent_year=most_recent_year) # init MultiMap
+    mm = MultiMap(most_recent_year=most_recent_year, shared=shared, hover=hover, lod=lod) # init MultiMap
 
-    mm.build_frame(subject='admissions',specification=None, outcome_var='admit_rate') # Admissions 
-    mm.build_frame(subject='enrollment',specification='undergrad', outcome_var='male_enrollment_share') # Enrollment (Undergrad)
-    mm.build_frame(subject='enrollment',specification='grad', outcome_var='male_enrollment_share') # Enrollment (Grad)
-    mm.build_frame(subject='graduation',specification='bach', outcome_var='male_graduation_rate') # Graduation (Bachelor's)
-    mm.build_frame(subject='graduation',specification='assc', outcome_var='male_graduation_rate') # Graduation (Associate's)
-    mm.build_earnings_frame(api_key=collescorecard_key,outcome_var='median',inflation_adjust=inflation_adjust) # Earnings (6-years after enrollment)
+    # MAP_FRAMES frames, then Earnings (6-years after enrollment), built in threads (IPEDS loads one at a time)
+    mm.build_frames(api_key=collescorecard_key,
+                    earnings_var='median',
+                    inflation_adjust=inflation_adjust,
+                    max_workers=max_workers)
 
     mm.build_multimap(title=map_title, # build map, title
-                      notes=map_notes) # figure note
+                      notes=map_notes, # figure note
+                      compact=compact) # smaller html payload
     
-    mm.viz_to_html(fpath=fpath,add_search_bar=True) # convert plotly Figure object to html, add search bar
+    mm.viz_to_html(fpath=fpath,add_search_bar=True,lazy_frames=lazy_frames) # convert plotly Figure object to html, add search bar
@@ -0,0 +1,78 @@
+from typing import Union
+
+from .shared import SharedData
+from .multimap import MultiMap, build_map
+from .datatable import EdDataTable, build_table
+from .store import DataStore
+
+'''
+In this module, we define build_all, which builds the map and the table
+in one pass, fetching every dataset they share exactly once (or reading them from a data store).
+'''
+
+def build_all(most_recent_year: int = 2023,
+              collescorecard_key: str = None,
+              inflation_adjust: float = None,
+              map_title: str = None,
+              map_notes: str = None,
+              map_fpath: str = None,
+              table_fpath: str = None,
+              max_workers: int = None,
+              table_render: str = 'html',
+              map_compact: bool = False,
+              map_lazy_frames: bool = False,
+              map_hover: str = 'text',
+              map_lod: bool = False,
+              table_exports: bool = False,
+              store: str = None) -> Union[SharedData, DataStore]:
+    '''builds map and table, downloads both html files to disk. returns the SharedData (or DataStore) used.
+    
+    :param most_recent_year: most recent year of data available
+    :param collegescorecard_key: College Scorecard API key string
+    :param inflation_adjust: PCE inflation index, pegged at 2017, for the most recent year of data
+    :param map_title: title of map
+    :param map_notes: map figure notes
+    :param map_fpath: output path for plotly map html
+    :param table_fpath: output path for datatable html
+    :param max_workers: number of map frame (and table) threads; genpeds loads still run one at a time. Defaults to one worker per frame (and table)
+    :param table_render: 'html' (table rows written as html), 'json' (rows embedded as json, rendered on demand),
+                         'shards' (rows written to one json file per tab, fetched when the tab is first shown)
+                         or 'server' (rows fetched a page at a time from a TableServer, see genplot.tableserver)
+    :param map_compact: when True, writes a smaller map html payload (see MultiMap.build_multimap)
+    :param map_lazy_frames: when True, only the first map frame is written into the html; the others are fetched on demand
+    :param map_hover: 'text' (rendered hover paragraphs) or 'template' (customdata and a plotly hovertemplate; same labels, smaller html)
+    :param map_lod: when True, the national map view shows schools binned into a grid, and single schools once zoomed in
+    :param table_exports: when True, also writes every table as parquet and gzipped csv files next to table_fpath, linked from the table page
+    :param store: path of a data store (see genplot.store.build_store). When given, both builders read their data from it,
+                  rather than fetching and cleaning it
+    '''
+    if store is not None:
+        shared = DataStore(store)
+    else:
+        # plan the union of datasets both builders need, then fetch each once
+        shared = SharedData(api_key=collescorecard_key)
+        MultiMap(most_recent_year=most_recent_year).plan_data(shared)
+        EdDataTable(most_recent_year=most_recent_year).plan_data(shared)
+        shared.fetch()
+
+    build_map(most_recent_year=most_recent_year,
+              collescorecard_key=collescorecard_key,
+              inflation_adjust=inflation_adjust,
+              map_title=map_title,
+              map_notes=map_notes,
+              fpath=map_fpath,
+              shared=shared,
+              max_workers=max_workers,
+              compact=map_compact,
+              lazy_frames=map_lazy_frames,
+              hover=map_hover,
+              lod=map_lod)
+    build_table(most_recent_year=most_recent_year,
+                collescorecard_key=collescorecard_key,
+                inflation_adjust=inflation_adjust,
+                fpath=table_fpath,
+                shared=shared,
+                max_workers=max_workers,
+                render=table_render,
+                exports=table_exports)
+    return shared
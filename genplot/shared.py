@@ -0,0 +1,138 @@
+import json
+import threading
+from typing import List, Dict, Union, Tuple, Any
+
+import pandas as pd
+
+from .cache import IGNORED_KWARGS, normalize_years
+from .utils import CleanForPlot
+from .earnings import Earnings
+
+'''
+In this module, we define the SharedData class, which lets the map and the
+table share one copy of each dataset.
+
+Builders register what they need with add_subject()/add_earnings() (see
+MultiMap.plan_data and EdDataTable.plan_data). SharedData merges the requests:
+- subject requests with the same subject and run kwargs are merged into one
+  request for the union of their years
+- earnings requests for the same wage variable are merged into one request at
+  the lowest poplimit, with school sizes, so higher poplimits are filtered locally
+fetch() then pulls each merged dataset exactly once, and load()/earnings()
+hand out the slices each builder asked for.
+'''
+
+
+class SharedData:
+    '''subject data and Scorecard earnings, fetched once and shared across builders'''
+    def __init__(self,
+                 api_key: str = None):
+        '''shared data
+
+        :param api_key: College Scorecard API key string
+        '''
+        self.api_key = api_key
+        self.subject_plan = {} # (subject, kwargs) -> {'subject','kwargs','years'}
+        self.earnings_plan = {} # wage_var -> lowest poplimit
+        self.subject_data = {} # (subject, kwargs) -> (years fetched, dataframe)
+        self.earnings_data = {} # wage_var -> (poplimit fetched, Earnings)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key(self,
+             subject: str = None,
+             **kwargs) -> Tuple[str,str]:
+        '''returns plan key: subject, and the run kwargs that change the data'''
+        run_kwargs = {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS}
+        return (subject, json.dumps(run_kwargs, sort_keys=True, default=str))
+
+    def _key_lock(self,
+                  key: Any = None) -> threading.Lock:
+        '''returns lock for one dataset, so concurrent builders fetch it once'''
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def add_subject(self,
+                    subject: str = None,
+                    years: Union[List[int], Tuple[int], int] = None,
+                    **kwargs) -> None:
+        '''registers a subject request
+
+        :param subject: IPEDS data subject string; e.g., 'enrollment'
+        :param years: range of years (tuple), list of years, or single year (int)
+        :param kwargs: run kwargs, like student_level = 'grad'
+        '''
+        key = self._key(subject, **kwargs)
+        entry = self.subject_plan.setdefault(key, {'subject': subject, 'kwargs': kwargs, 'years': set()})
+        entry['years'].update(normalize_years(years))
+
+    def add_earnings(self,
+                     wage_var: str = 'median',
+                     poplimit: int = 300) -> None:
+        '''registers a Scorecard earnings request
+
+        :param wage_var: wage variable, e.g. 'median'
+        :param poplimit: enrollment lower bound
+        '''
+        self.earnings_plan[wage_var] = min(poplimit, self.earnings_plan.get(wage_var, poplimit))
+
+    def fetch(self) -> None:
+        '''fetches every planned dataset, once'''
+        for key, entry in self.subject_plan.items():
+            self._fetch_subject(key, entry['subject'], sorted(entry['years']), **entry['kwargs'])
+        for wage_var, poplimit in self.earnings_plan.items():
+            self._fetch_earnings(wage_var, poplimit)
+
+    def _fetch_subject(self,
+                       key: Tuple[str,str] = None,
+                       subject: str = None,
+                       years: List[int] = None,
+                       **kwargs) -> pd.DataFrame:
+        '''pulls subject data for years (via the subject cache), unless already held'''
+        with self._key_lock(key):
+            held = self.subject_data.get(key)
+            if held is None or not set(years) <= held[0]:
+                if held is not None: # fetch the union, rather than a second overlapping frame
+                    years = sorted(held[0] | set(years))
+                df = CleanForPlot(subject=subject, years=list(years), poplimit=0)._load(**kwargs)
+                held = (set(years), df)
+                self.subject_data[key] = held
+            return held[1]
+
+    def _fetch_earnings(self,
+                        wage_var: str = 'median',
+                        poplimit: int = 300) -> Earnings:
+        '''pulls earnings, with school sizes, at poplimit, unless already held at or below it'''
+        with self._key_lock(('earnings', wage_var)):
+            held = self.earnings_data.get(wage_var)
+            if held is None or held[0] > poplimit:
+                earn = Earnings(api_key=self.api_key)
+                earn.get_wages(wage_var=wage_var, poplimit=poplimit, with_size=True)
+                held = (poplimit, earn)
+                self.earnings_data[wage_var] = held
+            return held[1]
+
+    def load(self,
+             subject: str = None,
+             years: Union[List[int], Tuple[int], int] = None,
+             **kwargs) -> pd.DataFrame:
+        '''returns subject data for years, before the poplimit cutoff (the CleanForPlot source interface).
+        Unplanned requests are fetched on demand.
+
+        :param subject: IPEDS data subject string; e.g., 'enrollment'
+        :param years: range of years (tuple), list of years, or single year (int)
+        :param kwargs: run kwargs, like student_level = 'grad'
+        '''
+        years = normalize_years(years)
+        df = self._fetch_subject(self._key(subject, **kwargs), subject, years, **kwargs)
+        return df.loc[df['year'].isin(years)]
+
+    def earnings(self,
+                 wage_var: str = 'median',
+                 poplimit: int = 300) -> Dict[str,List[Any]]:
+        '''returns {school_id: [male_earnings,female_earnings]}, same as Earnings.get_wages(wage_var, poplimit)
+
+        :param wage_var: wage variable, e.g. 'median'
+        :param poplimit: enrollment lower bound
+        '''
+        return self._fetch_earnings(wage_var, poplimit).limit(poplimit)
@@ -0,0 +1,354 @@
+import json
+import sqlite3
+import logging
+from contextlib import closing
+from typing import List, Dict, Union, Tuple, Any
+
+import pandas as pd
+
+from .cache import IGNORED_KWARGS, normalize_years
+from .utils import PLOTS_DICT
+from .shared import SharedData
+from .multimap import MultiMap
+from .datatable import EdDataTable
+from .instrument import instrumented
+
+'''
+In this module, we define DataStore, one local SQLite file holding every cleaned
+subject (each PLOTS_DICT subject and specification) and the College Scorecard earnings.
+
+The store is normalised around institution/year keys:
+- institution_years holds school attributes (name, city, state, coordinates) once per (id, year),
+  and institutions the most recent ones per school
+- each subject has one table of (dataset_id, id, year, measures...) rows, where a dataset is
+  one subject and set of run kwargs (e.g. enrollment, student_level = 'grad'), listed in datasets
+- earnings holds Scorecard (male, female, size) per wage variable and school
+with indexes on (id, year), state and name.
+
+build_store() fetches everything (with SharedData) and writes the store. DataStore then offers:
+- load()/earnings(), the same interface as SharedData, so the map and table builders
+  (and CleanForPlot, as a source) can read from the store rather than re-deriving data
+- subject(), institutions(), datasets() and query(), which return DataFrames, for analysis
+'''
+
+logger = logging.getLogger(__name__)
+
+# school attributes, stored once per (id, year) in institution_years
+INSTITUTION_COLS = ['name','city','state','latitude','longitude']
+# specifications (run kwargs) stored for each subject, on top of those the map and table need
+STORE_SPECIFICATIONS = {
+    'admissions': [{}],
+    'enrollment': [{'student_level': 'undergrad'}, {'student_level': 'grad'}],
+    'completion': [{'degree_level': level} for level in ['assc','bach','mast','doct']],
+    'graduation': [{'degree_level': 'assc'}, {'degree_level': 'bach'}]
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS datasets (
+    dataset_id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    years TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    dtypes TEXT NOT NULL,
+    n_rows INTEGER NOT NULL,
+    UNIQUE (subject, kwargs)
+);
+CREATE TABLE IF NOT EXISTS institution_years (
+    id NOT NULL,
+    year INTEGER NOT NULL,
+    name TEXT, city TEXT, state TEXT, latitude REAL, longitude REAL,
+    PRIMARY KEY (id, year)
+);
+CREATE INDEX IF NOT EXISTS institution_years_state ON institution_years (state);
+CREATE INDEX IF NOT EXISTS institution_years_name ON institution_years (name);
+CREATE TABLE IF NOT EXISTS institutions (
+    id PRIMARY KEY,
+    year INTEGER,
+    name TEXT, city TEXT, state TEXT, latitude REAL, longitude REAL
+);
+CREATE INDEX IF NOT EXISTS institutions_state ON institutions (state);
+CREATE INDEX IF NOT EXISTS institutions_name ON institutions (name);
+CREATE TABLE IF NOT EXISTS earnings_sets (
+    wage_var TEXT PRIMARY KEY,
+    poplimit INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS earnings (
+    wage_var TEXT NOT NULL,
+    id NOT NULL,
+    male_earn, female_earn, size,
+    PRIMARY KEY (wage_var, id)
+);
+'''
+
+
+def _dataset_kwargs(**kwargs) -> str:
+    '''returns the run kwargs that change the data, as json (same as the SharedData plan key)'''
+    return json.dumps({k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS}, sort_keys=True, default=str)
+
+
+class DataStore:
+    '''cleaned subjects and Scorecard earnings, in one indexed SQLite file'''
+    def __init__(self,
+                 fpath: str = 'genplot.sqlite'):
+        '''data store
+
+        :param fpath: SQLite file path. Created (empty) if it doesn't exist
+        '''
+        self.fpath = fpath
+        with closing(self._connect()) as con, con:
+            con.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        '''returns a new connection; builders load from several threads, so each call gets its own'''
+        return sqlite3.connect(self.fpath)
+
+    @instrumented('DataStore.write', info=lambda self, shared=None: {'datasets': len(shared.subject_data)})
+    def write(self,
+              shared: SharedData = None) -> None:
+        '''writes every dataset a SharedData holds (fetched with SharedData.fetch), replacing stored ones with the same key
+
+        :param shared: SharedData, fetched
+        '''
+        with closing(self._connect()) as con, con:
+            inst = []
+            for (subject, kwargs), (years, df) in shared.subject_data.items():
+                inst.append(self._write_subject(con, subject, kwargs, years, df))
+            self._write_institutions(con, inst)
+            for wage_var, (poplimit, earn) in shared.earnings_data.items():
+                self._write_earnings(con, wage_var, poplimit, earn.earnings_dat)
+        logger.info('stored %d datasets and %d earnings sets in %s',
+                    len(shared.subject_data), len(shared.earnings_data), self.fpath)
+
+    def _write_subject(self,
+                       con: sqlite3.Connection = None,
+                       subject: str = None,
+                       kwargs: str = None,
+                       years: List[int] = None,
+                       df: pd.DataFrame = None) -> pd.DataFrame:
+        '''writes one dataset's rows (without school attributes) to its subject table. returns its school attributes'''
+        con.execute('DELETE FROM datasets WHERE subject = ? AND kwargs = ?', (subject, kwargs))
+        if self._has_table(con, subject):
+            con.execute(f'DELETE FROM "{subject}" WHERE dataset_id NOT IN (SELECT dataset_id FROM datasets)')
+        cur = con.execute('INSERT INTO datasets (subject, kwargs, years, columns, dtypes, n_rows) VALUES (?, ?, ?, ?, ?, ?)',
+                          (subject, kwargs, json.dumps(sorted(int(y) for y in years)),
+                           json.dumps([str(c) for c in df.columns]),
+                           json.dumps({str(c): self._dtype_spec(d) for c, d in df.dtypes.items()}, default=str), len(df)))
+        inst_cols = [c for c in INSTITUTION_COLS if c in df.columns]
+        rows = df.drop(columns=inst_cols)
+        rows.insert(0, 'row_index', df.index if pd.api.types.is_integer_dtype(df.index) else range(len(df)))
+        rows.insert(0, 'dataset_id', cur.lastrowid)
+        if not self._has_table(con, subject):
+            rows.head(0).to_sql(subject, con, index=False)
+            con.execute(f'CREATE INDEX "{subject}_dataset_year" ON "{subject}" (dataset_id, year)')
+            con.execute(f'CREATE INDEX "{subject}_id_year" ON "{subject}" (id, year)')
+        # datasets of a subject can differ in columns (e.g. studentlevel)
+        known = {r[1] for r in con.execute(f'PRAGMA table_info("{subject}")')}
+        for col in rows.columns:
+            if col not in known:
+                con.execute(f'ALTER TABLE "{subject}" ADD COLUMN "{col}"')
+        rows.to_sql(subject, con, index=False, if_exists='append', chunksize=10_000)
+        return df.loc[:, ['id','year'] + inst_cols] if inst_cols else df.loc[:, []]
+
+    def _write_institutions(self,
+                            con: sqlite3.Connection = None,
+                            inst: List[pd.DataFrame] = None) -> None:
+        '''writes school attributes per (id, year), and the most recent ones per school'''
+        inst = [df for df in inst if len(df.columns)]
+        if not inst:
+            return
+        df = pd.concat(inst).drop_duplicates(['id','year'], keep='last')
+        df = df.reindex(columns=['id','year'] + INSTITUTION_COLS).astype(object)
+        con.executemany('INSERT OR REPLACE INTO institution_years (id, year, name, city, state, latitude, longitude) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        df.where(df.notna(), None).itertuples(index=False, name=None))
+        con.execute('''INSERT OR REPLACE INTO institutions (id, year, name, city, state, latitude, longitude)
+                       SELECT id, year, name, city, state, latitude, longitude FROM institution_years iy
+                       WHERE year = (SELECT MAX(year) FROM institution_years WHERE id = iy.id)''')
+
+    def _write_earnings(self,
+                        con: sqlite3.Connection = None,
+                        wage_var: str = None,
+                        poplimit: int = None,
+                        earnings_dat: Dict[str,List[Any]] = None) -> None:
+        '''writes Scorecard earnings ({school_id: [male, female, size]}) of a wage variable'''
+        con.execute('DELETE FROM earnings WHERE wage_var = ?', (wage_var,))
+        con.execute('INSERT OR REPLACE INTO earnings_sets (wage_var, poplimit) VALUES (?, ?)', (wage_var, poplimit))
+        con.executemany('INSERT INTO earnings (wage_var, id, male_earn, female_earn, size) VALUES (?, ?, ?, ?, ?)',
+                        ((wage_var, id_, v[0], v[1], v[2]) for id_, v in earnings_dat.items()))
+
+    def _dtype_spec(self,
+                    dtype: Any = None) -> Union[str, Dict[str,Any]]:
+        '''returns dtype, as stored: its name, or for categoricals their categories too (so filtered rows keep them)'''
+        if isinstance(dtype, pd.CategoricalDtype):
+            return {'categories': dtype.categories.tolist(), 'ordered': bool(dtype.ordered)}
+        return str(dtype)
+
+    def _has_table(self,
+                   con: sqlite3.Connection = None,
+                   table: str = None) -> bool:
+        return con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+    def _dataset(self,
+                 con: sqlite3.Connection = None,
+                 subject: str = None,
+                 **kwargs) -> Dict[str,Any]:
+        '''returns stored dataset of subject and run kwargs: {dataset_id, years, columns, dtypes}'''
+        row = con.execute('SELECT dataset_id, years, columns, dtypes FROM datasets WHERE subject = ? AND kwargs = ?',
+                          (subject, _dataset_kwargs(**kwargs))).fetchone()
+        if row is None:
+            raise KeyError(f'{subject} {_dataset_kwargs(**kwargs)} is not in the store {self.fpath}; rebuild it with build_store')
+        return {'dataset_id': row[0], 'years': json.loads(row[1]), 'columns': json.loads(row[2]), 'dtypes': json.loads(row[3])}
+
+    @instrumented('DataStore.subject', rows=lambda df, self: len(df),
+                  info=lambda self, subject=None, *args, **kwargs: {'subject': subject})
+    def subject(self,
+                subject: str = None,
+                years: Union[List[int], Tuple[int], int] = None,
+                states: List[str] = None,
+                ids: List[Any] = None,
+                name: str = None,
+                merge_with_char: bool = True,
+                **kwargs) -> pd.DataFrame:
+        '''returns stored subject data, as CleanForPlot._load would (same columns, dtypes and index), filtered in SQL
+
+        :param subject: IPEDS data subject string; e.g., 'enrollment'
+        :param years: range of years (tuple), list of years, or single year (int). None for every stored year
+        :param states: states to keep, e.g. ['MA','RI']
+        :param ids: school ids to keep
+        :param name: text the school name contains (case insensitive)
+        :param merge_with_char: run kwarg; the store holds data merged with school characteristics
+        :param kwargs: run kwargs, like student_level = 'grad'
+        '''
+        kwargs['merge_with_char'] = merge_with_char
+        with closing(self._connect()) as con:
+            ds = self._dataset(con, subject, **kwargs)
+            years = ds['years'] if years is None else normalize_years(years)
+            missing = set(years) - set(ds['years'])
+            if missing:
+                raise KeyError(f'{subject} {_dataset_kwargs(**kwargs)} years {sorted(missing)} are not in the store {self.fpath}')
+            inst_cols = [c for c in INSTITUTION_COLS if c in ds['columns']]
+            where = ['s.dataset_id = ?', f's.year IN ({",".join("?" * len(years))})']
+            params = [ds['dataset_id']] + [int(y) for y in years]
+            for col, vals in [('iy.state', states), ('s.id', ids)]:
+                if vals is not None:
+                    where.append(f'{col} IN ({",".join("?" * len(vals))})')
+                    params += list(vals)
+            if name is not None:
+                where.append('iy.name LIKE ?')
+                params.append(f'%{name}%')
+            sql = (f'SELECT s.*{"".join(f", iy.{c}" for c in inst_cols)} FROM "{subject}" s '
+                   'LEFT JOIN institution_years iy ON iy.id = s.id AND iy.year = s.year '
+                   f'WHERE {" AND ".join(where)} ORDER BY s.rowid')
+            df = pd.read_sql_query(sql, con, params=params)
+        df.index = pd.Index(df['row_index'].to_numpy(), dtype='int64')
+        df = df.loc[:, ds['columns']]
+        for col, dtype in ds['dtypes'].items():
+            if isinstance(dtype, dict):
+                df[col] = df[col].astype(pd.CategoricalDtype(dtype['categories'], ordered=dtype['ordered']))
+            elif str(df[col].dtype) != dtype:
+                df[col] = df[col].astype(dtype)
+        return df
+
+    def load(self,
+             subject: str = None,
+             years: Union[List[int], Tuple[int], int] = None,
+             **kwargs) -> pd.DataFrame:
+        '''returns subject data for years, before the poplimit cutoff (the CleanForPlot source interface, see SharedData.load)
+
+        :param subject: IPEDS data subject string; e.g., 'enrollment'
+        :param years: range of years (tuple), list of years, or single year (int)
+        :param kwargs: run kwargs, like student_level = 'grad'
+        '''
+        return self.subject(subject, years, **kwargs)
+
+    def earnings(self,
+                 wage_var: str = 'median',
+                 poplimit: int = 300) -> Dict[str,List[Any]]:
+        '''returns {school_id: [male_earnings,female_earnings]}, same as Earnings.get_wages(wage_var, poplimit)
+
+        :param wage_var: wage variable, e.g. 'median'
+        :param poplimit: enrollment lower bound
+        '''
+        with closing(self._connect()) as con:
+            stored = con.execute('SELECT poplimit FROM earnings_sets WHERE wage_var = ?', (wage_var,)).fetchone()
+            if stored is None or stored[0] > poplimit:
+                raise KeyError(f'{wage_var} earnings at poplimit {poplimit} are not in the store {self.fpath}; rebuild it with build_store')
+            rows = con.execute('SELECT id, male_earn, female_earn FROM earnings '
+                               'WHERE wage_var = ? AND size IS NOT NULL AND size >= ? ORDER BY rowid',
+                               (wage_var, poplimit)).fetchall()
+        return {id_: (male, female) for id_, male, female in rows}
+
+    def institutions(self,
+                     states: List[str] = None,
+                     name: str = None,
+                     year: int = None) -> pd.DataFrame:
+        '''returns schools (id, year, name, city, state, latitude, longitude): their most recent attributes,
+        or those of year
+
+        :param states: states to keep, e.g. ['MA','RI']
+        :param name: text the school name contains (case insensitive)
+        :param year: year of the attributes. None for each school's most recent year
+        '''
+        where, params = [], []
+        if year is not None:
+            where.append('year = ?')
+            params.append(int(year))
+        if states is not None:
+            where.append(f'state IN ({",".join("?" * len(states))})')
+            params += list(states)
+        if name is not None:
+            where.append('name LIKE ?')
+            params.append(f'%{name}%')
+        table = 'institutions' if year is None else 'institution_years'
+        return self.query(f'SELECT * FROM {table}{" WHERE " + " AND ".join(where) if where else ""} ORDER BY name, id', params)
+
+    def datasets(self) -> pd.DataFrame:
+        '''returns stored datasets: dataset_id, subject, run kwargs, years and number of rows'''
+        return self.query('SELECT dataset_id, subject, kwargs, years, n_rows FROM datasets ORDER BY subject, kwargs')
+
+    def query(self,
+              sql: str = None,
+              params: Union[List[Any], Dict[str,Any]] = None) -> pd.DataFrame:
+        '''returns the result of a SQL query on the store
+
+        :param sql: SQL query, e.g. 'SELECT state, COUNT(*) AS n FROM institutions GROUP BY state'
+        :param params: query parameters, for ? (list) or :name (dict) placeholders
+        '''
+        with closing(self._connect()) as con:
+            return pd.read_sql_query(sql, con, params=params)
+
+
+def plan_store(shared: SharedData = None,
+               most_recent_year: int = 2023) -> None:
+    '''registers every dataset the store holds with a SharedData plan: the map's and table's,
+    and each PLOTS_DICT subject in every STORE_SPECIFICATIONS specification
+
+    :param shared: SharedData to plan with
+    :param most_recent_year: most recent year of data available
+    '''
+    mm = MultiMap(most_recent_year=most_recent_year, use_cache=False)
+    mm.plan_data(shared)
+    EdDataTable(most_recent_year=most_recent_year, use_cache=False).plan_data(shared)
+    for subject in PLOTS_DICT.keys():
+        for kwargs in STORE_SPECIFICATIONS[subject]:
+            shared.add_subject(subject, mm._frame_years(subject), merge_with_char=True, rm_disk=False, **kwargs)
+
+def build_store(most_recent_year: int = 2023,
+                collescorecard_key: str = None,
+                fpath: str = 'genplot.sqlite',
+                shared: SharedData = None) -> DataStore:
+    '''fetches every subject and specification (see plan_store), and Scorecard earnings, and writes them to a store.
+    returns the DataStore
+
+    :param most_recent_year: most recent year of data available
+    :param collegescorecard_key: College Scorecard API key string
+    :param fpath: SQLite file path
+    :param shared: SharedData to fetch with. Defaults to a new one
+    '''
+    shared = shared or SharedData(api_key=collescorecard_key)
+    plan_store(shared, most_recent_year)
+    shared.fetch()
+    store = DataStore(fpath)
+    store.write(shared)
+    return store
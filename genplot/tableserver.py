@@ -0,0 +1,301 @@
+import os
+import json
+import logging
+import threading
+from functools import lru_cache, partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from typing import List, Dict, Tuple, Any
+
+import numpy as np
+import pandas as pd
+
+from .datatable import EdDataTable, SERVER_API
+from .shared import SharedData
+
+'''
+In this module, we define TableServer, a small local HTTP service that answers
+DataTables server-side processing requests (serverSide: true) for EdDataTable tabs.
+
+Rather than shipping every row of every tab to the browser, the page (see
+EdDataTable.generate_datatable, render='server') asks the server for one page
+of rows at a time:
+- each tab's cells are held once, as the same strings the html page would print
+- sorted row orders are kept per column (School, State and Year up front, the rest
+  the first time they are sorted on); numeric columns sort by value, not by text
+- global search matches every word of the query, like DataTables' own search, and
+  recent searches are kept, so paging through results doesn't search again
+
+The server only uses the standard library, and listens on localhost by default.
+It also serves the page (and any other file) from its directory, so the page and
+its data share an origin.
+'''
+
+logger = logging.getLogger(__name__)
+
+# columns sorted when a tab is loaded (others are sorted the first time they're ordered on)
+INDEXED_COLS = ['School', 'State', 'Year']
+# searches kept per tab
+SEARCH_CACHE_SIZE = 32
+# most rows returned per request
+MAX_PAGE_ROWS = 5000
+
+
+class TableIndex:
+    '''one table tab, with sorted row orders and a search index'''
+    def __init__(self,
+                 cells: pd.DataFrame = None,
+                 values: pd.DataFrame = None):
+        '''table tab
+
+        :param cells: tab cells, as shown on the page (strings)
+        :param values: tab values, for sorting; same columns as cells. e.g. numbers for '52%'
+        '''
+        self.columns = [str(c) for c in cells.columns]
+        self.cells = cells.to_numpy(dtype=object)
+        self.values = values.reset_index(drop=True)
+        self.ranks = {} # column position -> dense rank of each row's value (missing values lowest)
+        self.orders = {} # (column position, descending) -> row order
+        # one lowercased string per row, for global search
+        haystack = cells.iloc[:, 0].astype(str)
+        for col in cells.columns[1:]:
+            haystack = haystack + ' ' + cells[col].astype(str)
+        self.haystack = haystack.str.lower().reset_index(drop=True)
+        self.matches = lru_cache(maxsize=SEARCH_CACHE_SIZE)(self._matches)
+        for col in INDEXED_COLS:
+            if col in self.columns:
+                self.order(self.columns.index(col))
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def rank(self,
+             col: int = None) -> np.ndarray:
+        '''returns dense ranks of column col: equal values share a rank, missing values rank lowest'''
+        if col < 0 or col >= len(self.columns):
+            raise ValueError(f'no column {col}')
+        if col not in self.ranks:
+            vals = self.values.iloc[:, col]
+            if not pd.api.types.is_numeric_dtype(vals):
+                vals = vals.astype(str).str.lower()
+            self.ranks[col] = vals.rank(method='dense', na_option='top').to_numpy(dtype=np.int64)
+        return self.ranks[col]
+
+    def order(self,
+              col: int = None,
+              desc: bool = False) -> np.ndarray:
+        '''returns row order of column col: ascending (missing values first) or descending, ties in table order'''
+        if (col, desc) not in self.orders:
+            self.orders[(col, desc)] = np.argsort(-self.rank(col) if desc else self.rank(col), kind='stable')
+        return self.orders[(col, desc)]
+
+    def _matches(self,
+                 search: str = None) -> np.ndarray:
+        '''returns boolean mask of rows holding every word of search'''
+        mask = np.ones(len(self), dtype=bool)
+        for word in search.split():
+            mask &= self.haystack.str.contains(word, regex=False).to_numpy()
+        return mask
+
+    def query(self,
+              start: int = 0,
+              length: int = 10,
+              search: str = '',
+              order: List[Tuple[int, str]] = None) -> Tuple[int, List[List[str]]]:
+        '''returns (number of rows matching search, cells of rows start to start + length)
+
+        :param start: first row of the page, in the filtered and sorted table
+        :param length: rows per page. -1 for every row (up to MAX_PAGE_ROWS)
+        :param search: global search; rows must contain every (space separated) word, case insensitive
+        :param order: (column position, 'asc' or 'desc') pairs, first one first
+        '''
+        search = search.strip().lower()
+        order = order or []
+        if len(order) == 1:
+            col, direction = order[0]
+            rows = self.order(col, direction == 'desc')
+        elif order:
+            # lexsort sorts on its last key first
+            rows = np.lexsort([-self.rank(col) if direction == 'desc' else self.rank(col)
+                               for col, direction in reversed(order)])
+        else:
+            rows = np.arange(len(self))
+        if search:
+            rows = rows[self.matches(search)[rows]]
+        length = MAX_PAGE_ROWS if length < 0 else min(length, MAX_PAGE_ROWS)
+        return len(rows), self.cells[rows[start:start + length]].tolist()
+
+
+class TableServer:
+    '''local DataTables server-side processing service for EdDataTable tabs'''
+    def __init__(self,
+                 table: EdDataTable = None,
+                 host: str = '127.0.0.1',
+                 port: int = 8765,
+                 directory: str = None):
+        '''table server
+
+        :param table: EdDataTable, with its dataframes generated (see EdDataTable.generate_df)
+        :param host: address to listen on. Defaults to localhost only
+        :param port: port to listen on. 0 picks a free port (see url)
+        :param directory: directory served as static files, e.g. the one holding the table page. None serves no files
+        '''
+        self.tabs = {}
+        for sbjct, df in table.dataframes.items():
+            cells = self._cells(table, df)
+            self.tabs[sbjct] = TableIndex(cells=cells, values=self._values(cells))
+        self.directory = directory
+        self.httpd = ThreadingHTTPServer((host, port), partial(_TableRequestHandler, self))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _cells(self,
+               table: EdDataTable = None,
+               df: pd.DataFrame = None) -> pd.DataFrame:
+        '''returns tab cells, as the page prints them (see EdDataTable._table_payload)'''
+        payload = table._table_payload(df)
+        return pd.DataFrame(dict(zip(payload['columns'], payload['values'])), columns=payload['columns'])
+
+    def _values(self,
+                cells: pd.DataFrame = None) -> pd.DataFrame:
+        '''returns tab values for sorting: columns of formatted numbers ('52%', '$41000', 'NA') as numbers, others as they are'''
+        values = cells.copy()
+        for col in cells.columns:
+            vals = cells[col].astype(str).str.strip('$%')
+            known = vals != 'NA'
+            nums = pd.to_numeric(vals.where(known), errors='coerce')
+            if (nums.notna() == known).all(): # every known cell is a number
+                values[col] = nums
+        return values
+
+    def answer(self,
+               sbjct: str = None,
+               params: Dict[str, List[str]] = None) -> Dict[str, Any]:
+        '''returns DataTables server-side response for a tab
+
+        :param sbjct: tab name, e.g. 'enrollment_U'
+        :param params: DataTables request parameters (draw, start, length, search[value], order[i][column], order[i][dir])
+        '''
+        if sbjct not in self.tabs:
+            raise KeyError(sbjct)
+        get = lambda key, default: params.get(key, [default])[0]
+        tab = self.tabs[sbjct]
+        order = []
+        i = 0
+        while f'order[{i}][column]' in params:
+            order.append((int(get(f'order[{i}][column]', 0)), get(f'order[{i}][dir]', 'asc')))
+            i += 1
+        n_filtered, rows = tab.query(start=max(int(get('start', 0)), 0),
+                                     length=int(get('length', 10)),
+                                     search=get('search[value]', ''),
+                                     order=order)
+        return {'draw': int(get('draw', 0)), # echoed as an int, as DataTables asks
+                'recordsTotal': len(tab),
+                'recordsFiltered': n_filtered,
+                'data': rows}
+
+    def start(self) -> str:
+        '''serves in a background thread. returns url'''
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info('serving %d tables at %s', len(self.tabs), self.url)
+        return self.url
+
+    def serve_forever(self) -> None:
+        '''serves until interrupted'''
+        logger.info('serving %d tables at %s', len(self.tabs), self.url)
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.httpd.server_close()
+
+    def shutdown(self) -> None:
+        '''stops serving'''
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+class _TableRequestHandler(SimpleHTTPRequestHandler):
+    '''answers GET SERVER_API + tab requests, and serves the server's directory otherwise'''
+    def __init__(self,
+                 server_obj: TableServer,
+                 *args,
+                 **kwargs):
+        self.table_server = server_obj
+        super().__init__(*args, directory=server_obj.directory or os.devnull, **kwargs)
+
+    def do_HEAD(self):
+        if self.table_server.directory is None:
+            return self._send_json(404, {'error': 'not found'})
+        return super().do_HEAD()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.startswith(SERVER_API):
+            if self.table_server.directory is None:
+                return self._send_json(404, {'error': 'not found'})
+            return super().do_GET()
+        sbjct = url.path[len(SERVER_API):].strip('/')
+        try:
+            body = self.table_server.answer(sbjct, parse_qs(url.query))
+        except KeyError:
+            return self._send_json(404, {'error': f'no table {sbjct}'})
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        self._send_json(200, body)
+
+    def _send_json(self,
+                   status: int = 200,
+                   body: Dict[str, Any] = None) -> None:
+        raw = json.dumps(body, separators=(',', ':')).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.send_header('Access-Control-Allow-Origin', '*') # pages opened from disk, or served elsewhere
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+
+def serve_table(most_recent_year: int = 2023,
+                collescorecard_key: str = None,
+                inflation_adjust: float = None,
+                fpath: str = 'table.html',
+                shared: SharedData = None,
+                max_workers: int = None,
+                host: str = '127.0.0.1',
+                port: int = 8765,
+                exports: bool = False) -> None:
+    '''builds IPEDS DataTable data, writes the server-side table page, and serves it (and its data) until interrupted
+
+    :param most_recent_year: most recent year of data available
+    :param collegescorecard_key: College Scorecard API key string
+    :param inflation_adjust: PCE inflation index, pegged at 2017, for the most recent year of data
+    :param fpath: output path for datatable; its directory is served
+    :param shared: data shared with the map build (see genplot.pipeline.build_all)
+    :param max_workers: number of table threads (genpeds loads still run one at a time). Defaults to one worker per table
+    :param host: address to listen on. Defaults to localhost only
+    :param port: port to listen on
+    :param exports: when True, also writes every table as parquet and gzipped csv files next to fpath, linked from the page
+    '''
+    dt = EdDataTable(most_recent_year=most_recent_year, shared=shared)
+    dt.generate_df(
+        earnings_api_key=collescorecard_key,
+        inflation_adjust=inflation_adjust,
+        max_workers=max_workers
+    )
+    dt.generate_datatable(out_path=fpath, render='server', exports=exports)
+    server = TableServer(dt, host=host, port=port, directory=os.path.dirname(os.path.abspath(fpath)))
+    logger.info('table page at %s/%s', server.url, os.path.basename(fpath))
+    server.serve_forever()
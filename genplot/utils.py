@@ -1,9 +1,14 @@
+import os
+import threading
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from typing import List, Dict, Union, Optional, Tuple, Any
 from genpeds import Admissions, Enrollment, Completion, Graduation
 
+from .cache import SubjectCache, get_subject_cache
+from .instrument import instrumented
+
 '''
 In this module, we define the CleanForPlot class,
 which will abstract away some of the necessary data cleaning.
@@ -63,6 +68,18 @@ PLOTS_DICT = {
     }
 }
 
+# columns stored as categoricals in lean mode; few distinct values, repeated across years (and CIP rows)
+LEAN_CATEGORICALS = ['name','city','state','cip_description']
+
+# int_value_handler_vec works in float64 below this size; larger values go through int_value_handler
+INT_EXACT_LIMIT = 2**52
+
+# genpeds downloads to shared directories on disk (and Characteristics is downloaded by
+# every subject that merges with it), so genpeds runs one at a time, even when builders run concurrently.
+# concurrent builders (BUILD_WORKERS) only overlap cache reads, Scorecard paging, and cleaning/plotting;
+# the IPEDS loads of a cold cache are serialised here
+_GENPEDS_LOCK = threading.Lock()
+
 '''
 CleanForPlot provides the data cleaning necessary for our final plots.
 It takes in a subject string, includes ['admissions','enrollment','completion','graduation'].
@@ -73,7 +90,11 @@ class CleanForPlot:
     def __init__(self,
                  subject: str = None,
                  years: Union[List[int], Tuple[int], int] = None,
-                 poplimit: int = None):
+                 poplimit: int = None,
+                 cache: Optional[SubjectCache] = None,
+                 use_cache: bool = True,
+                 source: Any = None,
+                 lean: bool = None):
         '''Data cleaning for plots.
         
         :param subject::
@@ -84,23 +105,42 @@ class CleanForPlot:
         
         :param poplimit::
          (*int*) population limit for schools to be included. populations include both men and women.
+
+        :param cache::
+         (*SubjectCache*) on-disk subject data cache. Defaults to the shared cache (see genplot.cache).
+
+        :param use_cache::
+         (*bool*) when False, always pulls data from genpeds, and doesn't store it.
+
+        :param source::
+         (*SharedData*) shared data source, e.g. genplot.shared.SharedData. When given, data are loaded
+         from source.load(subject, years, **kwargs) instead of the cache or genpeds.
+
+        :param lean::
+         (*bool*) when True, loaded data are downcast to save memory (see lean_frame): floats to float32,
+         integers to int32, and LEAN_CATEGORICALS to categoricals. Defaults to the GENPLOT_LEAN env var
         '''
         self.subject = subject
         self.years = years
         self.poplimit = poplimit
+        self.cache = (cache or get_subject_cache()) if use_cache else None
+        self.source = source
+        self.lean = lean if lean is not None else os.getenv('GENPLOT_LEAN', '0') == '1'
         
         self.plot_dict = PLOTS_DICT[self.subject]
         self.cls = self.plot_dict['cls']
         self.c2k = self.plot_dict['cols_to_keep']
         self.viz = go.Figure()
     
+    @instrumented('CleanForPlot._run_data', rows=lambda df, self: len(df),
+                  info=lambda self, **kwargs: {'subject': self.subject})
     def _run_data(self,
                   **kwargs) -> pd.DataFrame:
         '''runs data, limits data by poplimit, and returns dataframe for a subject.
         
         **kwargs are passed onto the 'run' method for each class. 
         '''
-        df = self.cls(self.years).run(**kwargs) # get dat
+        df = self._load(**kwargs) # get dat
 
         # poplimit cutoff, based on most recent year, 
         # and simultaneously filter to schools present in most recent year
@@ -112,15 +152,49 @@ class CleanForPlot:
             end = self.years
         else:
             raise TypeError('years param should be int or tuple.')
-        df = df.eval(self.plot_dict['poplimit_eval_var']) # create number to condition poplimit on
-        ids_to_include = df.loc[(df['year'] == end) &
-                                (df['pop_4_cutoff'] >= self.poplimit), 'id'].unique()
-        df = df.loc[df['id'].isin(ids_to_include)] # filter cols
+        # number to condition poplimit on, evaluated on the most recent year only
+        # (the right side of poplimit_eval_var, so the whole frame isn't copied to hold it)
+        recent = df.loc[df['year'] == end]
+        pop_4_cutoff = recent.eval(self.plot_dict['poplimit_eval_var'].split('=', 1)[1])
+        ids_to_include = recent.loc[pop_4_cutoff >= self.poplimit, 'id'].unique()
 
-        # return data, with cols to keep
+        # return data, with cols to keep, in one selection
         # some cols may not be in specified dataset though, ie. lon
         cols2keep = [col for col in self.c2k if col in df.columns]
-        return df.loc[:, cols2keep]    
+        return df.loc[df['id'].isin(ids_to_include), cols2keep]
+
+    def _load(self,
+              **kwargs) -> pd.DataFrame:
+        '''returns subject data limited to cols_to_keep, before the poplimit cutoff.
+        
+        Data are read from the shared source when given, then from the subject cache when available;
+        otherwise, they're pulled from genpeds and stored in the cache. In lean mode, data are downcast
+        once loaded (the cache keeps full precision data).
+        '''
+        df = self._fetch(**kwargs)
+        return lean_frame(df) if self.lean else df
+
+    def _fetch(self,
+               **kwargs) -> pd.DataFrame:
+        '''returns subject data limited to cols_to_keep, from the source, cache or genpeds (see _load)'''
+        if self.source is not None:
+            return self.source.load(self.subject, self.years, **kwargs)
+        if self.cache is not None:
+            df = self.cache.get(self.subject, self.years, **kwargs)
+            if df is not None:
+                return df
+        with _GENPEDS_LOCK:
+            # another thread may have stored these data while we waited
+            if self.cache is not None:
+                df = self.cache.get(self.subject, self.years, **kwargs)
+                if df is not None:
+                    return df
+            df = self.cls(self.years).run(**kwargs)
+            # cols_to_keep includes the poplimit_eval_var inputs, so we can drop the rest now
+            df = df.loc[:, [col for col in self.c2k if col in df.columns]]
+            if self.cache is not None:
+                self.cache.put(df, self.subject, self.years, **kwargs)
+        return df
 
     def data_viz(self,
                  render: str = 'browser') -> None:
@@ -136,6 +210,25 @@ class CleanForPlot:
         self.viz.show(renderer=render) # shows the plot
 
 
+def lean_frame(df: pd.DataFrame = None) -> pd.DataFrame:
+    '''returns df with float columns downcast to float32, integer columns to int32,
+    and LEAN_CATEGORICALS columns as categoricals. Columns already lean are left as-is.
+
+    Counts with missing values stay floats (float32), rather than nullable Int32: comparisons
+    with pd.NA give pd.NA, which the frame filters (e.g. sizing cutoffs) can't mask with.
+    '''
+    dtypes = {}
+    for col, dtype in df.dtypes.items():
+        if col in LEAN_CATEGORICALS:
+            if not isinstance(dtype, pd.CategoricalDtype):
+                dtypes[col] = 'category'
+        elif pd.api.types.is_float_dtype(dtype) and dtype != np.float32:
+            dtypes[col] = np.float32
+        elif pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype) \
+                and dtype.itemsize > 4:
+            dtypes[col] = np.int32
+    return df.astype(dtypes) if dtypes else df
+
 def int_value_handler(x: Any = None, 
                       y: Any = None, 
                       opr: str = 'subtract') -> Union[str,int]:
@@ -164,6 +257,48 @@ def int_value_handler(x: Any = None,
     else:
         return val
 
+def int_value_handler_vec(x: Any = None,
+                          y: Any = None,
+                          opr: str = 'subtract') -> pd.Series:
+    '''returns proper integer conversion value for whole columns, as strings.
+    
+    Same values as str(int_value_handler(x[i], y[i], opr)), i.e. 'NA' for
+    missing (or non-numeric) values, and truncated integers otherwise.
+    x and y are paired by position; the index of x is kept.
+
+    Values are truncated and combined as float64, which holds integers exactly
+    up to 2**53. Rows with a value of 2**52 or more (in size) fall back to
+    int_value_handler, so very large numbers still come out exact, not wrapped.
+    '''
+    if y is not None and opr not in ('subtract', 'add'):
+        raise ValueError('opr should be either "add" or "subtract"')
+
+    def _float_col(col):
+        if col.dtype.kind in 'biuf': # plain numpy numbers
+            return col.to_numpy(dtype=np.float64)
+        if not pd.api.types.is_numeric_dtype(col):
+            if pd.api.types.infer_dtype(col, skipna=True) in ('string', 'mixed', 'mixed-integer'):
+                col = col.mask(col.str.len().notna()) # strings are NA, even numeric ones; .str gives non-strings NaN
+            col = pd.to_numeric(col, errors='coerce')
+        return col.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    xs = pd.Series(x)
+    vals = np.trunc(_float_col(xs))
+    big = np.abs(vals) >= INT_EXACT_LIMIT
+    if y is not None:
+        ys = pd.Series(y)
+        vals2 = np.trunc(_float_col(ys))
+        if ys.dtype == object: # int_value_handler takes a None y as no y at all, so those rows keep x
+            vals2[np.equal(ys.to_numpy(), None)] = 0
+        big |= np.abs(vals2) >= INT_EXACT_LIMIT
+        vals = vals - vals2 if opr == 'subtract' else vals + vals2
+    ok = ~np.isnan(vals) & ~big
+    out = np.where(ok, vals, 0).astype(np.int64).astype(str).astype(object)
+    out[~ok] = 'NA'
+    for i in np.flatnonzero(big): # rare, and exact in python ints
+        out[i] = str(int_value_handler(xs.iloc[i], None if y is None else ys.iloc[i], opr))
+    return pd.Series(out, index=xs.index, dtype=object)
+
 def wtd_quantile(df: pd.DataFrame = None,
                  var: str = None,
                  weight_var: str = None,
@@ -200,4 +335,19 @@ def percentile_formatter(arr: Any = None,
         formatter = 'rd'
     else:
         formatter = 'th'
-    return f'{percentile}{formatter}'
\ No newline at end of file
+    return f'{percentile}{formatter}'
+
+def percentile_formatter_vec(arr: Any = None) -> np.ndarray:
+    '''returns formatted string of percentile for every element of arr, in one sort.
+    
+    Same output as [percentile_formatter(arr, val) for val in arr], in O(n log n).
+    '''
+    vals = pd.Series(arr).to_numpy(dtype=np.float64, na_value=np.nan)
+    known = ~np.isnan(vals)
+    srt = np.sort(vals[known])
+    # number of known values <= each value; unknown values are <= nothing
+    counts = np.where(known, np.searchsorted(srt, vals, side='right'), 0)
+    percentile = np.trunc(counts / len(vals) * 100).astype(np.int64)
+    percentile[percentile == 100] = 99
+    formatter = np.array(['th','st','nd','rd','th','th','th','th','th','th'])[percentile % 10]
+    return np.char.add(percentile.astype(str), formatter).astype(object)
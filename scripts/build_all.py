@@ -0,0 +1,102 @@
+from genplot.pipeline import build_all
+from genplot import instrument
+from dotenv import load_dotenv
+import os
+import logging
+load_dotenv() # load college scorecard API key to env
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s') # per-frame build times
+
+'''
+Build the map and the table in one pass, output both to html.
+Data shared between the two (IPEDS subjects, College Scorecard earnings) are fetched once.
+'''
+
+# get arguments
+# - most recent year of data
+# - College Scorecard key
+# - most recent year PCE index (pegged at 2017 := 100 index)
+# - map title
+# - map notes
+# - number of frames built at once (optional)
+# - compact map html (optional)
+# - lazy-loaded map frames (optional)
+# - map hover mode (optional)
+# - map level of detail (optional)
+# - html output path names
+# - table render mode (optional)
+# - table bulk downloads (optional)
+# - data store path (optional)
+# - stage instrumentation report path (optional)
+
+# Most recent year of data
+most_rec_yr = os.getenv('MOST_RECENT_YEAR')
+most_rec_yr = int(most_rec_yr)
+
+
+# College Scorecard API key
+# NAME THE KEY "COLLEGE_SCORECARD_KEY" in your .env file
+college_scorecard_key = os.getenv('COLLEGE_SCORECARD_KEY')
+
+# most recent year PCE index
+# you can find this here: https://fred.stlouisfed.org/series/pcepi/21
+inflation_adjust = os.getenv('INFLATION_ADJUST')
+inflation_adjust = float(inflation_adjust)
+
+# Map title
+title = os.getenv('MAP_TITLE')
+
+# Map notes
+notes = os.getenv('MAP_NOTE')
+
+# HTML output paths
+map_out = os.path.join('docs',os.getenv('MAP_OUTPATH'))
+table_out = os.path.join('docs',os.getenv('TABLE_OUTPATH'))
+
+# Frames built at once (optional, defaults to one worker per frame)
+max_workers = os.getenv('BUILD_WORKERS')
+max_workers = int(max_workers) if max_workers else None
+
+# Compact map html (optional): set MAP_COMPACT=1 for a smaller map payload
+compact = os.getenv('MAP_COMPACT', '0') == '1'
+
+# Lazy map frames (optional): set MAP_LAZY_FRAMES=1 to fetch frames only when they are selected
+lazy_frames = os.getenv('MAP_LAZY_FRAMES', '0') == '1'
+
+# Map hover mode (optional): 'text' (default) or 'template', for the same hover labels in a much smaller map
+hover = os.getenv('MAP_HOVER', 'text')
+
+# Map level of detail (optional): set MAP_LOD=1 to show schools binned into a grid until the map is zoomed in
+lod = os.getenv('MAP_LOD', '0') == '1'
+
+# Table render mode (optional): 'html' (default), 'json', 'shards' or 'server' (the page needs scripts/serve_table.py running)
+table_render = os.getenv('TABLE_RENDER', 'html')
+
+# Table bulk downloads (optional): set TABLE_EXPORTS=1 to also write each tab as parquet and gzipped csv files, linked from the page
+exports = os.getenv('TABLE_EXPORTS', '0') == '1'
+
+# Data store (optional): set GENPLOT_STORE to the path of a store built with scripts/build_store.py,
+# to read the data from it instead of fetching them
+store_path = os.getenv('GENPLOT_STORE')
+
+# Stage instrumentation (optional): set GENPLOT_INSTRUMENT=1 (or =memory, to also trace memory)
+# to log time, memory, rows and HTTP requests per build stage; and GENPLOT_INSTRUMENT_REPORT to a path for a JSON report
+instrument_report = os.getenv('GENPLOT_INSTRUMENT_REPORT')
+
+
+if __name__=='__main__':
+    build_all(most_recent_year=most_rec_yr,
+              collescorecard_key=college_scorecard_key,
+              inflation_adjust=inflation_adjust,
+              map_title=title,
+              map_notes=notes,
+              map_fpath=map_out,
+              table_fpath=table_out,
+              max_workers=max_workers,
+              table_render=table_render,
+              table_exports=exports,
+              map_compact=compact,
+              map_lazy_frames=lazy_frames,
+              map_hover=hover,
+              map_lod=lod,
+              store=store_path)
+    instrument.report(instrument_report)
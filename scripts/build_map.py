@@ -1,7 +1,11 @@
 from genplot.multimap import build_map
+from genplot.store import DataStore
+from genplot import instrument
 from dotenv import load_dotenv
 import os
+import logging
 load_dotenv() # load college scorecard API key to env
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s') # per-frame build times
 
 '''
 Build the map, output to html
@@ -13,7 +17,14 @@ Build the map, output to html
 # - most recent year PCE index (pegged at 2017 := 100 index)
 # - map title
 # - map notes
+# - number of frames built at once (optional)
+# - compact map html (optional)
+# - lazy-loaded map frames (optional)
+# - map hover mode (optional)
+# - map level of detail (optional)
 # - html output path name
+# - data store path (optional)
+# - stage instrumentation report path (optional)
 
 # Most recent year of data
 most_rec_yr = os.getenv('MOST_RECENT_YEAR')
@@ -39,6 +50,30 @@ notes = os.getenv('MAP_NOTE')
 out_path = os.getenv('MAP_OUTPATH')
 out = os.path.join('docs',out_path)
 
+# Frames built at once (optional, defaults to one worker per frame)
+max_workers = os.getenv('BUILD_WORKERS')
+max_workers = int(max_workers) if max_workers else None
+
+# Compact map html (optional): set MAP_COMPACT=1 for a smaller map payload
+compact = os.getenv('MAP_COMPACT', '0') == '1'
+
+# Lazy map frames (optional): set MAP_LAZY_FRAMES=1 to fetch frames only when they are selected
+lazy_frames = os.getenv('MAP_LAZY_FRAMES', '0') == '1'
+
+# Map hover mode (optional): 'text' (default) or 'template', for the same hover labels in a much smaller map
+hover = os.getenv('MAP_HOVER', 'text')
+
+# Map level of detail (optional): set MAP_LOD=1 to show schools binned into a grid until the map is zoomed in
+lod = os.getenv('MAP_LOD', '0') == '1'
+
+# Data store (optional): set GENPLOT_STORE to the path of a store built with scripts/build_store.py,
+# to read the data from it instead of fetching them
+store_path = os.getenv('GENPLOT_STORE')
+
+# Stage instrumentation (optional): set GENPLOT_INSTRUMENT=1 (or =memory, to also trace memory)
+# to log time, memory, rows and HTTP requests per build stage; and GENPLOT_INSTRUMENT_REPORT to a path for a JSON report
+instrument_report = os.getenv('GENPLOT_INSTRUMENT_REPORT')
+
 
 if __name__=='__main__':
     build_map(most_recent_year=most_rec_yr,
@@ -46,4 +81,11 @@ if __name__=='__main__':
               inflation_adjust=inflation_adjust,
               map_title=title,
               map_notes=notes,
-              fpath=out)
\ No newline at end of file
+              fpath=out,
+              shared=DataStore(store_path) if store_path else None,
+              max_workers=max_workers,
+              compact=compact,
+              lazy_frames=lazy_frames,
+              hover=hover,
+              lod=lod)
+    instrument.report(instrument_report)
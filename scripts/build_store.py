@@ -0,0 +1,40 @@
+from genplot.store import build_store
+from genplot import instrument
+from dotenv import load_dotenv
+import os
+import logging
+load_dotenv() # load college scorecard API key to env
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s') # datasets stored
+
+'''
+Fetch every subject, specification and Scorecard earnings, and write them to one SQLite data store
+'''
+
+# get arguments
+# - most recent year of data
+# - College Scorecard key
+# - data store path (optional)
+# - stage instrumentation report path (optional)
+
+# Most recent year of data
+most_rec_yr = os.getenv('MOST_RECENT_YEAR')
+most_rec_yr = int(most_rec_yr)
+
+
+# College Scorecard API key
+# NAME THE KEY "COLLEGE_SCORECARD_KEY" in your .env file
+college_scorecard_key = os.getenv('COLLEGE_SCORECARD_KEY')
+
+# Data store path (optional, defaults to genplot.sqlite)
+store_path = os.getenv('GENPLOT_STORE', 'genplot.sqlite')
+
+# Stage instrumentation (optional): set GENPLOT_INSTRUMENT=1 (or =memory, to also trace memory)
+# to log time, memory, rows and HTTP requests per build stage; and GENPLOT_INSTRUMENT_REPORT to a path for a JSON report
+instrument_report = os.getenv('GENPLOT_INSTRUMENT_REPORT')
+
+
+if __name__=='__main__':
+    build_store(most_recent_year=most_rec_yr,
+                collescorecard_key=college_scorecard_key,
+                fpath=store_path)
+    instrument.report(instrument_report)
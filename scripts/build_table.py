@@ -1,7 +1,12 @@
 from genplot.datatable import build_table
+from genplot.store import DataStore
+from genplot import instrument
 from dotenv import load_dotenv
 import os
+import logging
 load_dotenv() # load college scorecard API key to env
+if instrument.enabled():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s') # stage report
 
 '''
 Build the table, output to html
@@ -11,7 +16,12 @@ Build the table, output to html
 # - most recent year of data
 # - College Scorecard key
 # - most recent year PCE index (pegged at 2017)
+# - number of tables built at once (optional)
 # - html output path name
+# - table render mode (optional)
+# - table bulk downloads (optional)
+# - data store path (optional)
+# - stage instrumentation report path (optional)
 
 # Most recent year of data
 most_rec_yr = os.getenv('MOST_RECENT_YEAR')
@@ -31,8 +41,31 @@ inflation_adjust = float(inflation_adjust)
 out_path = os.getenv('TABLE_OUTPATH')
 out = os.path.join('docs',out_path)
 
+# Tables built at once (optional, defaults to one worker per table)
+max_workers = os.getenv('BUILD_WORKERS')
+max_workers = int(max_workers) if max_workers else None
+
+# Table render mode (optional): 'html' (default), 'json', 'shards' or 'server' (the page needs scripts/serve_table.py running)
+render = os.getenv('TABLE_RENDER', 'html')
+
+# Table bulk downloads (optional): set TABLE_EXPORTS=1 to also write each tab as parquet and gzipped csv files, linked from the page
+exports = os.getenv('TABLE_EXPORTS', '0') == '1'
+
+# Data store (optional): set GENPLOT_STORE to the path of a store built with scripts/build_store.py,
+# to read the data from it instead of fetching them
+store_path = os.getenv('GENPLOT_STORE')
+
+# Stage instrumentation (optional): set GENPLOT_INSTRUMENT=1 (or =memory, to also trace memory)
+# to log time, memory, rows and HTTP requests per build stage; and GENPLOT_INSTRUMENT_REPORT to a path for a JSON report
+instrument_report = os.getenv('GENPLOT_INSTRUMENT_REPORT')
+
 if __name__=='__main__':
     build_table(most_recent_year=most_rec_yr,
                 collescorecard_key=college_scorecard_key,
                 inflation_adjust=inflation_adjust,
-                fpath=out)
\ No newline at end of file
+                fpath=out,
+                shared=DataStore(store_path) if store_path else None,
+                max_workers=max_workers,
+                render=render,
+                exports=exports)
+    instrument.report(instrument_report)
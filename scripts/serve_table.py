@@ -0,0 +1,58 @@
+from genplot.tableserver import serve_table
+from dotenv import load_dotenv
+import os
+import logging
+load_dotenv() # load college scorecard API key to env
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s') # server address
+
+'''
+Build the table data, write a server-side table page, and serve both on localhost
+'''
+
+# get arguments
+# - most recent year of data
+# - College Scorecard key
+# - most recent year PCE index (pegged at 2017)
+# - number of tables built at once (optional)
+# - html output path name
+# - table bulk downloads (optional)
+# - server host and port (optional)
+
+# Most recent year of data
+most_rec_yr = os.getenv('MOST_RECENT_YEAR')
+most_rec_yr = int(most_rec_yr)
+
+
+# College Scorecard API key
+# NAME THE KEY "COLLEGE_SCORECARD_KEY" in your .env file
+college_scorecard_key = os.getenv('COLLEGE_SCORECARD_KEY')
+
+# most recent year PCE index
+# you can find this here: https://fred.stlouisfed.org/series/pcepi/21
+inflation_adjust = os.getenv('INFLATION_ADJUST')
+inflation_adjust = float(inflation_adjust)
+
+# HTML output path
+out_path = os.getenv('TABLE_OUTPATH')
+out = os.path.join('docs',out_path)
+
+# Tables built at once (optional, defaults to one worker per table)
+max_workers = os.getenv('BUILD_WORKERS')
+max_workers = int(max_workers) if max_workers else None
+
+# Table bulk downloads (optional): set TABLE_EXPORTS=1 to also write each tab as parquet and gzipped csv files, linked from the page
+exports = os.getenv('TABLE_EXPORTS', '0') == '1'
+
+# Server address (optional): defaults to localhost, port 8765
+host = os.getenv('TABLE_SERVER_HOST', '127.0.0.1')
+port = int(os.getenv('TABLE_SERVER_PORT', '8765'))
+
+if __name__=='__main__':
+    serve_table(most_recent_year=most_rec_yr,
+                collescorecard_key=college_scorecard_key,
+                inflation_adjust=inflation_adjust,
+                fpath=out,
+                max_workers=max_workers,
+                host=host,
+                port=port,
+                exports=exports)
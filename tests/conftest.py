@@ -0,0 +1,10 @@
+import os
+import sys
+
+'''
+Test setup: tests never read or write the shared on-disk caches, and build from the
+synthetic IPEDS and College Scorecard data in benchmarks/synthetic.py, so they run offline.
+'''
+
+os.environ['GENPLOT_CACHE'] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+import genplot.cache as cache
+from genplot.cache import SubjectCache, FrameCache
+
+'''
+DiskCache: hits, keys, TTL expiry, LRU eviction, and index updates from several processes.
+'''
+
+def test_hit_and_miss(tmp_path):
+    subjects = SubjectCache(cache_dir=str(tmp_path))
+    df = pd.DataFrame({'id': ['1', '2'], 'year': [2023, 2023], 'totmen': [10.5, None]}, index=[4, 9])
+    assert subjects.get('enrollment', [2023], student_level='grad') is None
+    subjects.put(df, 'enrollment', [2023], student_level='grad')
+    pd.testing.assert_frame_equal(subjects.get('enrollment', [2023], student_level='grad'), df)
+    assert subjects.get('enrollment', [2022], student_level='grad') is None
+    assert subjects.get('enrollment', [2023], student_level='undergrad') is None
+    assert subjects.get('admissions', [2023]) is None
+
+def test_subject_key(tmp_path, monkeypatch):
+    subjects = SubjectCache(cache_dir=str(tmp_path))
+    key = subjects.key('graduation', [2013, 2023], degree_level='bach')
+    # years: lists are sets of years, tuples inclusive ranges
+    assert subjects.key('graduation', [2023, 2013, 2013], degree_level='bach') == key
+    assert subjects.key('graduation', (2013, 2015)) == subjects.key('graduation', [2013, 2014, 2015])
+    assert subjects.key('graduation', 2023) == subjects.key('graduation', [2023])
+    # kwargs that don't change the data don't change the key; others do
+    assert subjects.key('graduation', [2013, 2023], degree_level='bach', see_progress=True, rm_disk=True) == key
+    assert subjects.key('graduation', [2013, 2023], degree_level='assc') != key
+    assert subjects.key('completion', [2013, 2023], degree_level='bach') != key
+    # a new genpeds version may clean data differently
+    monkeypatch.setattr(cache, '_pkg_version', lambda pkg: '999.0')
+    assert subjects.key('graduation', [2013, 2023], degree_level='bach') != key
+
+def test_stale_entries(tmp_path):
+    frames = FrameCache(cache_dir=str(tmp_path), ttl=60)
+    frames.put('old', '{"name": "old"}')
+    frames.put('new', '{"name": "new"}')
+    past = time.time() - 120
+    os.utime(frames.path('old'), (past, past))
+    assert frames.get('old') is None
+    assert frames.get('new') == '{"name": "new"}'
+    frames.evict()
+    assert not frames.path('old').exists() and frames.path('new').exists()
+    assert set(json.loads(frames.index_path.read_text())) == {'new'}
+    # ttl <= 0 never expires
+    forever = FrameCache(cache_dir=str(tmp_path / 'forever'), ttl=0)
+    forever.put('old', '{}')
+    os.utime(forever.path('old'), (0, 0))
+    assert forever.get('old') == '{}'
+
+def test_lru_eviction(tmp_path):
+    entry = 'x' * 1000
+    frames = FrameCache(cache_dir=str(tmp_path), max_mb=2500 / 1024 / 1024) # room for two entries
+    frames.put('a', entry)
+    frames.put('b', entry)
+    assert frames.get('a') == entry # a is now more recently used than b
+    frames.put('c', entry)
+    assert frames.get('b') is None
+    assert frames.get('a') == entry and frames.get('c') == entry
+    assert set(json.loads(frames.index_path.read_text())) == {'a', 'c'}
+    frames.clear()
+    assert frames.get('a') is None and not frames.path('c').exists()
+
+def _put_many(cache_dir: str = None,
+              worker: int = 0,
+              n: int = 25) -> None:
+    frames = FrameCache(cache_dir=cache_dir)
+    for i in range(n):
+        frames.put(f'{worker}-{i}', '{}')
+
+@pytest.mark.skipif(cache.fcntl is None, reason='index file lock needs fcntl')
+def test_index_shared_by_processes(tmp_path):
+    workers, n = 4, 25
+    ctx = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        for fut in [pool.submit(_put_many, str(tmp_path), w, n) for w in range(workers)]:
+            fut.result()
+    frames = FrameCache(cache_dir=str(tmp_path))
+    index = json.loads(frames.index_path.read_text())
+    assert len(index) == workers * n # no process lost another's entries
+    assert all(frames.get(key) == '{}' for key in index)
+    assert not list(frames.dir.glob('*.tmp'))
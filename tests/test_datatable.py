@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from genplot.datatable import EdDataTable, EXPORT_FORMATS
+from synthetic import SyntheticData
+
+'''
+Table bulk exports (EdDataTable.write_exports): every tab round trips through parquet and gzipped csv,
+with the cleaned values, not the page's formatted strings.
+'''
+
+@pytest.fixture(scope='module')
+def table():
+    tbl = EdDataTable(most_recent_year=2023, shared=SyntheticData(n=300, seed=4), use_cache=False)
+    tbl.generate_df(earnings_api_key='synthetic', inflation_adjust=125.58, max_workers=1)
+    return tbl
+
+@pytest.fixture(scope='module')
+def exports(table, tmp_path_factory):
+    out_path = str(tmp_path_factory.mktemp('exports') / 'table.html')
+    return out_path, table.write_exports(out_path, chunk_rows=64) # several row groups / csv chunks per tab
+
+def test_export_urls(table, exports):
+    out_path, urls = exports
+    assert set(urls) == set(table.dataframes)
+    for sbjct, tab_urls in urls.items():
+        assert tab_urls == {fmt: f'table.html.{sbjct}.{suffix}' for fmt, suffix in EXPORT_FORMATS.items()}
+
+@pytest.mark.parametrize('sbjct', ['admissions', 'graduation_bach', 'earnings'])
+def test_parquet_round_trip(table, exports, sbjct):
+    out_path, _ = exports
+    clean = table.clean_dataframes[sbjct].reset_index(drop=True)
+    pd.testing.assert_frame_equal(pd.read_parquet(f'{out_path}.{sbjct}.parquet'), clean)
+
+@pytest.mark.parametrize('sbjct', ['admissions', 'graduation_bach', 'earnings'])
+def test_csv_round_trip(table, exports, sbjct):
+    out_path, _ = exports
+    clean = table.clean_dataframes[sbjct].reset_index(drop=True)
+    df = pd.read_csv(f'{out_path}.{sbjct}.csv.gz', dtype={'ID': str})
+    assert list(df.columns) == list(clean.columns)
+    pd.testing.assert_frame_equal(df, clean, check_dtype=False)
+    if 'Year' in df:
+        assert pd.api.types.is_integer_dtype(df['Year'])
+
+def test_exports_keep_cleaned_values(table, exports):
+    out_path, _ = exports
+    df = pd.read_parquet(f'{out_path}.admissions.parquet')
+    rate = df['MaleAdmitRate'].dropna()
+    # not truncated to the page's whole percents, and missing values are missing, not 'NA'
+    assert (rate != np.trunc(rate)).any()
+    assert pd.api.types.is_float_dtype(df['MaleAdmitRate']) and pd.api.types.is_integer_dtype(df['Year'])
+    page = table.dataframes['admissions'].reset_index(drop=True)
+    shown = page['MaleAdmitRate'].str.rstrip('%')
+    known = shown != 'NA'
+    assert (shown[known].astype(int) == np.trunc(df.loc[known, 'MaleAdmitRate']).astype(int)).all()
+    assert df.loc[~known, 'MaleAdmitRate'].isna().all()
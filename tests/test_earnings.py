@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+import requests
+
+from genplot.cache import EarningsCache
+from genplot.earnings import Earnings, RateLimiter, wage_var_dict, SIZE_VAR, RESULTS_PER_PAGE
+
+'''
+Earnings.get_wages against a stub College Scorecard API on localhost.
+
+The stub serves canned result pages, and answers chosen requests with an error
+status first (e.g. a 429, then a 503), so paging, retries, the assembled
+earnings_dat and the earnings cache (offline and refresh modes) are checked without the network.
+'''
+
+N_SCHOOLS = 250 # three pages
+V_1, V_2 = wage_var_dict['median']
+
+def canned_results(n: int = N_SCHOOLS) -> list:
+    '''returns Scorecard results; every 7th school has no male earnings (skipped by get_wages)'''
+    return [{'id': 100000 + i, 'school.name': f'School {i}',
+             V_1: None if i % 7 == 0 else 30000.0 + i, V_2: 28000.0 + i if i % 5 else None,
+             SIZE_VAR: 300 + i}
+            for i in range(n)]
+
+
+class StubScorecard:
+    '''Scorecard schools endpoint stub, serving canned pages on a free localhost port'''
+    def __init__(self,
+                 results: list = None,
+                 failures: dict = None):
+        '''stub Scorecard API
+
+        :param results: every school's result, paged RESULTS_PER_PAGE at a time
+        :param failures: page -> list of statuses answered before the page is served, e.g. {1: [429]}.
+                         Pages listed with None fail forever, with 503s
+        '''
+        self.results = results
+        self.failures = {pg: list(statuses) if statuses is not None else None
+                         for pg, statuses in (failures or {}).items()}
+        self.requests = Counter() # page -> requests
+        self.params = []
+        self._lock = threading.Lock()
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.answer(self)
+            def log_message(self, format, *args):
+                pass
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1/schools.json'
+
+    def answer(self,
+               handler: BaseHTTPRequestHandler = None) -> None:
+        params = {k: v[0] for k, v in parse_qs(urlsplit(handler.path).query).items()}
+        page = int(params.get('page', 0))
+        with self._lock:
+            self.requests[page] += 1
+            self.params.append(params)
+            statuses = self.failures.get(page, [])
+            status = 503 if statuses is None else (statuses.pop(0) if statuses else 200)
+        if status != 200:
+            handler.send_response(status)
+            if status == 429:
+                handler.send_header('Retry-After', '0')
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+        per_page = int(params['per_page'])
+        body = json.dumps({'metadata': {'total': len(self.results), 'page': page, 'per_page': per_page},
+                           'results': self.results[page * per_page:(page + 1) * per_page]}).encode()
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+def earnings(url: str = None,
+             **kwargs) -> Earnings:
+    '''returns Earnings pointed at the stub, without backoff waits, and without cache unless one is given'''
+    kwargs = {'use_cache': 'cache' in kwargs, 'offline': False, **kwargs}
+    return Earnings(api_key='stub', base_url=url, backoff=0,
+                    rate_limiter=RateLimiter(max_requests=10000, period=1), **kwargs)
+
+def make_stale(cache: EarningsCache = None) -> None:
+    '''ages every cached entry past the cache's TTL'''
+    past = time.time() - cache.ttl - 60
+    for fpath in cache.dir.glob(f'*{cache.suffix}'):
+        os.utime(fpath, (past, past))
+
+def test_get_wages_retries_and_assembles_pages():
+    results = canned_results()
+    with StubScorecard(results, failures={1: [429], 2: [503]}) as stub:
+        earn = earnings(stub.url, max_workers=2)
+        earn.get_wages(wage_var='median', poplimit=300)
+    expected = {str(r['id']): (r[V_1], r[V_2]) for r in results if r[V_1] is not None}
+    assert earn.earnings_dat == expected
+    assert list(earn.earnings_dat) == list(expected) # page order kept
+    assert stub.requests == {0: 1, 1: 2, 2: 2}
+    assert len(stub.requests) == -(-N_SCHOOLS // RESULTS_PER_PAGE)
+    params = stub.params[0]
+    assert params['api_key'] == 'stub' and params['per_page'] == str(RESULTS_PER_PAGE)
+    assert params[f'{SIZE_VAR}__range'] == '300..'
+    assert params['fields'] == f'id,school.name,{V_1},{V_2}'
+
+def test_get_wages_with_size():
+    results = canned_results()
+    with StubScorecard(results) as stub:
+        earn = earnings(stub.url)
+        earn.get_wages(wage_var='median', poplimit=300, with_size=True)
+    assert earn.earnings_dat == {str(r['id']): (r[V_1], r[V_2], r[SIZE_VAR]) for r in results if r[V_1] is not None}
+    assert earn.limit(500) == {str(r['id']): (r[V_1], r[V_2]) for r in results
+                               if r[V_1] is not None and r[SIZE_VAR] >= 500}
+    assert stub.requests == {0: 1, 1: 1, 2: 1}
+
+def test_retries_stop_at_max_retries():
+    with StubScorecard(canned_results(), failures={1: None}) as stub:
+        earn = earnings(stub.url, max_retries=3)
+        with pytest.raises(requests.HTTPError):
+            earn.get_wages(wage_var='median', poplimit=300)
+    assert stub.requests[0] == 1
+    assert stub.requests[1] == 3 + 1 # first try, then max_retries retries
+
+def test_cache_hit_holds_tuples(tmp_path):
+    cache = EarningsCache(cache_dir=str(tmp_path))
+    with StubScorecard(canned_results()) as stub:
+        fetched = earnings(stub.url, cache=cache)
+        fetched.get_wages(wage_var='median', poplimit=300, refresh=False)
+        n_requests = sum(stub.requests.values())
+        cached = earnings(stub.url, cache=cache)
+        cached.get_wages(wage_var='median', poplimit=300, refresh=False)
+        assert sum(stub.requests.values()) == n_requests # served from the cache
+    assert cached.earnings_dat == fetched.earnings_dat
+    assert all(type(v) is tuple for v in cached.earnings_dat.values())
+    assert list(cached.earnings_dat) == list(fetched.earnings_dat)
+
+def test_cache_hit_with_size(tmp_path):
+    cache = EarningsCache(cache_dir=str(tmp_path))
+    with StubScorecard(canned_results()) as stub:
+        earnings(stub.url, cache=cache).get_wages(wage_var='median', poplimit=300, with_size=True, refresh=False)
+        cached = earnings(stub.url, cache=cache)
+        cached.get_wages(wage_var='median', poplimit=300, with_size=True, refresh=False)
+        assert stub.requests[0] == 1
+    assert all(type(v) is tuple and len(v) == 3 for v in cached.earnings_dat.values())
+    assert cached.limit(500) == {str(r['id']): (r[V_1], r[V_2]) for r in canned_results()
+                                 if r[V_1] is not None and r[SIZE_VAR] >= 500}
+
+def test_refresh_downloads_again(tmp_path):
+    cache = EarningsCache(cache_dir=str(tmp_path))
+    old, new = canned_results(), canned_results()
+    for r in new:
+        r[V_1] = None if r[V_1] is None else r[V_1] + 1
+    with StubScorecard(old) as stub:
+        earnings(stub.url, cache=cache).get_wages(wage_var='median', poplimit=300, refresh=False)
+    with StubScorecard(new) as stub:
+        refreshed = earnings(stub.url, cache=cache)
+        refreshed.get_wages(wage_var='median', poplimit=300, refresh=True)
+        assert stub.requests[0] == 1
+        cached = earnings(stub.url, cache=cache)
+        cached.get_wages(wage_var='median', poplimit=300, refresh=False)
+        assert stub.requests[0] == 1 # the refreshed earnings were stored
+    expected = {str(r['id']): (r[V_1], r[V_2]) for r in new if r[V_1] is not None}
+    assert refreshed.earnings_dat == cached.earnings_dat == expected
+
+def test_offline_reads_stale_earnings(tmp_path):
+    cache = EarningsCache(cache_dir=str(tmp_path), ttl=60)
+    with StubScorecard(canned_results()) as stub:
+        fetched = earnings(stub.url, cache=cache)
+        fetched.get_wages(wage_var='median', poplimit=300, refresh=False)
+        make_stale(cache)
+        offline = earnings(stub.url, cache=cache, offline=True)
+        offline.get_wages(wage_var='median', poplimit=300, refresh=True) # offline wins over refresh
+        assert stub.requests[0] == 1
+        assert offline.earnings_dat == fetched.earnings_dat
+        # online, stale earnings are downloaded again
+        online = earnings(stub.url, cache=cache)
+        online.get_wages(wage_var='median', poplimit=300, refresh=False)
+        assert stub.requests[0] == 2
+    assert online.earnings_dat == fetched.earnings_dat
+
+def test_offline_without_cached_earnings(tmp_path):
+    cache = EarningsCache(cache_dir=str(tmp_path))
+    with StubScorecard(canned_results()) as stub:
+        with pytest.raises(ValueError, match='offline'):
+            earnings(stub.url, cache=cache, offline=True).get_wages(wage_var='median', poplimit=300)
+        assert not stub.requests
+
+def test_stale_earnings_kept_for_offline_mode(tmp_path):
+    cache = EarningsCache(cache_dir=str(tmp_path), ttl=60)
+    with StubScorecard(canned_results()) as stub:
+        earnings(stub.url, cache=cache).get_wages(wage_var='median', poplimit=300, refresh=False)
+        make_stale(cache)
+        # a new entry evicts stale ones in other caches, but earnings are kept (EarningsCache.keep_stale)
+        earnings(stub.url, cache=cache).get_wages(wage_var='median', poplimit=400, refresh=False)
+        cache.evict()
+        assert len(list(cache.dir.glob('*.json'))) == 3 # two entries, and the index
+        offline = earnings(stub.url, cache=cache, offline=True)
+        offline.get_wages(wage_var='median', poplimit=300)
+        assert len(offline.earnings_dat) == sum(r[V_1] is not None for r in canned_results())
@@ -0,0 +1,117 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from genplot.multimap import MultiMap, MAP_FRAMES
+from genplot.utils import int_value_handler, percentile_formatter, percentile_formatter_vec
+from bench_hovertext import synthetic_frames, MOST_RECENT_YEAR
+from synthetic import SyntheticData
+
+'''
+Hover labels against the code they replaced: the (id x year) history pivot against the old
+per-school lookup, percentile_formatter_vec against percentile_formatter, and the
+'template' hover mode (customdata + hovertemplate) against the rendered 'text' mode.
+'''
+
+SUBJECTS = {'admissions': None, 'enrollment': 'undergrad', 'graduation': 'bach'}
+
+def legacy_history(df: pd.DataFrame = None,
+                   df_tot: pd.DataFrame = None,
+                   years_iter: list = None) -> dict:
+    '''returns {year{i}_rate: list of str}, looked up school by school as build_frame used to'''
+    text_dict = {id_: ['NA'] * len(years_iter) for id_ in df['id'].unique()}
+    for id_ in text_dict.keys():
+        temp_df = df_tot.loc[df_tot['id'] == id_]
+        for ctr, yr in enumerate(years_iter):
+            v = temp_df.loc[temp_df['year'] == yr, 'outcome_var']
+            text_dict[id_][ctr] = 'NA' if len(v) == 0 else np.float64(v.iloc[0])
+    return {f'year{i}_rate': [str(int_value_handler(text_dict[id_][i])) for id_ in df['id']]
+            for i in range(len(years_iter))}
+
+def hand_frames() -> tuple:
+    '''returns (df, df_tot, years_iter) with gaps: a school without history, a missing middle year,
+    fractional and negative rates, and rows out of id order'''
+    years_iter = [2003, 2013, 2023]
+    df_tot = pd.DataFrame({
+        'id':          ['3', '1', '1', '1', '2', '2', '4', '5'],
+        'year':        [2023, 2003, 2013, 2023, 2003, 2023, 2023, 2013],
+        'outcome_var': [50.9, 10.2, 20.99, 30.0, -0.5, 41.5, 0.0, 77.7],
+    })
+    df = df_tot.loc[df_tot['year'] == 2023].copy()
+    df = pd.concat([df, pd.DataFrame({'id': ['6'], 'year': [2023], 'outcome_var': [np.nan]})])
+    for col in ['name', 'city', 'state']:
+        df[col] = col
+    return df, df_tot, years_iter
+
+@pytest.mark.parametrize('subject', SUBJECTS)
+@pytest.mark.parametrize('seed', [0, 1])
+def test_history_matches_lookup(subject, seed):
+    df, df_tot, years_iter = synthetic_frames(subject, n=300, seed=seed)
+    fields = MultiMap(most_recent_year=MOST_RECENT_YEAR)._hover_fields(subject, SUBJECTS[subject], df, df_tot, years_iter)
+    for field, exp in legacy_history(df, df_tot, years_iter).items():
+        assert list(fields[field]) == exp, field
+
+def test_history_with_gaps():
+    df, df_tot, years_iter = hand_frames()
+    fields = MultiMap(most_recent_year=2023)._hover_fields('enrollment', 'undergrad', df.assign(
+        totmen=1, totwomen=1, totmen_share=df['outcome_var']), df_tot, years_iter)
+    exp = legacy_history(df, df_tot, years_iter)
+    assert exp['year0_rate'] == ['NA', '10', '0', 'NA', 'NA'] # -0.5 truncates to 0
+    for field in exp:
+        assert list(fields[field]) == exp[field], field
+
+PERCENTILE_COLUMNS = {
+    'float': pd.Series(np.random.default_rng(0).uniform(0, 100, 997)),
+    'ties': pd.Series(np.random.default_rng(1).integers(0, 20, 500).astype(np.float64)),
+    'with nan': pd.Series([5.0, np.nan, 3.0, 3.0, np.nan, 9.5, 1.0, 7.0]),
+    'every ordinal': pd.Series(np.arange(100, dtype=np.float64)), # 1st..99th, with 11st, 12nd, 13rd, and 100 -> 99
+    'single': pd.Series([42.0]), # 100th -> 99th
+    'all nan': pd.Series([np.nan, np.nan]),
+    'int': pd.Series([3, 1, 2, 2, 10, -4], dtype=np.int64),
+    'negative': pd.Series([-90000.0, -1.0, -1e-9, 0.0, 1e-9, 1e12]),
+}
+
+@pytest.mark.parametrize('name', PERCENTILE_COLUMNS)
+def test_percentile_formatter_vec(name):
+    arr = PERCENTILE_COLUMNS[name]
+    assert list(percentile_formatter_vec(arr)) == [percentile_formatter(arr, val) for val in arr]
+
+def test_percentile_edge_cases():
+    labels = list(percentile_formatter_vec(PERCENTILE_COLUMNS['every ordinal']))
+    assert labels[10:13] == ['11st', '12nd', '13rd'] # percentile_formatter only looks at the last digit
+    assert labels[-2:] == ['99th', '99th']
+    assert list(percentile_formatter_vec(PERCENTILE_COLUMNS['with nan']))[1] == '0th'
+    assert list(percentile_formatter_vec(PERCENTILE_COLUMNS['single'])) == ['99th']
+
+def render_template(hover: dict = None) -> list:
+    '''returns the hover text Plotly shows for every row of a template-mode trace'''
+    template = hover['hovertemplate'].removesuffix('<extra></extra>')
+    return [re.sub(r'%\{customdata\[(\d+)\]\}', lambda m: row[int(m.group(1))], template)
+            for row in hover['customdata']]
+
+@pytest.mark.parametrize('subject', [*SUBJECTS, 'earnings'])
+def test_template_matches_text(subject):
+    df, df_tot, years_iter = synthetic_frames(subject, n=500)
+    text_mm, template_mm = (MultiMap(most_recent_year=MOST_RECENT_YEAR, hover=hover) for hover in ('text', 'template'))
+    if subject == 'earnings':
+        fields = text_mm._earnings_hover_fields(df, 'median')
+    else:
+        fields = text_mm._hover_fields(subject, SUBJECTS[subject], df, df_tot, years_iter)
+    text = text_mm._hover_data(subject, df, fields)
+    template = template_mm._hover_data(subject, df, fields)
+    assert render_template(template) == text['text']
+    # search keys lead customdata in both modes
+    assert (template['customdata'][:, 0] == text['customdata'][:, 0]).all()
+    assert 'text' not in template
+
+@pytest.mark.parametrize('subject, specification, outcome_var', MAP_FRAMES)
+def test_template_frames_match_text_frames(subject, specification, outcome_var):
+    frames = {}
+    for hover in ('text', 'template'):
+        mm = MultiMap(most_recent_year=2023, shared=SyntheticData(n=300, seed=5), use_cache=False, hover=hover)
+        frames[hover] = mm.build_frame(subject=subject, specification=specification, outcome_var=outcome_var)
+    text, template = frames['text'].data[0], frames['template'].data[0]
+    assert render_template({'hovertemplate': template.hovertemplate, 'customdata': template.customdata}) == list(text.text)
+    assert len(template.customdata) == len(text.text) > 0
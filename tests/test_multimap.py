@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+import pytest
+
+import genplot.cache as cache
+from genplot.cache import FrameCache
+from genplot.multimap import MultiMap, _lod_grid
+from synthetic import SyntheticData
+
+'''
+Level-of-detail grid (MultiMap lod=True): cell counts and means against hand-computed values,
+and the grid trace of a built frame. Frame cache reuse by fingerprint, and compact frame sizes.
+'''
+
+def test_lod_grid_hand_computed():
+    df = pd.DataFrame({
+        'latitude':  [40.5, 41.9, 41.0, 40.2, 30.5, 31.5, np.nan],
+        'longitude': [-75.9, -74.1, -75.0, -75.5, -90.5, -91.5, -80.0],
+        'size':      [100, 300, np.nan, 200, 0, np.nan, 50],
+        'rate':      [10, 30, 50, np.nan, 20, 40, 99],
+    })
+    grid = _lod_grid(df, ['rate'], 'size', cell_deg=2)
+    assert len(grid) == 2 # the school without a latitude is dropped
+    grid = grid.sort_values('count', ascending=False).reset_index(drop=True)
+    # first cell: size-weighted means, skipping unknown rates (and a school without a size counts, with no weight)
+    assert grid.loc[0, 'count'] == 4
+    assert grid.loc[0, 'rate'] == pytest.approx((100 * 10 + 300 * 30) / 400)
+    assert grid.loc[0, 'latitude'] == pytest.approx((100 * 40.5 + 300 * 41.9 + 200 * 40.2) / 600)
+    assert grid.loc[0, 'longitude'] == pytest.approx((100 * -75.9 + 300 * -74.1 + 200 * -75.5) / 600)
+    # second cell: no weights at all, so plain means
+    assert grid.loc[1, 'count'] == 2
+    assert grid.loc[1, 'rate'] == pytest.approx(30)
+    assert grid.loc[1, 'latitude'] == pytest.approx(31)
+    assert grid.loc[1, 'longitude'] == pytest.approx(-91)
+
+@pytest.fixture(scope='module')
+def lod_frame():
+    mm = MultiMap(most_recent_year=2023, shared=SyntheticData(n=400, seed=3), use_cache=False, lod=True)
+    return mm.build_frame(subject='admissions', outcome_var='admit_rate')
+
+def test_lod_frame_traces(lod_frame):
+    grid, markers = lod_frame.data
+    counts = [int(t.split('</b>')[0].removeprefix('<b>').split()[0]) for t in grid.text]
+    assert sum(counts) == len(markers.lat)
+    # one colour bar, on the grid (the national view); the school markers take it over once zoomed in
+    assert grid.marker.showscale is True and markers.marker.showscale is False
+    assert grid.marker.colorbar.to_plotly_json() == markers.marker.colorbar.to_plotly_json()
+    assert grid.marker.colorscale == markers.marker.colorscale
+    colors = np.asarray(markers.marker.color, dtype=np.float64)
+    assert (grid.marker.cmin, grid.marker.cmax) == (np.nanmin(colors), np.nanmax(colors))
+
+def test_lod_script_switches_colour_bar():
+    script = MultiMap(most_recent_year=2023, lod=True)._lod_script()
+    assert "'marker.showscale': shown" in script and "'visible': shown" in script
+
+def test_frame_reused_by_fingerprint(tmp_path, monkeypatch):
+    frames = FrameCache(cache_dir=str(tmp_path))
+    builds = []
+    make_frame = MultiMap._make_frame
+    def counted(self, **kwargs):
+        builds.append(kwargs['subject'])
+        return make_frame(self, **kwargs)
+    monkeypatch.setattr(MultiMap, '_make_frame', counted)
+    def build(seed: int = 3):
+        mm = MultiMap(most_recent_year=2023, shared=SyntheticData(n=200, seed=seed), cache=frames, use_cache=True)
+        return mm, mm.build_frame(subject='admissions', outcome_var='admit_rate')
+    mm, built = build()
+    assert len(builds) == 1 and len(frames._read_index()) == 1
+    # same data and code: reused, with the same traces
+    mm2, reused = build()
+    assert len(builds) == 1
+    assert mm2.frame_fingerprints == mm.frame_fingerprints
+    assert pio.to_json(reused) == pio.to_json(built)
+    # changed data: built again
+    build(seed=4)
+    assert len(builds) == 2
+    # changed code: built again
+    monkeypatch.setattr(cache, '_CODE_HASH', 'changed')
+    mm3, _ = build()
+    assert len(builds) == 3
+    assert mm3.frame_fingerprints != mm.frame_fingerprints
+    assert len(frames._read_index()) == 3
+
+def test_frame_bytes_measured_alike(lod_frame):
+    mm = MultiMap(most_recent_year=2023, use_cache=False)
+    mm.frames = [go.Frame(lod_frame, name='a'), go.Frame(lod_frame, name='b')]
+    mm.build_multimap(title='title', notes='notes', compact=True)
+    before, after = zip(*mm.frame_bytes.values())
+    assert before[0] == before[1] and after[0] == after[1] # same frame, same sizes, first or not
+    assert after[0] == mm._frame_nbytes(mm._compact_frame(mm.frames[0])) < before[0]
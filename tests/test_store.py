@@ -0,0 +1,117 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from genplot.shared import SharedData
+from genplot.store import DataStore, plan_store
+from synthetic import SyntheticData
+
+'''
+DataStore: datasets written from SharedData come back from the store as they went in,
+filtered in SQL the same way pandas would filter them.
+'''
+
+@pytest.fixture(scope='module')
+def shared():
+    shared = SyntheticData(n=400, seed=3)
+    plan_store(shared, 2023)
+    shared.generate()
+    shared.fetch()
+    return shared
+
+@pytest.fixture(scope='module')
+def store(shared, tmp_path_factory):
+    store = DataStore(str(tmp_path_factory.mktemp('store') / 'store.sqlite'))
+    store.write(shared)
+    return store
+
+def held(shared: SharedData = None,
+         subject: str = None,
+         **kwargs) -> pd.DataFrame:
+    '''returns every year of a dataset the SharedData holds'''
+    years, df = shared.subject_data[shared._key(subject, merge_with_char=True, **kwargs)]
+    return df.loc[df['year'].isin(years)]
+
+def hand_shared(df: pd.DataFrame = None,
+                years: list = None) -> SharedData:
+    '''returns SharedData holding df as its (only) admissions dataset'''
+    shared = SharedData(api_key='test')
+    shared.subject_data[shared._key('admissions', merge_with_char=True)] = (set(years), df)
+    return shared
+
+def test_round_trip(shared, store):
+    for (subject, kwargs), (years, df) in shared.subject_data.items():
+        kwargs = json.loads(kwargs)
+        got = store.subject(subject, sorted(years), **kwargs)
+        pd.testing.assert_frame_equal(got, shared.load(subject, sorted(years), **kwargs), check_exact=True)
+    assert len(store.datasets()) == len(shared.subject_data)
+
+def test_round_trip_dtypes_and_index(tmp_path):
+    df = pd.DataFrame({
+        'id': ['100', '101', '102', '100'],
+        'year': [2013, 2013, 2013, 2023],
+        'name': pd.Categorical(['A College', 'B University', 'C Institute', 'A College']),
+        'city': ['Boston', 'Providence', 'Austin', 'Boston'],
+        'state': pd.Categorical(['MA', 'RI', 'TX', 'MA']),
+        'latitude': [42.3, 41.8, np.nan, 42.3],
+        'longitude': [-71.1, -71.4, np.nan, -71.1],
+        'hbcu': [False, True, False, False],
+        'applied': pd.array([120, None, 40, 130], dtype='Int64'),
+        'rate': [.5, np.nan, .25, .125],
+    }, index=[7, 3, 11, 2])
+    store = DataStore(str(tmp_path / 'store.sqlite'))
+    store.write(hand_shared(df, [2013, 2023]))
+    pd.testing.assert_frame_equal(store.subject('admissions'), df, check_exact=True)
+    pd.testing.assert_frame_equal(store.subject('admissions', 2023), df.loc[df['year'] == 2023], check_exact=True)
+
+def test_rewrite_replaces_dataset(tmp_path):
+    first = pd.DataFrame({'id': ['1', '2', '3'], 'year': [2023] * 3, 'name': ['A', 'B', 'C'],
+                          'state': ['MA', 'MA', 'RI'], 'applied': [10., 20., 30.]})
+    second = pd.DataFrame({'id': ['4', '5'], 'year': [2022, 2023], 'name': ['D', 'E'],
+                           'state': ['TX', 'TX'], 'applied': [40., 50.], 'admitted': [4., 5.]})
+    store = DataStore(str(tmp_path / 'store.sqlite'))
+    store.write(hand_shared(first, [2023]))
+    store.write(hand_shared(second, [2022, 2023]))
+    pd.testing.assert_frame_equal(store.subject('admissions'), second)
+    datasets = store.datasets()
+    assert len(datasets) == 1 and datasets.loc[0, 'n_rows'] == 2 and json.loads(datasets.loc[0, 'years']) == [2022, 2023]
+    assert store.query('SELECT COUNT(*) AS n FROM admissions').loc[0, 'n'] == 2 # old rows are gone
+
+def test_filters(shared, store):
+    exp = held(shared, 'enrollment', student_level='grad')
+    years = sorted(exp['year'].unique())[-2:]
+    exp = exp.loc[exp['year'].isin(years)]
+    states = ['MA', 'RI', 'TX']
+    ids = list(exp['id'].drop_duplicates().iloc[::7])
+    name = exp['name'].iloc[0].split()[-1].lower() # case insensitive
+    cases = [
+        ({'states': states}, exp['state'].isin(states)),
+        ({'ids': ids}, exp['id'].isin(ids)),
+        ({'name': name}, exp['name'].str.contains(name, case=False, regex=False)),
+        ({'states': states, 'name': 'college'}, exp['state'].isin(states) & exp['name'].str.contains('college', case=False)),
+    ]
+    for filters, mask in cases:
+        got = store.subject('enrollment', years, student_level='grad', **filters)
+        assert len(got) > 0, filters
+        pd.testing.assert_frame_equal(got, exp.loc[mask], check_exact=True)
+
+def test_missing_years_and_datasets(shared, store):
+    with pytest.raises(KeyError, match='1990'):
+        store.subject('admissions', [1990, 2023])
+    with pytest.raises(KeyError):
+        store.subject('enrollment', 2023, student_level='phd')
+
+def test_earnings_by_size(shared, store):
+    for wage_var, (poplimit, earn) in shared.earnings_data.items():
+        for lim in (poplimit, poplimit + 250, 2000):
+            got = store.earnings(wage_var, lim)
+            assert got == shared.earnings(wage_var, lim)
+            assert got == {id_: (v[0], v[1]) for id_, v in earn.earnings_dat.items() if v[2] is not None and v[2] >= lim}
+        assert len(store.earnings(wage_var, 2000)) < len(store.earnings(wage_var, poplimit))
+        # below the stored poplimit, schools would be missing
+        with pytest.raises(KeyError):
+            store.earnings(wage_var, poplimit - 1)
+    with pytest.raises(KeyError):
+        store.earnings('no_such_wage_var', 1000)
@@ -0,0 +1,131 @@
+import json
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pandas as pd
+import pytest
+
+from genplot.datatable import EdDataTable, SERVER_API
+from genplot.tableserver import TableServer
+from synthetic import SyntheticData
+
+'''
+TableServer on localhost, against the same DataTables queries done with pandas.
+'''
+
+SBJCT = 'admissions'
+TEXT_SORT = ['School', 'State'] # sorted case-insensitively; Year sorts as a number
+
+@pytest.fixture(scope='module')
+def table():
+    tbl = EdDataTable(most_recent_year=2023, shared=SyntheticData(n=300, seed=2), use_cache=False)
+    tbl.generate_df(earnings_api_key='synthetic', inflation_adjust=125.58, max_workers=1)
+    return tbl
+
+@pytest.fixture(scope='module')
+def server(table):
+    server = TableServer(table, host='127.0.0.1', port=0)
+    server.start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture(scope='module')
+def cells(table):
+    '''the tab's cells, as the html page prints them'''
+    df = table.dataframes[SBJCT]
+    return df.astype(object).where(df.notna(), 'NA').astype(str).reset_index(drop=True)
+
+def get(server: TableServer = None,
+        sbjct: str = SBJCT,
+        **params) -> dict:
+    '''returns json body of a DataTables request'''
+    with urlopen(f'{server.url}{SERVER_API}{sbjct}?{urlencode(params)}') as resp:
+        assert resp.headers['Content-Type'] == 'application/json'
+        return json.loads(resp.read())
+
+def status(server: TableServer = None,
+           sbjct: str = SBJCT,
+           **params) -> int:
+    '''returns http status of a request'''
+    try:
+        with urlopen(f'{server.url}{SERVER_API}{sbjct}?{urlencode(params)}') as resp:
+            return resp.status
+    except HTTPError as e:
+        return e.code
+
+def expected(cells: pd.DataFrame = None,
+             start: int = 0,
+             length: int = 10,
+             search: str = '',
+             order: list = None) -> tuple:
+    '''returns (recordsFiltered, page rows), done with pandas'''
+    df = cells
+    if order:
+        df = df.sort_values(by=[cells.columns[col] for col, _ in order],
+                            ascending=[direction == 'asc' for _, direction in order],
+                            key=lambda s: s.str.lower() if s.name in TEXT_SORT else s.astype(int),
+                            kind='stable')
+    for word in search.lower().split():
+        df = df.loc[df.apply(lambda s: s.str.lower().str.contains(word, regex=False)).any(axis=1)]
+    return len(df), df.iloc[start:start + length].values.tolist()
+
+def order_params(order: list = None) -> dict:
+    '''returns DataTables order[i][...] params'''
+    params = {}
+    for i, (col, direction) in enumerate(order):
+        params[f'order[{i}][column]'] = col
+        params[f'order[{i}][dir]'] = direction
+    return params
+
+def test_first_page_and_draw(server, cells):
+    body = get(server, draw=7, start=0, length=10)
+    assert body['draw'] == 7
+    assert body['recordsTotal'] == body['recordsFiltered'] == len(cells)
+    assert body['data'] == cells.iloc[:10].values.tolist()
+
+@pytest.mark.parametrize('start, length', [(10, 10), (25, 50), (200, 50), (0, -1)])
+def test_paging(server, cells, start, length):
+    body = get(server, draw=1, start=start, length=length)
+    rows = cells.iloc[start:] if length < 0 else cells.iloc[start:start + length]
+    assert body['recordsFiltered'] == len(cells)
+    assert body['data'] == rows.values.tolist()
+
+@pytest.mark.parametrize('col', ['School', 'State', 'Year'])
+@pytest.mark.parametrize('direction', ['asc', 'desc'])
+def test_ordering(server, cells, col, direction):
+    order = [(list(cells.columns).index(col), direction)]
+    for start in (0, 100):
+        body = get(server, draw=2, start=start, length=25, **order_params(order))
+        assert (body['recordsFiltered'], body['data']) == expected(cells, start, 25, order=order)
+
+def test_ordering_on_two_columns(server, cells):
+    cols = list(cells.columns)
+    order = [(cols.index('State'), 'asc'), (cols.index('Year'), 'desc')]
+    body = get(server, draw=3, start=5, length=40, **order_params(order))
+    assert (body['recordsFiltered'], body['data']) == expected(cells, 5, 40, order=order)
+
+@pytest.mark.parametrize('search', ['university', 'COLLEGE 1000', 'ca 20', 'no such school', '  '])
+def test_search(server, cells, search):
+    order = [(list(cells.columns).index('School'), 'desc')]
+    body = get(server, draw=4, start=0, length=30, **{'search[value]': search}, **order_params(order))
+    assert body['draw'] == 4
+    assert (body['recordsFiltered'], body['data']) == expected(cells, 0, 30, search, order)
+    assert body['recordsTotal'] == len(cells)
+
+def test_bad_parameters(server, cells):
+    ncols = len(cells.columns)
+    assert status(server, draw=1, start='x') == 400
+    assert status(server, draw=1, length='ten') == 400
+    assert status(server, draw=1, **order_params([(ncols, 'asc')])) == 400
+    assert status(server, draw=1, **order_params([(-1, 'asc')])) == 400
+    assert status(server, 'no_such_tab', draw=1) == 404
+    # negative starts are read as 0
+    assert get(server, draw=1, start=-5, length=3)['data'] == cells.iloc[:3].values.tolist()
+
+def test_every_tab_served(server, table):
+    assert set(server.tabs) == set(table.dataframes)
+    for sbjct, df in table.dataframes.items():
+        body = get(server, sbjct, draw=1, start=0, length=5)
+        assert body['recordsTotal'] == len(df)
+        assert body['data'] == df.head(5).astype(object).where(df.head(5).notna(), 'NA').astype(str).values.tolist()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from genplot.utils import int_value_handler, int_value_handler_vec
+
+'''
+int_value_handler_vec against int_value_handler, row by row.
+'''
+
+COLUMNS = {
+    'float': pd.Series([1.0, 2.9, np.nan, -3.2, 0.0, 41.5, np.nan]),
+    'negative fractions': pd.Series([-0.5, -1.5, -2.99, 0.5, -0.0, -7.01, 3.99]),
+    'int': pd.Series([0, -4, 12, 7, -100, 3, 55], dtype=np.int64),
+    'nullable int': pd.Series([1, pd.NA, -5, 2**40, pd.NA, 0, 9], dtype='Int64'),
+    'nullable float': pd.Series([1.7, pd.NA, -5.2, np.nan, 0.4, 3.0, -0.9], dtype='Float64'),
+    'mixed object': pd.Series([1, None, 3.7, 'x', -2.5, np.nan, ''], dtype=object),
+    'numeric object': pd.Series([1, None, 3, -8, 2.2, 0, 6], dtype=object),
+    'strings': pd.Series(['12', None, 'x', '-3.5', '', np.nan, '7'], dtype=object),
+    'string dtype': pd.Series(['12', pd.NA, 'x', '-3.5', '', pd.NA, '7'], dtype='string'),
+    'no values': pd.Series([None] * 7, dtype=object),
+    'large': pd.Series([1e20, -1e20, 2.0**53 + 2, 9.3e18, -9.3e18, 2.0**52, 2**52 - 1.5]),
+    'large int': pd.Series([2**62, -2**62, 2**53 + 1, 0, -1, 2**63 - 1, -2**63], dtype=np.int64),
+    'large object': pd.Series([2**70, -2**64, 10**19, None, 'NA', 2**53 + 1, 1], dtype=object),
+}
+
+def expected(x: pd.Series = None,
+             y: pd.Series = None,
+             opr: str = 'subtract') -> list:
+    '''returns str(int_value_handler(...)) of every row'''
+    if y is None:
+        return [str(int_value_handler(a)) for a in x]
+    return [str(int_value_handler(a, b, opr)) for a, b in zip(x, y)]
+
+@pytest.mark.parametrize('name', COLUMNS)
+def test_single_column(name):
+    x = COLUMNS[name]
+    assert list(int_value_handler_vec(x)) == expected(x)
+
+@pytest.mark.parametrize('opr', ['add', 'subtract'])
+@pytest.mark.parametrize('name_x', COLUMNS)
+@pytest.mark.parametrize('name_y', COLUMNS)
+def test_column_pairs(name_x, name_y, opr):
+    x, y = COLUMNS[name_x], COLUMNS[name_y]
+    assert list(int_value_handler_vec(x, y, opr)) == expected(x, y, opr)
+
+def test_keeps_index_and_pairs_by_position():
+    x = pd.Series([5.5, np.nan, 3.0], index=[10, 20, 30])
+    y = pd.Series([1.0, 2.0, -2.2], index=[2, 1, 0])
+    out = int_value_handler_vec(x, y, 'subtract')
+    assert list(out.index) == [10, 20, 30]
+    assert list(out) == ['4', 'NA', '5']
+
+def test_bad_opr():
+    with pytest.raises(ValueError):
+        int_value_handler_vec(pd.Series([1.0]), pd.Series([2.0]), 'multiply')